@@ -0,0 +1,134 @@
+import atexit
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, TypeVar
+
+import config
+from .models import AgendaConclusion, TodoItem, FollowUp
+
+T = TypeVar("T")
+
+# 形如 “王总：” / “李工程师:” 的发言人前缀
+SPEAKER_PATTERN = re.compile(r"^\s*[^\s：:，,。]{1,20}[：:]")
+SENTENCE_PATTERN = re.compile(r"(?<=[。！？!?；;…])")
+NORMALIZE_PATTERN = re.compile(r"[\s，,。．.！!？?；;：:、“”\"'‘’（）()【】\[\]]+")
+
+# 进程内共享的分块提取线程池，CHUNK_WORKERS 限制的是整个进程同时提取的分块数，而不是单次工具调用
+_executor = ThreadPoolExecutor(max_workers=config.CHUNK_WORKERS, thread_name_prefix="chunk-extract")
+atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+
+
+def _split_units(text: str, chunk_size: int) -> List[str]:
+    """按发言轮次切分，超长的发言再按句子切分，仍超长则硬切"""
+    units = []
+    turn = []
+    for line in text.splitlines(keepends=True):
+        if SPEAKER_PATTERN.match(line) and turn:
+            units.append("".join(turn))
+            turn = []
+        turn.append(line)
+    if turn:
+        units.append("".join(turn))
+
+    result = []
+    for unit in units:
+        if len(unit) <= chunk_size:
+            result.append(unit)
+            continue
+        for sentence in SENTENCE_PATTERN.split(unit):
+            while len(sentence) > chunk_size:
+                result.append(sentence[:chunk_size])
+                sentence = sentence[chunk_size:]
+            if sentence:
+                result.append(sentence)
+    return result
+
+
+def split_transcript(text: str, chunk_size: int = None, overlap: int = None) -> List[str]:
+    """
+    将长会议记录切分为若干块，优先在发言轮次边界切分，其次在句子边界切分。
+    相邻块之间保留约 overlap 个字符的重叠，避免跨块的议题或任务被截断。
+    """
+    chunk_size = chunk_size or config.CHUNK_SIZE
+    overlap = config.CHUNK_OVERLAP if overlap is None else overlap
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    current = []
+    current_len = 0
+    for unit in _split_units(text, chunk_size):
+        if current and current_len + len(unit) > chunk_size:
+            chunks.append("".join(current))
+            # 从上一块末尾回溯若干完整单元作为重叠上下文
+            tail = []
+            tail_len = 0
+            for prev in reversed(current):
+                if tail_len + len(prev) > overlap or tail_len + len(prev) + len(unit) > chunk_size:
+                    break
+                tail.insert(0, prev)
+                tail_len += len(prev)
+            current, current_len = tail, tail_len
+        current.append(unit)
+        current_len += len(unit)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def map_chunks(fn: Callable[[str], T], chunks: List[str]) -> List[T]:
+    """在共享线程池中并发地对每个分块执行提取，结果顺序与分块顺序一致；线程池忙时分块排队等待"""
+    if len(chunks) == 1:
+        return [fn(chunks[0])]
+
+    # 每个任务复制当前上下文，保证 LangChain 回调等上下文变量在子线程中可见
+    futures = [_executor.submit(contextvars.copy_context().run, fn, chunk) for chunk in chunks]
+    return [f.result() for f in futures]
+
+
+def _normalize(value: str) -> str:
+    return NORMALIZE_PATTERN.sub("", value or "").lower()
+
+
+def _longer(a: str, b: str) -> str:
+    """两段描述取信息量更大的一个，长度相同时保留先出现的"""
+    return b if len(b or "") > len(a or "") else a
+
+
+def merge_agendas(results: List[List[AgendaConclusion]]) -> List[AgendaConclusion]:
+    merged = {}
+    for items in results:
+        for item in items:
+            key = _normalize(item.agenda)
+            if key in merged:
+                merged[key].conclusion = _longer(merged[key].conclusion, item.conclusion)
+            else:
+                merged[key] = item.model_copy()
+    return list(merged.values())
+
+
+def merge_todos(results: List[List[TodoItem]]) -> List[TodoItem]:
+    merged = {}
+    for items in results:
+        for item in items:
+            key = (_normalize(item.owner), _normalize(item.task))
+            if key in merged:
+                # 重叠区域可能只在一侧识别出截止时间，以明确的时间为准
+                if merged[key].deadline == "待确认" and item.deadline != "待确认":
+                    merged[key].deadline = item.deadline
+            else:
+                merged[key] = item.model_copy()
+    return list(merged.values())
+
+
+def merge_follow_ups(results: List[List[FollowUp]]) -> List[FollowUp]:
+    merged = {}
+    for items in results:
+        for item in items:
+            key = _normalize(item.topic)
+            if key in merged:
+                merged[key].reason = _longer(merged[key].reason, item.reason)
+            else:
+                merged[key] = item.model_copy()
+    return list(merged.values())
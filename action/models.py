@@ -35,6 +35,23 @@ class Preference(BaseModel):
     preference: str = Field(description="具体偏好值")
 
 
+# 结构化输出的列表包装类型
+class AgendaList(BaseModel):
+    items: List[AgendaConclusion]
+
+
+class TodoList(BaseModel):
+    todos: List[TodoItem]
+
+
+class FollowUpList(BaseModel):
+    follow_ups: List[FollowUp]
+
+
+class PreferenceList(BaseModel):
+    preferences: List[Preference]
+
+
 class MeetingRecord(BaseModel):
     basic_info: BasicInfo
     agendas: List[AgendaConclusion]
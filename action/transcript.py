@@ -0,0 +1,129 @@
+import functools
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Set, Tuple
+
+import config
+from db.manager import db
+from governor import current_username
+
+# 会议原文引用：T-<12 位短哈希> 或上传接口返回的 64 位 meeting_id（可带 T- 前缀），可选 :起始行-结束行 或 #段号
+TRANSCRIPT_REF = re.compile(r"^(?:T-)?([0-9a-f]{64}|(?<=T-)[0-9a-f]{12})(?::(\d+)-(\d+)|#(\d+))?$")
+SHORT_ID = 12
+
+
+def content_hash(text: str) -> str:
+    """原文的完整 sha256，与上传接口返回的 meeting_id 一致"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def transcript_id(text: str) -> str:
+    return content_hash(text)[:SHORT_ID]
+
+
+def line_segments(lines: List[str], max_chars: int) -> List[Tuple[int, int]]:
+    """按行切分为不超过 max_chars 的段，返回各段的 (起始行, 结束行)，行号从 1 开始且含首尾"""
+    segments = []
+    start, size = 1, 0
+    for number, line in enumerate(lines, 1):
+        if size and size + len(line) > max_chars:
+            segments.append((start, number - 1))
+            start, size = number, 0
+        size += len(line) + 1
+    if lines:
+        segments.append((start, len(lines)))
+    return segments
+
+
+class TranscriptRegistry:
+    """
+    服务端登记的会议原文。Agent 提示词与工具参数中只传引用，由工具在执行前展开，
+    避免 ReAct 每轮迭代重复发送全文、模型在 Action Input 中复述原文。
+    以内容哈希为键，相同原文重复登记得到同一引用；按 LRU 保留最近的 max_items 份，
+    未命中时回落到 POST /api/meetings/upload 写入的持久化存储。
+    每份原文记录登记过它的用户，引用只能由这些用户展开，持久化存储中也只能读取本人上传的原文。
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        # 短哈希 -> (完整哈希, 原文, 可读取的用户名)
+        self._texts: "OrderedDict[str, Tuple[str, str, Set[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, text: str, username: str) -> str:
+        full = content_hash(text)
+        key = full[:SHORT_ID]
+        with self._lock:
+            entry = self._texts.get(key)
+            if entry is None or entry[0] != full:
+                entry = self._texts[key] = (full, text, set())
+            entry[2].add(username)
+            self._texts.move_to_end(key)
+            while len(self._texts) > self.max_items:
+                self._texts.popitem(last=False)
+        return f"T-{key}"
+
+    def get(self, key: str, username: str) -> Optional[str]:
+        """按 12 位短哈希或完整 meeting_id 取该用户可读取的原文"""
+        short = key[:SHORT_ID]
+        with self._lock:
+            entry = self._texts.get(short)
+            if entry is not None and username in entry[2] and (len(key) == SHORT_ID or key == entry[0]):
+                self._texts.move_to_end(short)
+                return entry[1]
+        user = db.get_user(username) if username else None
+        text = db.get_transcript(key, user["user_id"]) if user else None
+        if text is not None:
+            self.register(text, username)
+        return text
+
+    def resolve(self, value: str, username: str = None) -> str:
+        """
+        引用 -> 对应的原文片段；非引用的输入原样返回，兼容直接传入原文的调用方。
+        username 缺省为当前请求的用户（工具执行时由 answer_stream 设置）。
+        """
+        match = TRANSCRIPT_REF.match(value.strip().strip("`'\""))
+        if match is None:
+            return value
+        key, first, last, segment = match.groups()
+        text = self.get(key, current_username.get() if username is None else username)
+        if text is None:
+            raise ValueError(f"会议原文引用 {value.strip()} 不存在或已过期")
+
+        lines = text.splitlines()
+        if segment is not None:
+            segments = line_segments(lines, config.CHUNK_SIZE)
+            index = min(max(int(segment), 1), len(segments)) - 1
+            first, last = segments[index] if segments else (1, 0)
+        elif first is None:
+            return text
+        first, last = max(int(first), 1), min(int(last), len(lines))
+        return "\n".join(lines[first - 1:last])
+
+    def outline(self, ref: str, username: str, preview_chars: int = 40) -> str:
+        """填入提示词 {meeting} 的原文概览：引用用法 + 各段行范围与开头预览"""
+        lines = self.resolve(ref, username).splitlines()
+        segments = line_segments(lines, config.CHUNK_SIZE)
+        overview = "\n".join(
+            f"  #{i} 第{first}-{last}行：{' '.join(lines[first - 1:last])[:preview_chars]}…"
+            for i, (first, last) in enumerate(segments, 1)
+        )
+        return (f"会议原文已在服务端登记，引用编号 {ref}，共 {len(lines)} 行、{len(segments)} 段。\n"
+                f"调用工具时 Action Input 只填写引用，严禁粘贴原文：\n"
+                f"  {ref} 表示全文；{ref}:起始行-结束行 表示行范围（从 1 开始，含首尾）；{ref}#段号 表示下列某一段。\n"
+                f"分段概览：\n{overview}")
+
+
+transcripts = TranscriptRegistry(config.TRANSCRIPT_REGISTRY_ITEMS)
+
+
+def accepts_transcript_ref(fn):
+    """工具装饰器：第一个参数若为原文引用则先展开，置于 @cached 之外，使引用与原文命中同一缓存"""
+
+    @functools.wraps(fn)
+    def wrapper(text: str, *args, **kwargs):
+        return fn(transcripts.resolve(text), *args, **kwargs)
+
+    return wrapper
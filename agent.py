@@ -1,25 +1,50 @@
-import json
-
 from langchain_classic.agents import AgentExecutor, create_react_agent
 from langchain_core.output_parsers import StrOutputParser
-from langchain_deepseek import ChatDeepSeek
 from langchain_core.prompts import PromptTemplate
 import config
 import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from typing import Optional
+
+import mindmap
+from action.models import MeetingRecord, BasicInfo, AgendaConclusion, TodoItem, FollowUp
 from action.tools import extract_meeting_basic_info, parse_meeting_agenda_conclusion, generate_meeting_todo, \
-    mark_meeting_follow_up, generate_user_preferences, get_user_info
-from config import template, meeting, template_perference, template_mindmap
+    mark_meeting_follow_up, generate_user_preferences, get_user_info, search_meeting_history, \
+    retrieve_meeting_context
+from action.transcript import content_hash
+from db.cache import cache_bypass, extraction_cache
+from db.manager import db
+from db.writer import meeting_writer
+from governor import GovernedChatDeepSeek, current_username, with_queue_status
+from runtime import runtime
+from sse import StreamOptions, encode_stream
+from tracing import start_trace
+
+# 修改 template_mindmap.txt 时需同步递增，使缓存的思维导图失效
+MINDMAP_PROMPT_VERSION = "1"
+
+# pipeline 模式下并行执行的提取工具
+PIPELINE_EXTRACTORS = [extract_meeting_basic_info,
+                       parse_meeting_agenda_conclusion,
+                       generate_meeting_todo,
+                       mark_meeting_follow_up]
 
 
 def create_agent(callbacks=None):
     callbacks = callbacks or []
 
-    llm = ChatDeepSeek(
+    llm = GovernedChatDeepSeek(
         model="deepseek-chat",
         temperature=0,
-        max_retries=2,
+        max_retries=0,
         callbacks=callbacks,
         streaming=True,
+        stream_usage=True,
+        http_client=runtime.http_client,
+        http_async_client=runtime.http_async_client,
         stop_sequences=["\nObservation:"],
     )
 
@@ -27,9 +52,11 @@ def create_agent(callbacks=None):
              parse_meeting_agenda_conclusion,
              generate_meeting_todo,
              mark_meeting_follow_up,
-             get_user_info]
+             get_user_info,
+             search_meeting_history,
+             retrieve_meeting_context]
 
-    prompt = PromptTemplate.from_template(template)
+    prompt = PromptTemplate.from_template(config.load_prompt("template"))
 
     react_agent = create_react_agent(
         llm=llm,
@@ -52,12 +79,15 @@ def create_agent(callbacks=None):
 def create_pref_agent(callbacks=None):
     callbacks = callbacks or []
 
-    llm = ChatDeepSeek(
+    llm = GovernedChatDeepSeek(
         model="deepseek-chat",
         temperature=0,
-        max_retries=2,
+        max_retries=0,
         callbacks=callbacks,
         streaming=True,
+        stream_usage=True,
+        http_client=runtime.http_client,
+        http_async_client=runtime.http_async_client,
         stop_sequences=["\nObservation:"],
     )
 
@@ -67,7 +97,7 @@ def create_pref_agent(callbacks=None):
              mark_meeting_follow_up,
              generate_user_preferences]
 
-    prompt = PromptTemplate.from_template(template_perference)
+    prompt = PromptTemplate.from_template(config.load_prompt("template_perference"))
 
     react_agent = create_react_agent(
         llm=llm,
@@ -90,26 +120,120 @@ def create_pref_agent(callbacks=None):
 def create_mindmap_chain(callbacks=None):
     callbacks = callbacks or []
 
-    llm = ChatDeepSeek(
+    llm = GovernedChatDeepSeek(
         model="deepseek-chat",
         temperature=0,
-        max_retries=2,
+        max_retries=0,
         callbacks=callbacks,
         streaming=True,
+        stream_usage=True,
+        http_client=runtime.http_client,
+        http_async_client=runtime.http_async_client,
         stop_sequences=["\nObservation:"],
     )
 
-    prompt = PromptTemplate.from_template(template_mindmap)
+    prompt = PromptTemplate.from_template(config.load_prompt("template_mindmap"))
+    chain = prompt | llm | StrOutputParser()
+
+    return chain
+
+
+def create_render_chain(callbacks=None):
+    callbacks = callbacks or []
+
+    llm = GovernedChatDeepSeek(
+        model="deepseek-chat",
+        temperature=0,
+        max_retries=0,
+        callbacks=callbacks,
+        streaming=True,
+        stream_usage=True,
+        http_client=runtime.http_client,
+        http_async_client=runtime.http_async_client,
+    )
+
+    prompt = PromptTemplate.from_template(config.load_prompt("template_render"))
     chain = prompt | llm | StrOutputParser()
 
     return chain
 
 
+def build_meeting_record(results: dict, raw_text: str, user_id: int) -> MeetingRecord:
+    """将各提取工具的输出合并为 MeetingRecord，失败的工具以空值兜底"""
+    basic_info = results.get(extract_meeting_basic_info.name) or {}
+    return MeetingRecord(
+        basic_info=BasicInfo(
+            attendees=basic_info.get("attendees", []),
+            time=basic_info.get("time", "未知"),
+            subject=basic_info.get("subject", "未知"),
+            duration=basic_info.get("duration", "未知"),
+        ),
+        agendas=[AgendaConclusion(**a) for a in results.get(parse_meeting_agenda_conclusion.name) or []],
+        todos=[TodoItem(**t) for t in results.get(generate_meeting_todo.name) or []],
+        follow_ups=[FollowUp(**f) for f in results.get(mark_meeting_follow_up.name) or []],
+        raw_text=raw_text,
+        user_id=user_id,
+    )
+
+
+class AgentRegistry:
+    """
+    预构建的 Agent / Chain 注册表：启动时一次性构建，之后各请求共享同一实例。
+    AgentExecutor 与 LCEL 链在调用时不修改自身状态，回调通过每次运行的 config 传入，因此可跨线程复用。
+    """
+
+    FACTORIES = {
+        "chat": create_agent,
+        "preference": create_pref_agent,
+        "mindmap": create_mindmap_chain,
+        "render": create_render_chain,
+    }
+    # 运行对象 -> 构建时使用的提示词，开启 PROMPT_HOT_RELOAD 时提示词文件变化后重建
+    PROMPTS = {
+        "chat": "template",
+        "preference": "template_perference",
+        "mindmap": "template_mindmap",
+        "render": "template_render",
+    }
+
+    def __init__(self):
+        self._runnables = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.build_seconds = {}
+
+    def build(self) -> dict:
+        """构建全部运行对象，返回各自的构建耗时（秒）"""
+        for name in self.FACTORIES:
+            self.get(name)
+        return self.build_seconds
+
+    def _stale(self, name: str) -> bool:
+        return config.PROMPT_HOT_RELOAD and self._versions.get(name) != config.prompt_version(self.PROMPTS[name])
+
+    def get(self, name: str):
+        runnable = self._runnables.get(name)
+        if runnable is None or self._stale(name):
+            with self._lock:
+                runnable = self._runnables.get(name)
+                if runnable is None or self._stale(name):
+                    start = time.perf_counter()
+                    version = config.prompt_version(self.PROMPTS[name])
+                    runnable = self.FACTORIES[name]()
+                    self.build_seconds[name] = time.perf_counter() - start
+                    self._runnables[name] = runnable
+                    self._versions[name] = version
+        return runnable
+
+
+registry = AgentRegistry()
+
+
 async def run_query_async(agent_executor, query: str, has_meeting: bool = True):
     print(f"🤔 用户问题: {query}")
 
     async for event in agent_executor.astream_events(
-            {"input": query, "meeting": meeting} if has_meeting else {"input": query},
+            {"input": query, "meeting": config.load_prompt("meeting")} if has_meeting else {"input": query},
             version="v2",
     ):
         kind = event["event"]
@@ -128,7 +252,65 @@ async def run_query_async(agent_executor, query: str, has_meeting: bool = True):
                 print(content, end="", flush=True)
 
 
+async def should_persist(raw_text: str, user_id: int) -> bool:
+    """内置示例会议不落库；同一原文（追问、缓存命中）已为该用户入库过的不再重复入队"""
+    if raw_text == config.load_prompt("meeting"):
+        return False
+    return await asyncio.to_thread(db.find_meeting_by_transcript, user_id, content_hash(raw_text)) is None
+
+
+async def enqueue_if_new(record: MeetingRecord) -> None:
+    if await should_persist(record.raw_text, record.user_id):
+        meeting_writer.enqueue(record)
+
+
+async def persist_meeting_record(results: dict, raw_text: str, username: str) -> None:
+    """将提取结果交给后台写入队列持久化，不等待数据库写入；缺少基本信息时视为未完成总结，不落库"""
+    if not results.get(extract_meeting_basic_info.name):
+        return
+    user = await asyncio.to_thread(db.get_user, username)
+    if not user:
+        return
+    await enqueue_if_new(build_meeting_record(results, raw_text=raw_text, user_id=user["user_id"]))
+
+
+# 后台落库任务的强引用，防止任务在完成前被回收
+_persist_tasks = set()
+
+
+def persist_in_background(coro) -> None:
+    """
+    在发出 done 之前调用：落库查询与入队在后台任务中进行，响应不等待数据库，
+    客户端收到 done 后断开也不影响落库；提取结果不合法等异常只记录日志，不会打断已结束的流。
+    """
+    async def run():
+        try:
+            await coro
+        except Exception as e:
+            print(f"⚠️ 会议记录落库失败: {type(e).__name__}: {e}")
+
+    task = asyncio.ensure_future(run())
+    _persist_tasks.add(task)
+    task.add_done_callback(_persist_tasks.discard)
+
+
+def format_profile(profile: Optional[dict]) -> str:
+    """填入提示词 {profile} 的用户画像：偏好、最近会议与未完成待办的紧凑 JSON"""
+    if not profile:
+        return "未加载"
+    return json.dumps({k: profile[k] for k in ("preferences", "meetings", "todos")}, ensure_ascii=False)
+
+
 async def run_agent_async_generator(executor, data):
+    if isinstance(data.get("profile"), concurrent.futures.Future):
+        try:
+            profile = await asyncio.wrap_future(data["profile"])
+        except Exception as e:
+            print(f"⚠️ 用户画像预取失败，回退到 get_user_info 工具: {e}")
+            profile = None
+        data = {**data, "profile": format_profile(profile)}
+
+    results = {}
     async for event in executor.astream_events(
             data,
             version="v2",
@@ -138,44 +320,127 @@ async def run_agent_async_generator(executor, data):
         if kind == "on_chat_model_stream":
             content = event["data"]["chunk"].content
             if content:
-                yield f"data: {json.dumps({'type': 'stream', 'content': content})}\n\n"
+                yield {'type': 'stream', 'content': content}
 
         elif kind == "on_tool_start":
             tool_name = event["name"]
-            yield f"data: {json.dumps({'type': 'status', 'content': f'正在调用工具: {tool_name}...'})}\n\n"
+            yield {'type': 'status', 'content': f'正在调用工具: {tool_name}...'}
 
         elif kind == "on_tool_end":
             tool_output = event["data"].get("output")
-            yield f"data: {json.dumps({'type': 'observation', 'content': f'Observation: {tool_output}'})}\n\n"
+            results[event["name"]] = tool_output
+            yield {'type': 'observation', 'content': f'Observation: {tool_output}'}
 
         elif kind == "on_chain_end" and event["name"] == "AgentExecutor":
-            yield f"data: {json.dumps({'type': 'done', 'content': ''})}\n\n"
+            if "meeting" in data:
+                persist_in_background(persist_meeting_record(results, data.get("transcript", data["meeting"]),
+                                                             data.get("username", "")))
+            yield {'type': 'done', 'content': ''}
 
 
-def generate_answer(chain, data):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    gen = run_agent_async_generator(chain, data)
+async def run_pipeline_async_generator(chain, data):
+    """
+    pipeline 模式：并行执行全部提取工具，合并为 MeetingRecord 后仅调用一次 LLM 渲染 HTML。
+    chain 为 create_render_chain 构建的渲染链。
+    """
+    text = data["meeting"]
 
-    try:
-        while True:
-            chunk = loop.run_until_complete(gen.__anext__())
-            yield chunk
-    except StopAsyncIteration:
-        pass
-    finally:
-        loop.close()
+    async def run_extractor(extractor):
+        try:
+            return extractor.name, await extractor.ainvoke({"text": text}), None
+        except Exception as e:
+            return extractor.name, None, e
 
+    for extractor in PIPELINE_EXTRACTORS:
+        yield {'type': 'status', 'content': f'正在调用工具: {extractor.name}...'}
+
+    user_task = asyncio.create_task(asyncio.to_thread(db.get_user, data.get("username", "")))
+    results = {}
+    for finished in asyncio.as_completed([run_extractor(e) for e in PIPELINE_EXTRACTORS]):
+        name, output, error = await finished
+        if error is not None:
+            yield {'type': 'status', 'content': f'工具 {name} 调用失败: {error}'}
+            continue
+        results[name] = output
+        yield {'type': 'observation', 'content': f'Observation: {output}'}
+
+    user = await user_task
+    record = build_meeting_record(results, raw_text=text, user_id=user.get("user_id", 0) if user else 0)
+
+    # 与 ReAct 输出保持一致，前端据此识别最终答案
+    yield {'type': 'stream', 'content': 'Final Answer: '}
+    async for content in chain.astream({
+        "record": record.model_dump_json(exclude={"raw_text", "user_id"}, indent=2),
+        "input": data.get("input", ""),
+        "username": data.get("username", ""),
+    }):
+        if content:
+            yield {'type': 'stream', 'content': content}
+
+    if user and results.get(extract_meeting_basic_info.name):
+        persist_in_background(enqueue_if_new(record))
+    yield {'type': 'done', 'content': ''}
+
+
+async def run_mindmap_async_generator(chain, data):
+    """
+    思维导图：指定了已入库会议或 conclusion 为可解析的总结 HTML 时直接拼出 mindmap，不调用 LLM；
+    否则按 conclusion 查找缓存的 LLM 输出并回放，未命中才调用 create_mindmap_chain 并写入缓存。
+    """
+    conclusion = data.get("conclusion", "")
+    record = None
+    if data.get("record_id") is not None:
+        user = await asyncio.to_thread(db.get_user, data.get("username", ""))
+        if user:
+            record = await asyncio.to_thread(db.get_meeting_record, data["record_id"], user["user_id"])
+    markup = mindmap.from_record(record) if record else mindmap.from_summary_html(conclusion)
+
+    use_cache = not cache_bypass.get()
+    key = extraction_cache.make_key("mindmap", MINDMAP_PROMPT_VERSION, conclusion)
+    if markup is None and use_cache:
+        markup = await asyncio.to_thread(extraction_cache.get, key, "mindmap")
+    if markup is not None:
+        yield {'type': 'stream', 'content': markup}
+        yield {'type': 'done', 'content': ''}
+        return
+
+    parts = []
+    async for content in chain.astream({"conclusion": conclusion}):
+        if content:
+            parts.append(content)
+            yield {'type': 'stream', 'content': content}
+    yield {'type': 'done', 'content': ''}
+    if parts and use_cache:
+        await asyncio.to_thread(extraction_cache.set, key, "mindmap", "".join(parts))
+
+
+async def answer_stream(chain, data, runner=run_agent_async_generator, no_cache=False, options=None, trace=None):
+    # 运行时在单个 Task 中驱动整个生成器，此处设置的上下文变量对整次运行及其工具调用有效；
+    # trace 由写出帧的一方创建，首字节与写出耗时也由它在帧真正写出后记录
+    cache_bypass.set(no_cache)
+    current_username.set(data.get("username", "") if isinstance(data, dict) else "")
+    if trace is not None:
+        trace.activate()
+    async for frame in encode_stream(with_queue_status(runner(chain, data)), options or StreamOptions()):
+        yield frame
+
+
+def generate_answer(chain, data, runner=run_agent_async_generator, no_cache=False, options=None, endpoint="chat"):
+    """WSGI 入口：在共享运行时循环上执行流式回答，按块同步产出"""
+    trace = start_trace(endpoint)
+    return trace.write_frames(runtime.iterate(answer_stream(chain, data, runner=runner, no_cache=no_cache,
+                                                            options=options, trace=trace)))
 
 if __name__ == "__main__":
-    # agent = create_agent()
-    agent = create_pref_agent()
+    db.init_schema()
+    # agent = registry.get("chat")
+    agent = registry.get("preference")
     while True:
         try:
             user_input = input("👤 请输入您的问题: ").strip()
             if not user_input or user_input.strip() == "":
                 continue
-            asyncio.run(run_query_async(agent, user_input))
+            runtime.run(run_query_async(agent, user_input))
             print()
         except KeyboardInterrupt:
             print("\n\n👋 程序已退出，祝您旅途愉快！\n")
@@ -1,16 +1,44 @@
+import threading
+
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager
 
-from agent import create_agent, meeting, create_mindmap_chain, create_pref_agent, run_agent_async_generator, generate_answer
+import config
+from action.transcript import transcripts
+from db.cache import extraction_cache
 from db.manager import db
+from db.writer import meeting_writer
+from governor import llm_governor
+from runtime import runtime
+from db.service import bulk_update_todos, upload_transcript
+from sse import StreamOptions, encode_stream
+from tracing import metrics, sample_lines
 
 app = Flask(__name__)
 CORS(app)  # 允许所有来源跨域
 app.config["JWT_SECRET_KEY"] = "meeting_assistant"
 jwt = JWTManager(app)
 
+# 建表只在进程启动时执行一次
+db.init_schema()
+
+
+# agent / live 依赖 LangChain 全家桶，导入耗时占进程启动的大头，因此不在模块顶层导入，
+# 而是在首次使用时导入，或由 warm_up 在后台提前导入并预构建全部 Agent / Chain
+def warm_up() -> None:
+    from agent import registry
+
+    build_seconds = registry.build()
+    print("⚙️ Agent 注册表构建完成: " + ", ".join(f"{k}={v * 1000:.1f}ms" for k, v in build_seconds.items()))
+
+
+if config.AGENT_WARMUP == "eager":
+    warm_up()
+elif config.AGENT_WARMUP == "background":
+    threading.Thread(target=warm_up, name="agent-warmup", daemon=True).start()
+
 
 @app.route("/api/login", methods=["POST"])
 def login():
@@ -28,26 +56,92 @@ def login():
     return jsonify({"msg": "用户名或密码错误"}), 401
 
 
+def no_cache_requested(body: dict, headers) -> bool:
+    """请求体 no_cache=true 或请求头 Cache-Control: no-cache 时跳过提取结果缓存"""
+    return bool(body.get('no_cache')) or headers.get('Cache-Control') == 'no-cache'
+
+
+def overloaded_response():
+    """LLM 调用排队已满时直接返回 429 与 Retry-After，不再开始流式响应"""
+    retry_after = llm_governor.check_admission()
+    if retry_after is None:
+        return None
+    return jsonify({"msg": f"服务繁忙，请 {retry_after} 秒后重试"}), 429, {"Retry-After": str(retry_after)}
+
+
+# 以下 prepare_* 只解析参数并构建运行对象，WSGI 视图与 asgi.py 共用
+def prepare_chat(body: dict, username: str):
+    from agent import registry, run_agent_async_generator, run_pipeline_async_generator
+
+    # 已通过 /api/meetings/upload 上传的原文只需传 meeting_id，且只能读取本人上传的原文
+    if body.get('meeting_id'):
+        m = transcripts.get(str(body['meeting_id']).lower(), username)
+        if m is None:
+            return None
+    else:
+        m = body.get('meeting') or ''
+        if m.strip() == '':
+            m = config.load_prompt("meeting")
+    query = body.get('query', '请总结会议内容')
+    if query.strip() == '':
+        query = '请总结会议内容'
+    data = {"input": query, "meeting": m, "username": username}
+
+    # mode=pipeline：并行提取 + 单次渲染，跳过 ReAct 循环
+    if body.get('mode') == 'pipeline':
+        return registry.get("render"), data, run_pipeline_async_generator
+
+    # 用户画像在后台线程中预取，与后续的请求准备并行，Agent 启动时填入提示词，省去 get_user_info 一轮迭代
+    data["profile"] = runtime.submit(db.get_user_profile, username)
+
+    # transcript_mode=ref：提示词只带原文引用，全文保留在 transcript 中供工具展开与落库
+    if body.get('transcript_mode', config.TRANSCRIPT_MODE) == 'ref':
+        data.update(meeting=transcripts.outline(transcripts.register(m, username), username), transcript=m)
+
+    return registry.get("chat"), data, run_agent_async_generator
+
+
+def prepare_mindmap(body: dict, username: str):
+    from agent import registry, run_mindmap_async_generator
+
+    # record_id 为 /api/meetings 返回的已入库会议 id，可直接由结构化结果生成；
+    # 与 /api/chat 的 meeting_id（原文内容哈希）不是同一种标识
+    c = body.get('conclusion', '')
+    data = {"conclusion": c, "record_id": body.get('record_id'), "username": username}
+    return registry.get("mindmap"), data, run_mindmap_async_generator
+
+
+def prepare_preference(body: dict, username: str):
+    from agent import registry, run_agent_async_generator
+
+    c = body.get('query')
+    if c is None:
+        return None
+    return registry.get("preference"), {"input": c, "username": username}, run_agent_async_generator
+
+
 @app.route('/api/chat', methods=['POST'])
 @jwt_required()
 def chat():
-    m = request.json.get('meeting', meeting)
-    if m.strip() == '':
-        m = meeting
-    query = request.json.get('query', '请总结会议内容')
-    if query.strip() == '':
-        query = '请总结会议内容'
-    username = get_jwt_identity()
+    from agent import generate_answer
 
-    agent_executor = create_agent()
-    return Response(generate_answer(agent_executor, {"input": query, "meeting": m, "username": username}),
-                    mimetype='text/event-stream')
+    busy = overloaded_response()
+    if busy:
+        return busy
+    prepared = prepare_chat(request.json, get_jwt_identity())
+    if prepared is None:
+        return jsonify({"msg": "会议不存在，请先上传会议原文"}), 404
+    chain, data, runner = prepared
+    options = StreamOptions.from_request(request.headers)
+    return Response(generate_answer(chain, data, runner=runner, no_cache=no_cache_requested(request.json, request.headers),
+                                    options=options, endpoint=request.path),
+                    mimetype='text/event-stream', headers=options.response_headers)
 
 @app.route('/api/chat/test', methods=['POST'])
 @jwt_required()
 def chat_test():
     def fake_gen():
-        with open("config/demo_result.txt") as f:
+        with open(config.prompt_path("demo_result.txt"), encoding="utf-8") as f:
             yield f.read()
 
     return Response(fake_gen(), mimetype='text/event-stream')
@@ -56,20 +150,222 @@ def chat_test():
 @app.route('/api/mindmap', methods=['POST'])
 @jwt_required()
 def gen_mindmap():
-    c = request.json.get('conclusion', '')
-    chain = create_mindmap_chain()
-    return Response(generate_answer(chain, {"conclusion": c}), mimetype='text/event-stream')
+    from agent import generate_answer
+
+    busy = overloaded_response()
+    if busy:
+        return busy
+    chain, data, runner = prepare_mindmap(request.json, get_jwt_identity())
+    options = StreamOptions.from_request(request.headers)
+    return Response(generate_answer(chain, data, runner=runner, no_cache=no_cache_requested(request.json, request.headers),
+                                    options=options, endpoint=request.path),
+                    mimetype='text/event-stream', headers=options.response_headers)
 
 
 @app.route('/api/preference', methods=['POST'])
 @jwt_required()
 def gen_preference():
-    c = request.json.get('query')
-    if c is None:
+    from agent import generate_answer
+
+    busy = overloaded_response()
+    if busy:
+        return busy
+    prepared = prepare_preference(request.json, get_jwt_identity())
+    if prepared is None:
         return Response("请输入文本", mimetype='text/event-stream'), 500
-    current_user = get_jwt_identity()
-    chain = create_pref_agent()
-    return Response(generate_answer(chain, {"query": c, "username": current_user}), mimetype='text/event-stream')
+    chain, data, runner = prepared
+    options = StreamOptions.from_request(request.headers)
+    return Response(generate_answer(chain, data, runner=runner, no_cache=no_cache_requested(request.json, request.headers),
+                                    options=options, endpoint=request.path),
+                    mimetype='text/event-stream', headers=options.response_headers)
+
+
+def page_args():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return limit, request.args.get('cursor') or None
+
+
+@app.route('/api/meetings', methods=['GET'])
+@jwt_required()
+def list_meetings():
+    limit, cursor = page_args()
+    user = db.get_user(get_jwt_identity())
+    if user is None:
+        return jsonify({"msg": "用户不存在"}), 404
+    try:
+        return jsonify(db.get_user_meetings_page(user["user_id"], limit=limit, cursor=cursor)), 200
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+
+
+@app.route('/api/todos', methods=['GET'])
+@jwt_required()
+def list_todos():
+    limit, cursor = page_args()
+    statuses = request.args.getlist('status') or None
+    user = db.get_user(get_jwt_identity())
+    if user is None:
+        return jsonify({"msg": "用户不存在"}), 404
+    try:
+        return jsonify(db.get_user_todos_page(user["user_id"], limit=limit, cursor=cursor, statuses=statuses)), 200
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+
+
+@app.route('/api/search', methods=['GET'])
+@jwt_required()
+def search_meetings():
+    """全文检索当前用户的会议主题、原文、议程结论、待办与跟进事项，kind 可多选过滤"""
+    limit, cursor = page_args()
+    kinds = request.args.getlist('kind') or None
+    user = db.get_user(get_jwt_identity())
+    if user is None:
+        return jsonify({"msg": "用户不存在"}), 404
+    try:
+        return jsonify(db.search(user["user_id"], request.args.get('q', ''), kinds=kinds, limit=limit,
+                                 cursor=cursor)), 200
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    except NotImplementedError as e:
+        return jsonify({"msg": str(e)}), 501
+
+
+@app.route('/api/todos', methods=['PATCH'])
+@jwt_required()
+def patch_todos():
+    body = request.json
+    items = body.get('todos') if isinstance(body, dict) else body
+    user = db.get_user(get_jwt_identity())
+    if user is None:
+        return jsonify({"msg": "用户不存在"}), 404
+    try:
+        updated = bulk_update_todos(user["user_id"], items)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify({"updated": updated}), 200
+
+
+@app.route('/api/meetings/upload', methods=['POST'])
+@jwt_required()
+def upload_meeting():
+    """请求体为 UTF-8 纯文本会议原文，按流读取；请求头 X-Content-SHA256 为本人已上传过的内容时无需读取请求体"""
+    user = db.get_user(get_jwt_identity())
+    if user is None:
+        return jsonify({"msg": "用户不存在"}), 404
+    known_hash = (request.headers.get('X-Content-SHA256') or '').lower()
+    if known_hash and db.has_transcript(known_hash, user["user_id"]):
+        return jsonify({"meeting_id": known_hash, "size": None, "stored_bytes": None, "duplicate": True}), 200
+    try:
+        result = upload_transcript(request.stream, user["user_id"])
+    except OverflowError as e:
+        return jsonify({"msg": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    return jsonify(result), 200 if result["duplicate"] else 201
+
+
+def live_text(body) -> str:
+    text = body.get('text', '') if isinstance(body, dict) else ''
+    return text if isinstance(text, str) else ''
+
+
+@app.route('/api/live', methods=['POST'])
+@jwt_required()
+def create_live_session():
+    """创建实时会议会话，可在请求体 text 中带上已有的开头部分"""
+    from live import live_sessions
+
+    username = get_jwt_identity()
+    user = db.get_user(username)
+    if user is None:
+        return jsonify({"msg": "用户不存在"}), 404
+    session = live_sessions.create(username, user["user_id"])
+    text = live_text(request.get_json(silent=True))
+    progress = live_sessions.append(session, text) if text.strip() else session.progress()
+    return jsonify(progress), 201
+
+
+@app.route('/api/live/<session_id>/segments', methods=['POST'])
+@jwt_required()
+def append_live_segment(session_id):
+    from live import live_sessions
+
+    session = live_sessions.get(session_id, get_jwt_identity())
+    if session is None:
+        return jsonify({"msg": "会话不存在"}), 404
+    text = live_text(request.get_json(silent=True))
+    if not text.strip():
+        return jsonify({"msg": "请输入文本"}), 400
+    try:
+        return jsonify(live_sessions.append(session, text)), 202
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 409
+
+
+@app.route('/api/live/<session_id>/events', methods=['GET'])
+@jwt_required()
+def live_session_events(session_id):
+    """订阅会话变化：先推送一次 snapshot，之后推送 agendas / todos / follow_ups / basic_info 的新增或更新条目"""
+    from live import live_sessions
+
+    session = live_sessions.get(session_id, get_jwt_identity())
+    if session is None:
+        return jsonify({"msg": "会话不存在"}), 404
+    options = StreamOptions.from_request(request.headers)
+    return Response(runtime.iterate(encode_stream(session.subscribe(), options)),
+                    mimetype='text/event-stream', headers=options.response_headers)
+
+
+@app.route('/api/live/<session_id>/close', methods=['POST'])
+@jwt_required()
+def close_live_session(session_id):
+    """处理完剩余片段后结束会话并持久化，返回最终的会议记录"""
+    from live import live_sessions
+
+    session = live_sessions.get(session_id, get_jwt_identity())
+    if session is None:
+        return jsonify({"msg": "会话不存在"}), 404
+    record = live_sessions.close(session)
+    return jsonify(record.model_dump(exclude={"raw_text", "user_id"})), 200
+
+
+def collect_runtime_metrics():
+    """导出时采集提取缓存命中情况、后台写入队列、LLM 调度与向量索引状态"""
+    lookups = {(("outcome", outcome), ("tool", tool)): count
+               for tool, outcomes in extraction_cache.stats().items() for outcome, count in outcomes.items()}
+    writer = meeting_writer.metrics()
+    lines = sample_lines("extraction_cache_lookups_total", "提取结果缓存查询次数", lookups, "counter")
+    lines += sample_lines("meeting_writer_queue_depth", "会议记录写入队列长度", {(): writer["queue_depth"]})
+    lines += sample_lines("meeting_writer_last_flush_seconds", "最近一次批量写入耗时",
+                          {(): writer["last_flush_seconds"]})
+    lines += sample_lines("meeting_writer_records_total", "会议记录写入结果",
+                          {(("outcome", k),): writer[k] for k in ("enqueued", "written", "failed", "dropped")},
+                          "counter")
+    lines += sample_lines("meeting_writer_flush_seconds_total", "批量写入累计耗时", {(): writer["flush_seconds_total"]},
+                          "counter")
+    lines += sample_lines("meeting_writer_flushes_total", "批量写入次数", {(): writer["flushes"]}, "counter")
+    governor = llm_governor.metrics()
+    lines += sample_lines("llm_inflight", "在途的 LLM 调用数", {(): governor["inflight"]})
+    lines += sample_lines("llm_queue_depth", "排队等待的 LLM 调用数", {(): governor["queue_depth"]})
+    lines += sample_lines("llm_calls_total", "LLM 调用调度结果",
+                          {(("outcome", k),): governor[k] for k in ("admitted", "queued", "rejected", "retries")},
+                          "counter")
+    from db.vectors import vector_index
+
+    vectors = vector_index.metrics()
+    lines += sample_lines("vector_index_chunks", "向量索引中的文本块数", {(): vectors["chunks"]})
+    lines += sample_lines("vector_index_searches_total", "向量检索的问题数", {(): vectors["searches"]}, "counter")
+    lines += sample_lines("vector_index_search_seconds_total", "向量检索累计耗时",
+                          {(): vectors["search_seconds_total"]}, "counter")
+    return lines
+
+
+metrics.register_collector(collect_runtime_metrics)
+
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 if __name__ == "__main__":
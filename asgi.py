@@ -0,0 +1,256 @@
+"""
+流式接口的 ASGI 入口：/api/chat、/api/mindmap、/api/preference，以及实时会议的 /api/live 整组接口。
+
+每个 SSE 连接只是事件循环上的一个协程，不再独占一个工作线程，适合承载大量并发长连接，
+其中实时会议的 events 订阅会持续整场会议。实时会话保存在进程内，/api/live 下的接口须全部转发到这里。
+其余接口（登录等）仍由 app.py 的 Flask 应用提供，可由反向代理按路径分流，例如：
+
+    uvicorn asgi:app --port 5001
+"""
+import asyncio
+import json
+import re
+import time
+
+from flask_jwt_extended import decode_token
+
+from app import app as flask_app, live_text, prepare_chat, prepare_mindmap, prepare_preference
+from db.manager import db
+from governor import llm_governor
+from runtime import runtime
+from sse import StreamOptions, encode_stream
+from tracing import start_trace
+
+# 路径 -> (参数解析函数, 是否可跳过缓存, 参数解析返回 None 时的响应)
+ROUTES = {
+    "/api/chat": (prepare_chat, True, (404, "会议不存在，请先上传会议原文")),
+    "/api/mindmap": (prepare_mindmap, True, (500, "请输入文本")),
+    "/api/preference": (prepare_preference, True, (500, "请输入文本")),
+}
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Authorization, Content-Type, Cache-Control"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+]
+
+
+async def send_json(send, status: int, payload: dict, headers: list = None):
+    body = json.dumps(payload).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json")] + (headers or []) + CORS_HEADERS})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return b""
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+def stream_options(headers: dict) -> StreamOptions:
+    return StreamOptions.from_request({"X-SSE-Options": headers.get("x-sse-options"),
+                                       "Accept-Encoding": headers.get("accept-encoding")})
+
+
+async def send_stream(send, receive, chunks, options: StreamOptions, trace=None):
+    """
+    把运行时循环上的 SSE 帧转发给客户端；客户端断开时取消上游，不必等到下一帧写失败。
+    传入 trace 时按 send 实际写出的耗时记录各帧，转发结束后结束追踪。
+    """
+    response_headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in options.response_headers.items()]
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream")] + response_headers + CORS_HEADERS})
+
+    async def forward():
+        async for chunk in runtime.aiterate(chunks):
+            body = chunk if isinstance(chunk, bytes) else chunk.encode("utf-8")
+            start = time.perf_counter()
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+            if trace is not None:
+                trace.mark_frame(len(body), time.perf_counter() - start)
+        await send({"type": "http.response.body", "body": b""})
+
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    forwarding = asyncio.ensure_future(forward())
+    tasks = [forwarding, asyncio.ensure_future(disconnected())]
+    error = None
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if forwarding not in done:
+            error = asyncio.CancelledError("客户端已断开")
+        for task in done:
+            task.result()
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if trace is not None:
+            trace.finish(error)
+
+
+# ---- 实时会议，与 app.py 中的同名视图行为一致 ----
+async def live_create(send, receive, username: str, body: dict, headers: dict):
+    from live import live_sessions
+
+    user = await asyncio.to_thread(db.get_user, username)
+    if user is None:
+        await send_json(send, 404, {"msg": "用户不存在"})
+        return
+    session = live_sessions.create(username, user["user_id"])
+    text = live_text(body)
+    progress = await live_sessions.aappend(session, text) if text.strip() else session.progress()
+    await send_json(send, 201, progress)
+
+
+async def live_append(send, receive, username: str, body: dict, headers: dict, session_id: str):
+    from live import live_sessions
+
+    session = live_sessions.get(session_id, username)
+    if session is None:
+        await send_json(send, 404, {"msg": "会话不存在"})
+        return
+    text = live_text(body)
+    if not text.strip():
+        await send_json(send, 400, {"msg": "请输入文本"})
+        return
+    try:
+        await send_json(send, 202, await live_sessions.aappend(session, text))
+    except ValueError as e:
+        await send_json(send, 409, {"msg": str(e)})
+
+
+async def live_events(send, receive, username: str, body: dict, headers: dict, session_id: str):
+    from live import live_sessions
+
+    session = live_sessions.get(session_id, username)
+    if session is None:
+        await send_json(send, 404, {"msg": "会话不存在"})
+        return
+    options = stream_options(headers)
+    await send_stream(send, receive, encode_stream(session.subscribe(), options), options)
+
+
+async def live_close(send, receive, username: str, body: dict, headers: dict, session_id: str):
+    from live import live_sessions
+
+    session = live_sessions.get(session_id, username)
+    if session is None:
+        await send_json(send, 404, {"msg": "会话不存在"})
+        return
+    record = await live_sessions.aclose(session)
+    await send_json(send, 200, record.model_dump(exclude={"raw_text", "user_id"}))
+
+
+# (方法, 路径) -> 处理函数，路径中的分组作为额外参数传入
+LIVE_ROUTES = [
+    ("POST", re.compile(r"/api/live"), live_create),
+    ("POST", re.compile(r"/api/live/(\w+)/segments"), live_append),
+    ("GET", re.compile(r"/api/live/(\w+)/events"), live_events),
+    ("POST", re.compile(r"/api/live/(\w+)/close"), live_close),
+]
+
+
+def match_live(path: str) -> dict:
+    """返回该路径上 方法 -> (处理函数, 路径参数)"""
+    handlers = {}
+    for method, pattern, handler in LIVE_ROUTES:
+        m = pattern.fullmatch(path)
+        if m:
+            handlers[method] = (handler, m.groups())
+    return handlers
+
+
+def load_stream(prepare, body: dict, username: str):
+    """在线程中执行：导入 answer_stream 并解析参数，返回 (answer_stream, prepare 的结果)"""
+    from agent import answer_stream
+
+    return answer_stream, prepare(body, username)
+
+
+def authenticate(headers: dict):
+    """与 @jwt_required() 使用同一套密钥校验 Bearer Token，返回用户身份或 None"""
+    auth = headers.get("authorization", "")
+    if not auth.startswith("Bearer "):
+        return None
+    try:
+        with flask_app.app_context():
+            return decode_token(auth[len("Bearer "):])["sub"]
+    except Exception:
+        return None
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # 提前启动共享事件循环，避免首个请求承担启动开销
+                runtime.loop
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] != "http":
+        return
+
+    route = ROUTES.get(scope["path"])
+    live = match_live(scope["path"])
+    if route is None and not live:
+        await send_json(send, 404, {"msg": "Not Found"})
+        return
+    if scope["method"] == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    if scope["method"] not in (live if live else ("POST",)):
+        await send_json(send, 405, {"msg": "Method Not Allowed"})
+        return
+
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+    username = authenticate(headers)
+    if username is None:
+        await send_json(send, 401, {"msg": "Missing or invalid Authorization header"})
+        return
+
+    try:
+        body = json.loads(await read_body(receive) or b"{}")
+    except ValueError:
+        await send_json(send, 400, {"msg": "请求体必须为 JSON"})
+        return
+
+    if live:
+        handler, args = live[scope["method"]]
+        await handler(send, receive, username, body, headers, *args)
+        return
+
+    retry_after = llm_governor.check_admission()
+    if retry_after is not None:
+        await send_json(send, 429, {"msg": f"服务繁忙，请 {retry_after} 秒后重试"},
+                        [(b"retry-after", str(retry_after).encode("latin-1"))])
+        return
+
+    prepare, cacheable, (missing_status, missing_msg) = route
+    # 首次导入 agent 要加载 LangChain，prepare 中还有数据库查询，都放到线程中执行，不阻塞循环上其他 SSE 连接
+    answer_stream, prepared = await asyncio.to_thread(load_stream, prepare, body, username)
+    if prepared is None:
+        await send_json(send, missing_status, {"msg": missing_msg})
+        return
+    chain, data, runner = prepared
+    no_cache = cacheable and (bool(body.get("no_cache")) or headers.get("cache-control") == "no-cache")
+
+    options = stream_options(headers)
+    trace = start_trace(scope["path"])
+    await send_stream(send, receive, answer_stream(chain, data, runner=runner, no_cache=no_cache, options=options,
+                                                   trace=trace), options, trace)
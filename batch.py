@@ -0,0 +1,247 @@
+"""
+批量处理会议原文归档：并行执行提取工具，按批在一个事务中入库，并写检查点以便中断后续跑。
+
+输入为目录（其中每个 .txt / .md 文件是一篇原文，以相对路径为标识）或 JSONL 文件
+（每行 {"id": 可选, "text": 原文, "username": 可选}，缺少 id 时以原文哈希为标识）：
+
+    python batch.py archive/ --username alice --workers 8 --rate 2 --checkpoint archive.ckpt
+    python batch.py archive.jsonl --checkpoint archive.ckpt
+
+每批记录提交成功后才把其标识追加到检查点，重跑时跳过检查点中已有的原文；提取或入库失败的原文不写检查点，
+下次运行会重新处理。LLM 调用仍经 llm_governor 调度，--workers 只限制同时处理的原文数。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import config
+from action.transcript import transcript_id
+from agent import PIPELINE_EXTRACTORS, build_meeting_record
+from db.manager import db
+from db.service import MeetingService
+from governor import current_username
+from runtime import runtime
+
+TEXT_SUFFIXES = (".txt", ".md")
+
+# (标识, 原文, 用户名)
+Item = Tuple[str, str, Optional[str]]
+
+
+def load_items(source: str) -> Iterator[Item]:
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(TEXT_SUFFIXES):
+                    path = os.path.join(root, name)
+                    with open(path, encoding="utf-8") as f:
+                        yield os.path.relpath(path, source), f.read(), None
+        return
+    with open(source, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                print(f"⚠️ 第 {number} 行不是合法 JSON，已跳过")
+                continue
+            text = obj.get("text") or ""
+            yield str(obj.get("id") or transcript_id(text)), text, obj.get("username")
+
+
+class Checkpoint:
+    """追加写的 JSONL 检查点，每条已入库的原文一行 {"id", "meeting_id"}"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.done = set()
+        self._file = None
+        if not path:
+            return
+        tail = ""
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    tail = line
+                    try:
+                        self.done.add(json.loads(line)["id"])
+                    except (ValueError, KeyError):
+                        # 进程崩溃时可能残留半行
+                        continue
+        self._file = open(path, "a", encoding="utf-8")
+        if tail and not tail.endswith("\n"):
+            self._file.write("\n")
+
+    def record(self, entries: List[dict]) -> None:
+        self.done.update(e["id"] for e in entries)
+        if self._file is None:
+            return
+        self._file.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+class RateLimiter:
+    """每秒最多放行 rate 次；只在运行时循环上使用，无需加锁"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Progress:
+    def __init__(self, total: int, skipped: int, report_seconds: float):
+        self.total = total
+        self.skipped = skipped
+        self.report_seconds = report_seconds
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self._reported = self.start
+
+    def maybe_report(self) -> None:
+        if time.monotonic() - self._reported >= self.report_seconds:
+            self.report()
+
+    def report(self) -> None:
+        self._reported = now = time.monotonic()
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = self.total - self.done - self.failed
+        eta = f"{remaining / rate:.0f}s" if rate else "未知"
+        print(f"[batch] {self.done + self.failed}/{self.total} | 成功 {self.done} 失败 {self.failed} "
+              f"跳过 {self.skipped} | {rate:.2f} 条/秒 | 预计剩余 {eta}", flush=True)
+
+
+class BatchRunner:
+    def __init__(self, service: MeetingService, checkpoint: Checkpoint, workers: int = None, rate: float = None,
+                 commit_size: int = None, report_seconds: float = None, default_username: str = None):
+        self.service = service
+        self.checkpoint = checkpoint
+        self.workers = workers or config.BATCH_WORKERS
+        self.limiter = RateLimiter(config.BATCH_RATE if rate is None else rate)
+        self.commit_size = commit_size or config.BATCH_COMMIT_SIZE
+        self.report_seconds = config.BATCH_REPORT_SECONDS if report_seconds is None else report_seconds
+        self.default_username = default_username
+        self._user_ids: Dict[str, Optional[int]] = {}
+        self._buffer: List[tuple] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.progress: Optional[Progress] = None
+
+    async def run(self, items: List[Item]) -> Progress:
+        pending = [item for item in items if item[0] not in self.checkpoint.done]
+        self.progress = Progress(len(pending), len(items) - len(pending), self.report_seconds)
+        self._flush_lock = asyncio.Lock()
+        # 各 worker 共享同一个迭代器，谁空闲谁取下一条
+        queue = iter(pending)
+        await asyncio.gather(*(self._worker(queue) for _ in range(min(self.workers, len(pending)))))
+        await self._flush()
+        self.progress.report()
+        return self.progress
+
+    async def _worker(self, queue: Iterator[Item]) -> None:
+        for item_id, text, username in queue:
+            await self.limiter.wait()
+            try:
+                record = await self._extract(text, username or self.default_username)
+            except Exception as e:
+                self.progress.failed += 1
+                print(f"❌ {item_id}: {e}")
+            else:
+                self._buffer.append((item_id, record))
+                if len(self._buffer) >= self.commit_size:
+                    await self._flush()
+            self.progress.maybe_report()
+
+    async def _extract(self, text: str, username: Optional[str]):
+        if not text.strip():
+            raise ValueError("原文为空")
+        if not username:
+            raise ValueError("未指定用户名")
+        user_id = await self._user_id(username)
+        current_username.set(username)
+        outputs = await asyncio.gather(*(e.ainvoke({"text": text}) for e in PIPELINE_EXTRACTORS),
+                                       return_exceptions=True)
+        # 任一工具失败都整条重做，避免以空值兜底的残缺记录写入检查点
+        for extractor, output in zip(PIPELINE_EXTRACTORS, outputs):
+            if isinstance(output, Exception):
+                raise RuntimeError(f"{extractor.name} 调用失败: {output}") from output
+        return build_meeting_record({e.name: o for e, o in zip(PIPELINE_EXTRACTORS, outputs)}, raw_text=text,
+                                    user_id=user_id)
+
+    async def _user_id(self, username: str) -> int:
+        if username not in self._user_ids:
+            user = await asyncio.to_thread(db.get_user, username)
+            self._user_ids[username] = user["user_id"] if user else None
+        if self._user_ids[username] is None:
+            raise ValueError(f"用户 {username} 不存在")
+        return self._user_ids[username]
+
+    async def _flush(self) -> None:
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                meeting_ids = await asyncio.to_thread(self.service.process_meeting_records, [r for _, r in batch])
+                committed = list(zip(batch, meeting_ids))
+            except Exception:
+                # 整批回滚后逐条重试，单条坏数据不拖累同批的其他记录
+                committed = []
+                for entry in batch:
+                    try:
+                        committed.append((entry, await asyncio.to_thread(self.service.process_meeting_record,
+                                                                         entry[1])))
+                    except Exception as e:
+                        self.progress.failed += 1
+                        print(f"❌ {entry[0]}: 入库失败: {e}")
+            await asyncio.to_thread(self.checkpoint.record, [{"id": item_id, "meeting_id": meeting_id}
+                                                             for (item_id, _), meeting_id in committed])
+            self.progress.done += len(committed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量处理会议原文归档")
+    parser.add_argument("source", help="原文目录或 JSONL 文件")
+    parser.add_argument("--username", help="JSONL 行未指定 username 时使用的用户；目录输入时必填")
+    parser.add_argument("--checkpoint", help="检查点文件，默认为 <source>.ckpt")
+    parser.add_argument("--workers", type=int, default=config.BATCH_WORKERS, help="同时处理的原文数")
+    parser.add_argument("--rate", type=float, default=config.BATCH_RATE, help="每秒最多开始处理的原文数，0 表示不限")
+    parser.add_argument("--commit-size", type=int, default=config.BATCH_COMMIT_SIZE, help="每个写入事务的记录数")
+    parser.add_argument("--report-seconds", type=float, default=config.BATCH_REPORT_SECONDS, help="进度输出间隔")
+    args = parser.parse_args()
+
+    db.init_schema()
+    items = list(load_items(args.source))
+    checkpoint = Checkpoint(args.checkpoint or args.source.rstrip("/\\") + ".ckpt")
+    runner = BatchRunner(MeetingService(db), checkpoint, workers=args.workers, rate=args.rate,
+                         commit_size=args.commit_size, report_seconds=args.report_seconds,
+                         default_username=args.username)
+    try:
+        progress = runtime.run(runner.run(items))
+    finally:
+        checkpoint.close()
+    sys.exit(1 if progress.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
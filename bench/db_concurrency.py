@@ -0,0 +1,82 @@
+"""
+SQLite 读写并发基准：对比默认日志模式与 WAL + synchronous=NORMAL + busy_timeout 的吞吐。
+
+    python -m bench.db_concurrency --readers 8 --writers 4 --seconds 5
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from db.manager import MeetingDB, sqlite_pragmas
+
+
+def run(pragmas: dict, readers: int, writers: int, seconds: float) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+    db = MeetingDB(f"sqlite:///{path}", pragmas=pragmas)
+    db.init_schema()
+    user_id = db.add_user("bench", "bench")
+    for i in range(50):
+        db.add_meeting(user_id, f"meeting {i}", datetime(2026, 1, 1, i % 24), attendees=["张三", "李四"])
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def reader():
+        while time.monotonic() < stop:
+            try:
+                db.get_user_preference_dict(user_id)
+                db.get_user_meetings_page(user_id, limit=20)
+                key = "reads"
+            except Exception:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+
+    def writer():
+        while time.monotonic() < stop:
+            try:
+                db.add_user_preference(user_id, f"category_{random.randint(0, 20)}", str(random.random()))
+                key = "writes"
+            except Exception:
+                key = "errors"
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + \
+              [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    db.engine.dispose()
+
+    return {
+        "pragmas": pragmas,
+        "reads_per_second": round(counts["reads"] / seconds, 1),
+        "writes_per_second": round(counts["writes"] / seconds, 1),
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 读写并发基准")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    results = {
+        "baseline": run({}, args.readers, args.writers, args.seconds),
+        "tuned": run(sqlite_pragmas(), args.readers, args.writers, args.seconds),
+    }
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+脚本化的假聊天模型：替换 ChatDeepSeek，使整个 Agent / 提取链在无网络、零 token 消耗下按固定脚本运行。
+
+必须在导入 agent / action.tools 之前调用 install()，二者在导入时即构建模型实例：
+
+    from bench import fake_llm
+    fake_llm.install(token_delay=0.005)
+    import agent
+"""
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+# 按提示词中出现的特征串选择脚本，自上而下匹配第一个命中的脚本（偏好模板中也提到 get_user_info，故排在前面）
+# 每一步为 {"action": 工具名, "input": 参数} 或 {"answer": token 数, "prefix": 前缀}
+# 当前步序号 = 本轮问题之后已出现的 Observation 数，因此模型本身无状态，可被任意并发共享
+# input 为 {transcript} 时模仿真实模型的行为：提示词中有原文引用则填引用，否则把内嵌的原文整段复述到 Action Input
+# 带 unless 的步骤在提示词包含该特征串时跳过（如提示词已内嵌用户画像时不再调用 get_user_info）
+DEFAULT_SCRIPTS: List[Dict[str, Any]] = [
+    {"match": "generate_user_preferences", "steps": [
+        {"answer": 60, "prefix": "Thought: 用户偏好已明确。\nFinal Answer: "},
+    ]},
+    {"match": "get_user_info", "steps": [
+        {"action": "get_user_info", "input": "bench", "unless": '"preferences":'},
+        {"action": "extract_meeting_basic_info", "input": "{transcript}"},
+        {"action": "parse_meeting_agenda_conclusion", "input": "{transcript}"},
+        {"action": "generate_meeting_todo", "input": "{transcript}"},
+        {"action": "mark_meeting_follow_up", "input": "{transcript}"},
+        {"answer": 400, "prefix": "Thought: 我已整理好所有信息，正在构建最终回复。\nFinal Answer: "},
+    ]},
+    {"match": "", "steps": [
+        {"answer": 200, "prefix": ""},
+    ]},
+]
+
+# with_structured_output 的固定返回值，按 schema 类名索引
+STRUCTURED_FIXTURES: Dict[str, dict] = {
+    "BasicInfo": {"attendees": ["张三", "李四", "王五"], "time": "2026-01-05 10:00",
+                  "subject": "季度经营复盘", "duration": "1小时"},
+    "AgendaList": {"items": [
+        {"agenda": "关于Q1预算的审核", "conclusion": "通过预算，营销费用削减20%"},
+        {"agenda": "新版本上线计划", "conclusion": "定于下月初灰度发布"},
+    ]},
+    "TodoList": {"todos": [
+        {"owner": "张三", "task": "整理预算调整明细", "deadline": "2026-01-08 18:00"},
+        {"owner": "李四", "task": "准备灰度发布方案", "deadline": "待确认"},
+    ]},
+    "FollowUpList": {"follow_ups": [
+        {"topic": "渠道费用口径", "reason": "财务数据尚未核实"},
+    ]},
+    "PreferenceList": {"preferences": [
+        {"category": "输出格式", "preference": "精简模式"},
+    ]},
+}
+
+TRANSCRIPT_REF = re.compile(r"T-[0-9a-f]{12}")
+MEETING_SECTION = re.compile(r"会议原文\*\*：(.*?)\n- \*\*当前用户", re.S)
+
+TOKEN_POOL = ["<tr>", "<td>", "会议", "结论", "</td>", "待办", "负责人", "<b>", "预算", "</b>", "。", "</tr>\n"]
+
+
+class FakeSettings:
+    def __init__(self):
+        self.token_delay = 0.0
+        self.first_token_delay = 0.0
+        self.structured_delay = 0.0
+        self.scripts = DEFAULT_SCRIPTS
+        self._lock = threading.Lock()
+        self.tokens = 0
+        self.prompt_tokens = 0
+        self.calls = 0
+        self.structured_calls = 0
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, key, getattr(self, key) + amount)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"tokens": self.tokens, "prompt_tokens": self.prompt_tokens, "calls": self.calls,
+                    "structured_calls": self.structured_calls}
+
+
+settings = FakeSettings()
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(m.content if isinstance(m.content, str) else json.dumps(m.content) for m in messages)
+
+
+def estimate_tokens(text: str) -> int:
+    """按字符数粗略估算 token 数，中文约 0.6 token/字"""
+    return int(len(text) * 0.6) + 1
+
+
+def _tool_input(value: str, prompt: str) -> str:
+    if value != "{transcript}":
+        return value
+    ref = TRANSCRIPT_REF.search(prompt)
+    if ref:
+        return ref.group(0)
+    section = MEETING_SECTION.search(prompt)
+    return section.group(1).strip() if section else "会议原文"
+
+
+def script_tokens(prompt: str) -> List[str]:
+    """根据提示词确定脚本与当前步，返回本次应输出的 token 序列"""
+    script = next(s for s in settings.scripts if s["match"] in prompt)
+    # ReAct 提示词的格式说明里本身也有 Observation，只统计最后一个 Question 之后的部分
+    scratchpad = prompt.rsplit("Question:", 1)[-1]
+    steps = [s for s in script["steps"] if not (s.get("unless") and s["unless"] in prompt)]
+    step = steps[min(scratchpad.count("\nObservation:"), len(steps) - 1)]
+
+    if "action" in step:
+        text = f"Thought: 需要调用工具。\nAction: {step['action']}\nAction Input: {_tool_input(step['input'], prompt)}"
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+    tokens = [step.get("prefix", "")] if step.get("prefix") else []
+    return tokens + list(itertools.islice(itertools.cycle(TOKEN_POOL), step["answer"]))
+
+
+class FakeChatModel(BaseChatModel):
+    """与 ChatDeepSeek 构造参数兼容（多余参数忽略），按脚本流式产出，token 间隔由 settings 控制"""
+
+    model_name: str = "fake-deepseek"
+
+    def __init__(self, model: str = "fake-deepseek", **kwargs: Any):
+        super().__init__(model_name=model, callbacks=kwargs.get("callbacks"))
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-deepseek"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        settings.count("calls")
+        return script_tokens(_prompt_text(messages))
+
+    @staticmethod
+    def _chunk(token: str, messages: List[BaseMessage], tokens: List[str], last: bool) -> ChatGenerationChunk:
+        """最后一块附带用量，与开启 stream_usage 的真实模型一致"""
+        usage = None
+        if last:
+            prompt_tokens = estimate_tokens(_prompt_text(messages))
+            completion_tokens = estimate_tokens("".join(tokens))
+            settings.count("prompt_tokens", prompt_tokens)
+            usage = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+        return ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        chunks = list(self._stream(messages))
+        message = AIMessage(content="".join(c.message.content for c in chunks),
+                            usage_metadata=chunks[-1].message.usage_metadata if chunks else None)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any
+                ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(settings.first_token_delay)
+        tokens = self._tokens(messages)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(settings.token_delay)
+            settings.count("tokens")
+            chunk = self._chunk(token, messages, tokens, i == len(tokens) - 1)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any
+                       ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(settings.first_token_delay)
+        tokens = self._tokens(messages)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(settings.token_delay)
+            settings.count("tokens")
+            chunk = self._chunk(token, messages, tokens, i == len(tokens) - 1)
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        fixture = STRUCTURED_FIXTURES[schema.__name__]
+
+        def invoke(_):
+            settings.count("structured_calls")
+            time.sleep(settings.structured_delay)
+            return schema.model_validate(fixture)
+
+        async def ainvoke(_):
+            settings.count("structured_calls")
+            await asyncio.sleep(settings.structured_delay)
+            return schema.model_validate(fixture)
+
+        return RunnableLambda(invoke, afunc=ainvoke)
+
+
+def install(token_delay: float = 0.0, first_token_delay: float = 0.0, structured_delay: float = 0.0,
+            scripts: Optional[List[Dict[str, Any]]] = None) -> FakeSettings:
+    """用 FakeChatModel 替换 langchain_deepseek.ChatDeepSeek，之后导入的模块都会拿到假模型"""
+    import langchain_deepseek
+
+    settings.token_delay = token_delay
+    settings.first_token_delay = first_token_delay
+    settings.structured_delay = structured_delay
+    if scripts is not None:
+        settings.scripts = scripts
+    langchain_deepseek.ChatDeepSeek = FakeChatModel
+    return settings
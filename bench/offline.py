@@ -0,0 +1,302 @@
+"""
+离线基准：以 bench.fake_llm 的脚本化假模型替换 ChatDeepSeek，无网络、零 token 消耗地测量
+/api/chat、/api/mindmap、/api/preference 的首字节时间、总耗时、tokens/s 与 RPS，并附带 db/manager.py 的微基准。
+请求在进程内直接驱动 asgi.app，数据库为临时 SQLite，结果写为 JSON 便于比较回归。
+
+    python -m bench.offline -c 1 -c 10 -c 50 --token-delay 0.005 --output bench-results.json
+    python -m bench.offline --replay llm.rec --replay-scale 1 -c 10    # 回放 bench.replay 录制的真实模型输出
+    python -m bench.offline --compare old.json new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bench import fake_llm, replay
+
+# 当前使用的假模型设置（fake_llm 或 replay），统计字段一致
+model_settings = fake_llm.settings
+
+# 接口名 -> (路径, 请求体)；no_cache 保证每次都走完整的提取路径
+ENDPOINTS = {
+    "chat": ("/api/chat", {"query": "请总结会议内容", "no_cache": True}),
+    "chat_ref": ("/api/chat", {"query": "请总结会议内容", "transcript_mode": "ref", "no_cache": True}),
+    "chat_pipeline": ("/api/chat", {"query": "请总结会议内容", "mode": "pipeline", "no_cache": True}),
+    "mindmap": ("/api/mindmap", {"conclusion": "议程：预算审核；结论：削减营销费用", "no_cache": True}),
+    # 可解析的总结 HTML 与重复的 conclusion 都不调用 LLM
+    "mindmap_html": ("/api/mindmap", {"conclusion": "<h3>议程与结论</h3><table><tr><th>议程</th><th>结论</th></tr>"
+                                                    "<tr><td>预算审核</td><td>削减营销费用</td></tr></table>"}),
+    "mindmap_cached": ("/api/mindmap", {"conclusion": "议程：预算审核；结论：削减营销费用"}),
+    "preference": ("/api/preference", {"query": "以后总结请用精简模式", "no_cache": True}),
+}
+
+
+def percentile(values, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def summarize(samples, wall: float) -> dict:
+    """单项延迟样本（秒）-> 毫秒级统计"""
+    return {
+        "count": len(samples),
+        "ops_per_second": round(len(samples) / wall, 1) if wall else None,
+        "p50_ms": round(statistics.median(samples) * 1000, 3) if samples else None,
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3) if samples else None,
+    }
+
+
+async def call_asgi(app, path: str, body: dict, token: str) -> dict:
+    """在进程内发起一次请求，记录状态码、首个非空响应体的时间与总耗时"""
+    payload = json.dumps(body).encode("utf-8")
+    scope = {
+        "type": "http", "method": "POST", "path": path, "query_string": b"",
+        "headers": [(b"authorization", f"Bearer {token}".encode()), (b"content-type", b"application/json")],
+    }
+    result = {"status": None, "ttfb": None, "bytes": 0}
+    received = False
+    finished = asyncio.Event()
+    start = time.perf_counter()
+
+    async def receive():
+        # 按 ASGI 约定：请求体读完后阻塞到响应结束，才上报 http.disconnect；
+        # 立即返回会被服务端当作客户端已断开而取消流式响应
+        nonlocal received
+        if received:
+            await finished.wait()
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            if message.get("body"):
+                if result["ttfb"] is None:
+                    result["ttfb"] = time.perf_counter() - start
+                result["bytes"] += len(message["body"])
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["total"] = time.perf_counter() - start
+    result["ok"] = result["status"] == 200 and "error" not in result
+    return result
+
+
+async def run_level(app, path: str, body: dict, token: str, concurrency: int, rounds: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await call_asgi(app, path, body, token)
+
+    before = model_settings.stats()
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one() for _ in range(concurrency * rounds)])
+    wall = time.perf_counter() - start
+    after = model_settings.stats()
+    tokens = after["tokens"] - before["tokens"]
+
+    ok = [r for r in results if r["ok"]]
+    ttfbs = [r["ttfb"] for r in ok if r["ttfb"] is not None]
+    totals = [r["total"] for r in ok]
+    errors = sorted({r.get("error") or f"HTTP {r['status']}" for r in results if not r["ok"]})
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "errors": errors[:5],
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(ok) / wall, 2) if wall else None,
+        "tokens_per_second": round(tokens / wall, 1) if wall else None,
+        "prompt_tokens_per_request": round((after["prompt_tokens"] - before["prompt_tokens"]) / len(results)),
+        "completion_tokens_per_request": round(tokens / len(results)),
+        "ttfb_p50_ms": round(statistics.median(ttfbs) * 1000, 2) if ttfbs else None,
+        "ttfb_p95_ms": round(percentile(ttfbs, 0.95) * 1000, 2) if ttfbs else None,
+        "latency_p50_ms": round(statistics.median(totals) * 1000, 2) if totals else None,
+        "latency_p95_ms": round(percentile(totals, 0.95) * 1000, 2) if totals else None,
+    }
+
+
+def timed(fn, iterations: int) -> dict:
+    samples = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t)
+    return summarize(samples, time.perf_counter() - start)
+
+
+def bench_db(db, user_id: int, username: str, iterations: int) -> dict:
+    from action.models import MeetingRecord, BasicInfo, TodoItem
+    from db.service import MeetingService
+
+    service = MeetingService(db)
+    base = datetime(2026, 1, 1)
+    meeting_id = db.add_meeting(user_id, "seed", base, 60, ["张三"])
+    db.add_todos(user_id, meeting_id, [{"owner": "张三", "task": f"任务{i}", "deadline": base + timedelta(days=i)}
+                                       for i in range(200)])
+    todo_ids = [t["todo_id"] for t in db.get_user_todos(user_id)][:100]
+
+    def record(i):
+        return MeetingRecord(basic_info=BasicInfo(attendees=["张三", "李四"], time="2026-01-05 10:00",
+                                                  subject=f"批量{i}", duration="1小时"),
+                             agendas=[], todos=[TodoItem(owner="张三", task="跟进", deadline="待确认")],
+                             follow_ups=[], raw_text="", user_id=user_id)
+
+    return {
+        "add_meeting": timed(lambda i: db.add_meeting(user_id, f"m{i}", base + timedelta(hours=i), 30,
+                                                      ["张三", "李四"]), iterations),
+        "get_user_profile_cold": timed(lambda i: (db.invalidate_profile(user_id), db.get_user_profile(username)),
+                                       iterations),
+        "get_user_profile_warm": timed(lambda i: db.get_user_profile(username), iterations),
+        "get_user_meetings_page": timed(lambda i: db.get_user_meetings_page(user_id, limit=20), iterations),
+        "get_user_todos_page": timed(lambda i: db.get_user_todos_page(user_id, limit=20), iterations),
+        "get_user_preference_dict": timed(lambda i: db.get_user_preference_dict(user_id), iterations),
+        "update_todos_x100": timed(lambda i: db.update_todos(
+            [{"todo_id": t, "status": "in_progress" if i % 2 else "pending"} for t in todo_ids], user_id),
+            max(iterations // 10, 1)),
+        "process_meeting_records_x20": timed(lambda i: service.process_meeting_records(
+            [record(i * 20 + j) for j in range(20)]), max(iterations // 10, 1)),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """逐项对比两次结果的关键指标，打印变化比例"""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    for name, levels in new.get("endpoints", {}).items():
+        old_levels = {lvl["concurrency"]: lvl for lvl in old.get("endpoints", {}).get(name, [])}
+        for lvl in levels:
+            before = old_levels.get(lvl["concurrency"])
+            if not before:
+                continue
+            for key in ("ttfb_p50_ms", "latency_p95_ms", "requests_per_second", "tokens_per_second",
+                        "prompt_tokens_per_request"):
+                if before.get(key) and lvl.get(key) is not None:
+                    print(f"{name:<14} c={lvl['concurrency']:<4} {key:<20} {before[key]:>10} -> {lvl[key]:>10} "
+                          f"({(lvl[key] - before[key]) / before[key] * 100:+.1f}%)")
+    for name, after in new.get("db", {}).items():
+        before = old.get("db", {}).get(name)
+        if before and before.get("p50_ms"):
+            print(f"db.{name:<30} p50_ms {before['p50_ms']:>10} -> {after['p50_ms']:>10} "
+                  f"({(after['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100:+.1f}%)")
+
+
+async def run_endpoints(app, token: str, names, levels, rounds: int) -> dict:
+    results = {}
+    for name in names:
+        path, body = ENDPOINTS[name]
+        results[name] = []
+        for level in levels:
+            stats = await run_level(app, path, body, token, level, rounds)
+            print(json.dumps({"endpoint": name, **stats}, ensure_ascii=False))
+            results[name].append(stats)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无网络的端到端与数据库基准")
+    parser.add_argument("-c", "--concurrency", type=int, action="append", help="可重复指定多个并发级别")
+    parser.add_argument("--rounds", type=int, default=2, help="每个并发级别发起 concurrency * rounds 个请求")
+    parser.add_argument("--endpoint", action="append", choices=sorted(ENDPOINTS), help="默认全部")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="假模型每个 token 的间隔秒数")
+    parser.add_argument("--first-token-delay", type=float, default=0.05, help="假模型首 token 前的等待秒数")
+    parser.add_argument("--structured-delay", type=float, default=0.1, help="结构化提取调用的耗时秒数")
+    parser.add_argument("--script", help="自定义工具调用脚本 JSON 文件，格式同 fake_llm.DEFAULT_SCRIPTS")
+    parser.add_argument("--replay", help="以 bench.replay 录制的文件回放真实模型输出，替代脚本化假模型")
+    parser.add_argument("--replay-scale", type=float, default=1.0, help="回放节奏系数：1 为原始节奏，0 为不等待")
+    parser.add_argument("--db-iterations", type=int, default=200)
+    parser.add_argument("--output", help="结果 JSON 路径，默认仅打印")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="对比两份结果后退出")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    global model_settings
+    if args.replay:
+        model_settings = replay.install(args.replay, args.replay_scale)
+    else:
+        scripts = None
+        if args.script:
+            with open(args.script, encoding="utf-8") as f:
+                scripts = json.load(f)
+        fake_llm.install(args.token_delay, args.first_token_delay, args.structured_delay, scripts)
+
+    # config 在导入时读取环境变量，必须先于 asgi / app 设置
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite')}"
+    os.environ["VECTOR_INDEX_PATH"] = os.path.join(workdir, "vectors")
+    os.environ.setdefault("DEEPSEEK_API_KEY", "offline")
+    from flask_jwt_extended import create_access_token
+    from asgi import app
+    from app import app as flask_app
+    from db.manager import db
+    from db.writer import meeting_writer
+
+    username = "bench"
+    user_id = db.add_user(username, "bench")
+    with flask_app.app_context():
+        token = create_access_token(identity=username)
+
+    levels = args.concurrency or [1, 10, 50]
+    endpoints = asyncio.run(run_endpoints(app, token, args.endpoint or list(ENDPOINTS), levels, args.rounds))
+    meeting_writer.close()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "token_delay": args.token_delay,
+            "first_token_delay": args.first_token_delay,
+            "structured_delay": args.structured_delay,
+            "rounds": args.rounds,
+            "replay": args.replay,
+            "replay_scale": args.replay_scale if args.replay else None,
+            "fake_llm": model_settings.stats(),
+            "writer": meeting_writer.metrics(),
+        },
+        "endpoints": endpoints,
+        "db": bench_db(db, user_id, username, args.db_iterations),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    else:
+        print(json.dumps(results["db"], ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
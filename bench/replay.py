@@ -0,0 +1,378 @@
+"""
+LLM 调用的录制与回放：录制真实 ChatDeepSeek 的每次调用（逐块内容、块间耗时、工具调用分片与用量），
+回放时按原始或缩放后的节奏重新产出，使 Flask / Agent / SSE 全链路能在无网络下以真实的流式形态重复压测。
+
+与 bench.fake_llm 相同，录制器与回放模型都必须在导入 agent / action.tools 之前安装：
+
+    python -m bench.replay record llm.rec --endpoint chat --endpoint mindmap    # 需要 DEEPSEEK_API_KEY
+    python -m bench.replay info llm.rec
+    python -m bench.offline --replay llm.rec --replay-scale 0.5 -c 10 -c 50
+
+录制文件为 MAGIC 之后的若干帧，每帧：
+    <II 头长度, 块数>  头 JSON  块数 × <II 距上一块的微秒数, 文本字节数>  各块文本依次拼接
+头 JSON 含匹配键与少量附加字段（工具调用分片、用量），按块序号索引。回放时以 mmap 打开文件，
+加载只解析帧头，各块文本在产出时才从映射中切片解码，多路并发回放共享同一份页缓存而不复制文件。
+
+匹配依次尝试：完整提示词（含工具）的哈希、提示词开头 + 工具 + 当前 ReAct 步数、仅工具 + 步数；
+同一键有多条录制时轮流使用。提示词中的日期、用户画像等变化时会落到后两级，info 命令与统计中可看到各级命中数。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional, Tuple
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+MAGIC = b"LLMREC1\n"
+FRAME = struct.Struct("<II")
+CHUNK = struct.Struct("<II")
+# 第二级匹配取提示词开头的字符数
+HEAD_CHARS = 200
+LEVELS = ("exact", "head", "loose")
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(m.content if isinstance(m.content, str) else json.dumps(m.content) for m in messages)
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def match_keys(messages: List[BaseMessage], kwargs: Dict[str, Any]) -> List[str]:
+    """一次调用的三级匹配键，顺序同 LEVELS"""
+    prompt = _prompt_text(messages)
+    tools = ",".join(sorted(t.get("function", {}).get("name", "") for t in kwargs.get("tools") or []))
+    # 与 fake_llm 相同，以最后一个 Question 之后的 Observation 数作为 ReAct 步数
+    step = str(prompt.rsplit("Question:", 1)[-1].count("\nObservation:"))
+    return [_digest(tools, prompt), _digest(tools, step, prompt[:HEAD_CHARS]), f"{tools}#{step}"]
+
+
+# ---- 录制 ----
+class Recorder:
+    """多线程共享的追加写入器，一次调用写一帧"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames = 0
+        self._lock = threading.Lock()
+        if not os.path.exists(path) or not os.path.getsize(path):
+            with open(path, "wb") as f:
+                f.write(MAGIC)
+
+    def write(self, keys: List[str], chunks: List[Tuple[float, AIMessageChunk]]) -> None:
+        texts, extras = [], {}
+        for i, (_, message) in enumerate(chunks):
+            content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+            texts.append(content.encode("utf-8"))
+            extra = {}
+            if message.tool_call_chunks:
+                extra["tool_call_chunks"] = [{k: c.get(k) for k in ("name", "args", "id", "index")}
+                                             for c in message.tool_call_chunks]
+            if message.usage_metadata:
+                extra["usage_metadata"] = dict(message.usage_metadata)
+            if extra:
+                extras[str(i)] = extra
+        header = json.dumps({"keys": keys, "bytes": sum(map(len, texts)), "extras": extras},
+                            ensure_ascii=False).encode("utf-8")
+        frame = b"".join([FRAME.pack(len(header), len(chunks)), header,
+                          *(CHUNK.pack(min(int(delay * 1e6), 0xFFFFFFFF), len(t)) for (delay, _), t in
+                            zip(chunks, texts)),
+                          *texts])
+        with self._lock:
+            with open(self.path, "ab") as f:
+                f.write(frame)
+            self.frames += 1
+
+
+def _as_chunk(message: AIMessage) -> AIMessageChunk:
+    """非流式结果折算为单块，工具调用转为分片形式以便回放时统一处理"""
+    return AIMessageChunk(content=message.content, usage_metadata=message.usage_metadata, tool_call_chunks=[
+        {"name": c["name"], "args": json.dumps(c["args"], ensure_ascii=False), "id": c.get("id"), "index": i}
+        for i, c in enumerate(message.tool_calls)])
+
+
+def recording_class(base: type) -> type:
+    """以 base（通常是 ChatDeepSeek）为父类的录制模型，完整结束的调用才写入录制文件"""
+
+    class RecordingChatModel(base):
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            chunks, last = [], time.monotonic()
+            for chunk in super()._stream(messages, stop, run_manager, **kwargs):
+                now = time.monotonic()
+                chunks.append((now - last, chunk.message))
+                last = now
+                yield chunk
+            recorder.write(match_keys(messages, kwargs), chunks)
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            chunks, last = [], time.monotonic()
+            async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                now = time.monotonic()
+                chunks.append((now - last, chunk.message))
+                last = now
+                yield chunk
+            recorder.write(match_keys(messages, kwargs), chunks)
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            start = time.monotonic()
+            result = super()._generate(messages, stop, run_manager, **kwargs)
+            recorder.write(match_keys(messages, kwargs),
+                           [(time.monotonic() - start, _as_chunk(result.generations[0].message))])
+            return result
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            start = time.monotonic()
+            result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+            recorder.write(match_keys(messages, kwargs),
+                           [(time.monotonic() - start, _as_chunk(result.generations[0].message))])
+            return result
+
+    RecordingChatModel.__name__ = f"Recording{base.__name__}"
+    return RecordingChatModel
+
+
+recorder: Optional[Recorder] = None
+
+
+def install_recorder(path: str) -> Recorder:
+    """把 langchain_deepseek.ChatDeepSeek 替换为录制子类，之后导入的模块创建的模型都会录制"""
+    global recorder
+    import langchain_deepseek
+
+    recorder = Recorder(path)
+    langchain_deepseek.ChatDeepSeek = recording_class(langchain_deepseek.ChatDeepSeek)
+    return recorder
+
+
+# ---- 回放 ----
+class Recording:
+    """以 mmap 只读打开的录制文件；加载时只解析帧头建立索引，末尾未写完的半帧忽略"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} 不是录制文件")
+        # 帧 -> (块表偏移, 块数, 附加字段)
+        self.frames: List[Tuple[int, int, Dict[str, dict]]] = []
+        self._index: Dict[str, Dict[str, List[int]]] = {level: defaultdict(list) for level in LEVELS}
+        self._cursors: Counter = Counter()
+        self._lock = threading.Lock()
+
+        offset, size = len(MAGIC), len(self._mm)
+        while offset + FRAME.size <= size:
+            header_size, count = FRAME.unpack_from(self._mm, offset)
+            table = offset + FRAME.size + header_size
+            if table > size:
+                break
+            header = json.loads(self._mm[offset + FRAME.size:table])
+            end = table + count * CHUNK.size + header["bytes"]
+            if end > size:
+                break
+            for level, key in zip(LEVELS, header["keys"]):
+                self._index[level][key].append(len(self.frames))
+            self.frames.append((table, count, header["extras"]))
+            offset = end
+
+    def select(self, keys: List[str]) -> Tuple[int, str]:
+        """返回 (帧序号, 命中级别)；同一键的多条录制轮流使用"""
+        for level, key in zip(LEVELS, keys):
+            candidates = self._index[level].get(key)
+            if candidates:
+                with self._lock:
+                    cursor = self._cursors[(level, key)]
+                    self._cursors[(level, key)] += 1
+                return candidates[cursor % len(candidates)], level
+        raise LookupError(f"录制文件 {self.path} 中没有匹配的调用（工具与步数: {keys[-1]}）")
+
+    def chunks(self, frame: int) -> Iterator[Tuple[float, str, dict]]:
+        """逐块产出 (距上一块的秒数, 文本, 附加字段)"""
+        table, count, extras = self.frames[frame]
+        text = table + count * CHUNK.size
+        for i in range(count):
+            delay, length = CHUNK.unpack_from(self._mm, table + i * CHUNK.size)
+            yield delay / 1e6, str(self._mm[text:text + length], "utf-8"), extras.get(str(i), {})
+            text += length
+
+    def describe(self) -> dict:
+        loose = Counter({key: len(frames) for key, frames in self._index["loose"].items()})
+        chunks = sum(count for _, count, _ in self.frames)
+        return {"path": self.path, "bytes": len(self._mm), "frames": len(self.frames), "chunks": chunks,
+                "distinct_prompts": len(self._index["exact"]),
+                "by_tools_and_step": dict(loose.most_common())}
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+
+class ReplaySettings:
+    def __init__(self):
+        self.recording: Optional[Recording] = None
+        # 块间等待乘以该系数：1 为原始节奏，0.5 为两倍速，0 为不等待
+        self.timing_scale = 1.0
+        self._lock = threading.Lock()
+        self.counters: Counter = Counter()
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += amount
+
+    def stats(self) -> Dict[str, int]:
+        """字段与 fake_llm.settings.stats() 一致，另附各级匹配的命中数"""
+        with self._lock:
+            return {key: self.counters[key] for key in ("tokens", "prompt_tokens", "calls", "structured_calls",
+                                                        *LEVELS)}
+
+
+settings = ReplaySettings()
+
+
+class ReplayChatModel(BaseChatModel):
+    """与 ChatDeepSeek 构造参数兼容（多余参数忽略），从 settings.recording 中选取匹配的录制回放"""
+
+    model_name: str = "replay-deepseek"
+
+    def __init__(self, model: str = "replay-deepseek", **kwargs: Any):
+        super().__init__(model_name=model, callbacks=kwargs.get("callbacks"))
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay-deepseek"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs: Any):
+        # 与真实模型一样把工具定义放进调用参数，匹配键据此区分各提取链
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], tool_choice=tool_choice, **kwargs)
+
+    @staticmethod
+    def _select(messages: List[BaseMessage], kwargs: Dict[str, Any]) -> int:
+        frame, level = settings.recording.select(match_keys(messages, kwargs))
+        settings.count("calls")
+        settings.count(level)
+        if kwargs.get("tools"):
+            settings.count("structured_calls")
+        return frame
+
+    @staticmethod
+    def _chunk(text: str, extra: dict) -> ChatGenerationChunk:
+        settings.count("tokens")
+        usage = extra.get("usage_metadata")
+        if usage:
+            settings.count("prompt_tokens", usage.get("input_tokens", 0))
+        return ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=usage,
+                                                          tool_call_chunks=extra.get("tool_call_chunks", [])))
+
+    # _generate 不能调用 self._stream：子类 GovernedChatDeepSeek 的 _stream 会再占一个并发名额
+    def _replay(self, messages: List[BaseMessage], kwargs: Dict[str, Any],
+                run_manager: Optional[CallbackManagerForLLMRun] = None) -> Iterator[ChatGenerationChunk]:
+        for delay, text, extra in settings.recording.chunks(self._select(messages, kwargs)):
+            if delay and settings.timing_scale:
+                time.sleep(delay * settings.timing_scale)
+            chunk = self._chunk(text, extra)
+            if run_manager and text:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    async def _areplay(self, messages: List[BaseMessage], kwargs: Dict[str, Any],
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None
+                       ) -> AsyncIterator[ChatGenerationChunk]:
+        for delay, text, extra in settings.recording.chunks(self._select(messages, kwargs)):
+            if delay and settings.timing_scale:
+                await asyncio.sleep(delay * settings.timing_scale)
+            chunk = self._chunk(text, extra)
+            if run_manager and text:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    @staticmethod
+    def _result(chunks: List[ChatGenerationChunk]) -> ChatResult:
+        message = sum((c.message for c in chunks[1:]), chunks[0].message) if chunks else AIMessageChunk(content="")
+        return ChatResult(generations=[ChatGeneration(message=message_chunk_to_message(message))])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        return self._result(list(self._replay(messages, kwargs)))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        return self._result([chunk async for chunk in self._areplay(messages, kwargs)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any
+                ) -> Iterator[ChatGenerationChunk]:
+        return self._replay(messages, kwargs, run_manager)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any
+                       ) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in self._areplay(messages, kwargs, run_manager):
+            yield chunk
+
+
+def install(path: str, timing_scale: float = 1.0) -> ReplaySettings:
+    """用 ReplayChatModel 替换 langchain_deepseek.ChatDeepSeek，之后导入的模块都会拿到回放模型"""
+    import langchain_deepseek
+
+    settings.recording = Recording(path)
+    settings.timing_scale = timing_scale
+    langchain_deepseek.ChatDeepSeek = ReplayChatModel
+    return settings
+
+
+def record(args) -> None:
+    """经 asgi.app 在进程内逐个发起请求，把期间的全部 LLM 调用录制到 args.output"""
+    from bench.offline import ENDPOINTS, run_endpoints
+
+    install_recorder(args.output)
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'record.sqlite')}"
+    os.environ["VECTOR_INDEX_PATH"] = os.path.join(workdir, "vectors")
+    from flask_jwt_extended import create_access_token
+    from asgi import app
+    from app import app as flask_app
+    from db.manager import db
+    from db.writer import meeting_writer
+
+    db.add_user("bench", "bench")
+    with flask_app.app_context():
+        token = create_access_token(identity="bench")
+    asyncio.run(run_endpoints(app, token, args.endpoint or list(ENDPOINTS), [1], args.rounds))
+    meeting_writer.close()
+    print(f"已录制 {recorder.frames} 次调用到 {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 调用的录制与回放")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="调用真实模型跑一遍 bench.offline 的请求并录制")
+    record_parser.add_argument("output", help="录制文件路径，已存在时追加")
+    record_parser.add_argument("--endpoint", action="append", help="默认全部，取值同 bench.offline")
+    record_parser.add_argument("--rounds", type=int, default=1, help="每个接口的请求次数")
+    info_parser = commands.add_parser("info", help="打印录制文件概况")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args)
+    else:
+        recording = Recording(args.path)
+        print(json.dumps(recording.describe(), ensure_ascii=False, indent=2))
+        recording.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+SSE 并发压测：同时打开 N 条流式连接，统计成功数、首字节时间与总耗时。
+
+    python -m bench.sse_load --url http://localhost:5000 --path /api/mindmap -c 50 -c 200
+    python -m bench.sse_load --url http://localhost:5001 --path /api/mindmap -c 50 -c 200   # asgi.py
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> str:
+    resp = await client.post("/api/login", json={"username": username, "password": password})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def one_stream(client: httpx.AsyncClient, path: str, token: str, body: dict) -> dict:
+    start = time.perf_counter()
+    ttfb = None
+    size = 0
+    try:
+        async with client.stream("POST", path, json=body, headers={"Authorization": f"Bearer {token}"}) as resp:
+            async for chunk in resp.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                size += len(chunk)
+        return {"ok": resp.status_code == 200, "ttfb": ttfb, "total": time.perf_counter() - start, "bytes": size}
+    except httpx.HTTPError as e:
+        return {"ok": False, "error": type(e).__name__, "total": time.perf_counter() - start}
+
+
+async def run_level(args, token: str, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*[one_stream(client, args.path, token, json.loads(args.body))
+                                         for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["ok"]]
+    ttfbs = sorted(r["ttfb"] for r in ok if r["ttfb"] is not None)
+    return {
+        "concurrency": concurrency,
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "wall_seconds": round(elapsed, 3),
+        "streams_per_second": round(len(ok) / elapsed, 2) if elapsed else None,
+        "ttfb_p50": round(statistics.median(ttfbs), 4) if ttfbs else None,
+        "ttfb_p95": round(ttfbs[int(len(ttfbs) * 0.95) - 1], 4) if ttfbs else None,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="SSE 并发流压测")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--path", default="/api/mindmap")
+    parser.add_argument("--body", default='{"conclusion": "测试"}', help="JSON 请求体")
+    parser.add_argument("--username", default="zhangsan")
+    parser.add_argument("--password", default="123456")
+    parser.add_argument("-c", "--concurrency", type=int, action="append", help="可重复指定多个并发级别")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.url) as client:
+        token = await login(client, args.username, args.password)
+    for level in args.concurrency or [10, 50, 200]:
+        print(json.dumps(await run_level(args, token, level), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""
+启动基准：在全新的子进程中导入 app / asgi，测量 API worker 的冷启动耗时，并用 python -X importtime 的输出
+按顶层包汇总导入耗时，定位拖慢启动的依赖。结果写为 JSON，便于与历史结果比较回归。
+
+    python -m bench.startup --runs 5 --output startup.json
+    python -m bench.startup --compare old.json new.json
+
+app / asgi 为 worker 可以开始接受请求的时间（AGENT_WARMUP 默认按 lazy 测量，不含后台预热）；
+app_ready 额外构建全部 Agent，即首个 LLM 请求不再需要等待导入的时间。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+from bench.offline import git_revision
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 目标名 -> 子进程中计时的语句
+TARGETS = {
+    "app": "import app",
+    "asgi": "import asgi",
+    "app_ready": "import app; app.warm_up()",
+}
+
+TIMER = "import time; _t = time.perf_counter(); {stmt}; print('__elapsed__', time.perf_counter() - _t)"
+
+
+def run_once(stmt: str, env: dict, importtime: bool = False):
+    """返回 (导入语句耗时, 含解释器启动的进程总耗时, importtime 输出)"""
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", TIMER.format(stmt=stmt)]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    wall = time.perf_counter() - start
+    elapsed = next((float(line.split()[1]) for line in result.stdout.splitlines() if line.startswith("__elapsed__")),
+                   None)
+    if elapsed is None:
+        raise RuntimeError(f"{stmt} 执行失败:\n{result.stderr[-2000:]}")
+    return elapsed, wall, result.stderr
+
+
+def parse_importtime(stderr: str, top: int) -> dict:
+    """python -X importtime 输出 -> 按顶层包汇总的自身耗时，以及累计耗时最高的模块"""
+    packages, modules = Counter(), []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.rstrip()
+        packages[name.strip().split(".")[0]] += int(self_us)
+        modules.append((int(cumulative_us), name.strip()))
+    return {
+        "packages_ms": {name: round(us / 1000, 1) for name, us in packages.most_common(top)},
+        "slowest_modules_ms": {name: round(us / 1000, 1) for us, name in sorted(modules, reverse=True)[:top]},
+    }
+
+
+def bench_target(name: str, runs: int, env: dict, top: int) -> dict:
+    stmt = TARGETS[name]
+    # 首次运行预热磁盘缓存与 .pyc，不计入结果
+    run_once(stmt, env)
+    samples = [run_once(stmt, env) for _ in range(runs)]
+    imports = [s[0] for s in samples]
+    walls = [s[1] for s in samples]
+    result = {
+        "runs": runs,
+        "import_p50_ms": round(statistics.median(imports) * 1000, 1),
+        "import_min_ms": round(min(imports) * 1000, 1),
+        "process_p50_ms": round(statistics.median(walls) * 1000, 1),
+    }
+    result.update(parse_importtime(run_once(stmt, env, importtime=True)[2], top))
+    return result
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    for name, after in new.get("targets", {}).items():
+        before = old.get("targets", {}).get(name)
+        if not before:
+            continue
+        for key in ("import_p50_ms", "process_p50_ms"):
+            print(f"{name:<10} {key:<16} {before[key]:>10} -> {after[key]:>10} "
+                  f"({(after[key] - before[key]) / before[key] * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API worker 冷启动基准")
+    parser.add_argument("--runs", type=int, default=5, help="每个目标的计时次数，取中位数")
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS), help="默认全部")
+    parser.add_argument("--warmup", default="lazy", choices=("lazy", "background", "eager"),
+                        help="子进程的 AGENT_WARMUP")
+    parser.add_argument("--top", type=int, default=15, help="输出耗时最高的前 N 个包 / 模块")
+    parser.add_argument("--output", help="结果 JSON 路径，默认仅打印")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="对比两份结果后退出")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = tempfile.mkdtemp()
+    env = {**os.environ, "AGENT_WARMUP": args.warmup,
+           "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'startup.sqlite')}",
+           "VECTOR_INDEX_PATH": os.path.join(workdir, "vectors")}
+    env.setdefault("DEEPSEEK_API_KEY", "offline")
+
+    targets = {}
+    for name in args.target or list(TARGETS):
+        targets[name] = bench_target(name, args.runs, env, args.top)
+        print(json.dumps({"target": name, **{k: v for k, v in targets[name].items() if not isinstance(v, dict)}},
+                         ensure_ascii=False))
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "warmup": args.warmup,
+        },
+        "targets": targets,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
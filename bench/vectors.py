@@ -0,0 +1,69 @@
+"""
+向量索引基准：合成文本块写入临时索引，测量追加吞吐与单条 / 批量检索延迟。
+
+    python -m bench.vectors --chunks 100000 --users 10 --queries 200
+
+--users 1 时单个用户拥有全部文本块，检索需整表计算，是最慢的情况。
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import config
+from db.vectors import HashingEmbedder, VectorIndex
+
+WORDS = ["预算", "审批", "季度", "上线", "接口", "延期", "测试", "客户", "需求", "评审", "招聘", "方案", "风险", "数据库",
+         "迁移", "缓存", "性能", "合同", "采购", "市场", "推广", "移动端", "设计稿", "运维", "监控", "告警"]
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return "，".join("".join(rng.choices(WORDS, k=3)) for _ in range(words // 3))
+
+
+def percentiles(samples: list) -> dict:
+    values = np.array(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(values, 50)), 3), "p95_ms": round(float(np.percentile(values, 95)), 3),
+            "max_ms": round(float(values.max()), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量索引基准")
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=10, help="文本块平均分配给多少个用户")
+    parser.add_argument("--dim", type=int, default=config.VECTOR_DIM)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=16, help="批量检索时每批的问题数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    index = VectorIndex(os.path.join(tempfile.mkdtemp(), "vectors"), HashingEmbedder(args.dim))
+    index.rebuild()
+
+    start = time.perf_counter()
+    for offset in range(0, args.chunks, 1000):
+        index.add([(i + 1, i % args.users, sentence(rng, 60)) for i in range(offset, min(offset + 1000, args.chunks))])
+    add_seconds = time.perf_counter() - start
+
+    queries = [sentence(rng, 9) for _ in range(args.queries)]
+    results = {"chunks": args.chunks, "dim": args.dim, "users": args.users,
+               "add_chunks_per_second": round(args.chunks / add_seconds, 1)}
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(0, q)
+        samples.append(time.perf_counter() - start)
+    results["search"] = percentiles(samples)
+    start = time.perf_counter()
+    for i in range(0, len(queries), args.batch):
+        index.search_batch(0, queries[i:i + args.batch])
+    results["search_batched_ms_per_query"] = round((time.perf_counter() - start) / len(queries) * 1000, 3)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,142 @@
 import os
+import threading
+from typing import Dict, Tuple
+
 from dotenv import load_dotenv
 
-load_dotenv(dotenv_path="config/.env")
+# 项目根目录；配置、提示词与默认数据文件都相对于它定位，与启动时的工作目录无关
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+load_dotenv(dotenv_path=os.path.join(BASE_DIR, "config", ".env"))
 
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
 MAX_ITERATIONS = int(os.getenv("MAX_ITERATIONS", "10"))
 VERBOSE = os.getenv("VERBOSE", "false").lower() == "true"
 
-with open('config/template.txt', 'r', encoding='utf-8') as f:
-    template = f.read()
+# 数据库：任意 SQLAlchemy URL，默认本地 SQLite
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'db', 'db.sqlite')}")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# SQLite 专用：WAL 日志、同步级别与锁等待毫秒数
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# 用户画像快照缓存秒数（本进程内的写操作会立即使其失效）
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))
+# 注入 Agent 的画像窗口：最近会议数、未完成待办数
+PROFILE_RECENT_MEETINGS = int(os.getenv("PROFILE_RECENT_MEETINGS", "10"))
+PROFILE_OPEN_TODOS = int(os.getenv("PROFILE_OPEN_TODOS", "50"))
+
+# 共享 HTTP 连接池（所有 LLM 请求复用）
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "120"))
+
+# SSE 帧合并窗口：stream 内容累计达到任一阈值即输出一帧，均为 0 时逐 token 输出
+SSE_COALESCE_MS = int(os.getenv("SSE_COALESCE_MS", "30"))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "256"))
+# 运行时循环与写出方之间最多缓冲的 SSE 帧数，客户端读得慢时上游在此等待，帧不会在内存中堆积
+SSE_BUFFER_FRAMES = int(os.getenv("SSE_BUFFER_FRAMES", "32"))
+
+# 长会议记录分块提取：单块最大字符数、相邻块重叠字符数、进程内共享的并发线程数
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "4000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "8"))
+
+# 提取结果缓存：过期秒数、进程内 LRU 条目数、SQLite 持久化最大行数
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MEMORY_ITEMS = int(os.getenv("CACHE_MEMORY_ITEMS", "256"))
+CACHE_MAX_ROWS = int(os.getenv("CACHE_MAX_ROWS", "10000"))
+
+# 会议记录后台批量写入：单批最大条数、攒批等待秒数、队列容量（满时丢弃并计数）
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "50"))
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("WRITE_BEHIND_FLUSH_SECONDS", "0.5"))
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "1000"))
+
+# Agent 提示词中会议原文的传递方式：inline 直接内嵌全文；ref 只放引用与分段概览，工具按引用在服务端展开
+TRANSCRIPT_MODE = os.getenv("TRANSCRIPT_MODE", "inline")
+TRANSCRIPT_REGISTRY_ITEMS = int(os.getenv("TRANSCRIPT_REGISTRY_ITEMS", "256"))
+# POST /api/meetings/upload 单个会议原文的最大字节数
+TRANSCRIPT_MAX_BYTES = int(os.getenv("TRANSCRIPT_MAX_BYTES", str(20 * 1024 * 1024)))
+# 每次运行结束打印 LLM 调用次数与 prompt / completion token 用量（调试用，默认关闭）
+TOKEN_REPORT = os.getenv("TOKEN_REPORT", "false").lower() == "true"
+
+# 实时会议：连续追加的合并等待秒数、增量提取时附带的前文字符数、会话闲置过期秒数
+LIVE_DEBOUNCE_SECONDS = float(os.getenv("LIVE_DEBOUNCE_SECONDS", "1.0"))
+LIVE_CONTEXT_CHARS = int(os.getenv("LIVE_CONTEXT_CHARS", "500"))
+LIVE_SESSION_TTL = int(os.getenv("LIVE_SESSION_TTL", str(4 * 3600)))
+
+# 跨会议语义检索：向量文件路径前缀、哈希向量维度、原文切块字符数、检索工具返回条数
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", os.path.join(BASE_DIR, "db", "vector_index"))
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "256"))
+VECTOR_CHUNK_CHARS = int(os.getenv("VECTOR_CHUNK_CHARS", "300"))
+VECTOR_TOP_K = int(os.getenv("VECTOR_TOP_K", "5"))
+
+# LLM 并发调度：进程内同时在途的上游调用上限、排队上限（超出时返回 429）、限流类错误的重试次数与退避区间（秒）
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+
+# 批量处理（batch.py）：并发处理的原文数、每秒最多开始处理的原文数（0 表示不限）、每个写入事务的记录数、进度输出间隔（秒）
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_RATE = float(os.getenv("BATCH_RATE", "0"))
+BATCH_COMMIT_SIZE = int(os.getenv("BATCH_COMMIT_SIZE", "20"))
+BATCH_REPORT_SECONDS = float(os.getenv("BATCH_REPORT_SECONDS", "10"))
+
+# 慢请求日志阈值（毫秒），超过时打印完整 span 树，0 表示关闭
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "0"))
+
+# 提示词目录与热加载：开启后每次取用都检查文件修改时间，改动的提示词无需重启即可生效（Agent 随之重建）
+PROMPT_DIR = os.getenv("PROMPT_DIR", os.path.join(BASE_DIR, "config"))
+PROMPT_HOT_RELOAD = os.getenv("PROMPT_HOT_RELOAD", "false").lower() == "true"
+
+# 启动预热：background 在后台线程导入 Agent 依赖并构建注册表，eager 在导入 app 时同步完成，lazy 推迟到首个请求
+AGENT_WARMUP = os.getenv("AGENT_WARMUP", "background")
+
+# 提示词名 -> 文件名；也可按模块属性读取，如 config.template
+PROMPT_FILES = {
+    "template": "template.txt",
+    "meeting": "meeting.txt",
+    "template_perference": "template_preference.txt",
+    "template_mindmap": "template_mindmap.txt",
+    "template_render": "template_render.txt",
+}
+
+_prompts: Dict[str, Tuple[int, str]] = {}
+_prompts_lock = threading.Lock()
+
+
+def prompt_path(filename: str) -> str:
+    return os.path.join(PROMPT_DIR, filename)
+
+
+def prompt_version(name: str) -> int:
+    """提示词文件的修改时间（纳秒），未开启热加载时为首次读取时的值"""
+    load_prompt(name)
+    return _prompts[name][0]
+
 
-with open('config/meeting.txt', 'r', encoding='utf-8') as f:
-    meeting = f.read()
+def load_prompt(name: str) -> str:
+    """按名称读取提示词，首次使用时才读文件；开启热加载时文件修改后重新读取"""
+    cached = _prompts.get(name)
+    if cached is not None and not PROMPT_HOT_RELOAD:
+        return cached[1]
+    path = prompt_path(PROMPT_FILES[name])
+    mtime = os.stat(path).st_mtime_ns
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _prompts_lock:
+        with open(path, "r", encoding="utf-8") as f:
+            _prompts[name] = (mtime, f.read())
+    return _prompts[name][1]
 
-with open('config/template_preference.txt', 'r', encoding='utf-8') as f:
-    template_perference = f.read()
 
-with open('config/template_mindmap.txt', 'r', encoding='utf-8') as f:
-    template_mindmap = f.read()
\ No newline at end of file
+def __getattr__(name: str):
+    # 兼容 from config import template 等写法，提示词在首次访问时才读取
+    if name in PROMPT_FILES:
+        return load_prompt(name)
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
@@ -0,0 +1,170 @@
+import contextvars
+import functools
+import json
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from hashlib import sha256
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+
+import config
+from db.manager import MeetingDB, db
+from db.models import ExtractionCache
+
+# 为 True 时当前请求跳过缓存（既不读取也不写入）
+cache_bypass = contextvars.ContextVar("cache_bypass", default=False)
+
+
+class ResultCache:
+    """
+    结构化提取结果缓存：进程内 LRU 在前，SQLite 持久化在后。
+    键为 sha256(工具名, 提示词版本, 附加因子, 输入文本)，值为 JSON 可序列化的工具输出。
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, db: MeetingDB, ttl_seconds: int = None, memory_items: int = None, max_rows: int = None):
+        self.db = db
+        self.ttl = timedelta(seconds=ttl_seconds or config.CACHE_TTL_SECONDS)
+        self.memory_items = memory_items or config.CACHE_MEMORY_ITEMS
+        self.max_rows = max_rows or config.CACHE_MAX_ROWS
+        self._memory: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._writes = 0
+
+    @staticmethod
+    def make_key(tool_name: str, version: str, text: str, *extra: str) -> str:
+        h = sha256()
+        for part in (tool_name, version, *extra):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        h.update(text.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str, tool_name: str) -> Optional[Any]:
+        now = datetime.now()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters[(tool_name, "memory_hit")] += 1
+                    return value
+                del self._memory[key]
+
+        with self.db.SessionLocal() as session:
+            row = session.get(ExtractionCache, key)
+            if row is None or (row.expires_at and row.expires_at <= now):
+                self._count(tool_name, "miss")
+                return None
+            row.accessed_at = now
+            session.commit()
+            value = json.loads(row.payload)
+            expires_at = row.expires_at or now + self.ttl
+
+        self._remember(key, value, expires_at)
+        self._count(tool_name, "store_hit")
+        return value
+
+    def set(self, key: str, tool_name: str, value: Any) -> None:
+        now = datetime.now()
+        expires_at = now + self.ttl
+        self._remember(key, value, expires_at)
+
+        row = ExtractionCache(
+            cache_key=key,
+            tool_name=tool_name,
+            payload=json.dumps(value, ensure_ascii=False),
+            created_at=now,
+            accessed_at=now,
+            expires_at=expires_at,
+        )
+        with self.db.SessionLocal() as session:
+            try:
+                session.merge(row)
+                session.commit()
+            except IntegrityError:
+                # merge 先查后插，并发写入同一键时对方可能先插入，此时改为更新已有的行
+                session.rollback()
+                session.merge(row)
+                session.commit()
+
+        with self._lock:
+            self._writes += 1
+            should_prune = self._writes % self.PRUNE_EVERY == 0
+        if should_prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """删除过期条目，并按最近访问时间淘汰超出 max_rows 的部分"""
+        with self.db.SessionLocal() as session:
+            removed = session.execute(
+                delete(ExtractionCache).where(ExtractionCache.expires_at <= datetime.now())
+            ).rowcount
+            overflow = session.execute(select(func.count()).select_from(ExtractionCache)).scalar_one() - self.max_rows
+            if overflow > 0:
+                oldest = select(ExtractionCache.cache_key).order_by(ExtractionCache.accessed_at).limit(overflow)
+                removed += session.execute(
+                    delete(ExtractionCache).where(ExtractionCache.cache_key.in_(oldest))
+                ).rowcount
+            session.commit()
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        with self.db.SessionLocal() as session:
+            session.execute(delete(ExtractionCache))
+            session.commit()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        result: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            counters = list(self._counters.items())
+        for (tool_name, outcome), count in counters:
+            result.setdefault(tool_name, {"memory_hit": 0, "store_hit": 0, "miss": 0})[outcome] = count
+        return result
+
+    def _count(self, tool_name: str, outcome: str) -> None:
+        with self._lock:
+            self._counters[(tool_name, outcome)] += 1
+
+    def _remember(self, key: str, value: Any, expires_at: datetime) -> None:
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+
+extraction_cache = ResultCache(db)
+
+
+def cached(version: str, key_extra: Callable[[], str] = None):
+    """
+    缓存以会议文本为第一个参数的提取函数。
+    version 为提示词版本，修改提示词时需同步递增；key_extra 返回额外的键因子（如当前日期）。
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(text: str, *args, **kwargs):
+            if cache_bypass.get():
+                return fn(text, *args, **kwargs)
+
+            extra = (key_extra(),) if key_extra else ()
+            key = extraction_cache.make_key(fn.__name__, version, text, *extra)
+            value = extraction_cache.get(key, fn.__name__)
+            if value is None:
+                value = fn(text, *args, **kwargs)
+                extraction_cache.set(key, fn.__name__, value)
+            return value
+
+        return wrapper
+
+    return decorator
@@ -23,10 +23,14 @@ CREATE TABLE IF NOT EXISTS meetings
     subject    TEXT      NOT NULL,
     start_time TIMESTAMP NOT NULL,
     duration   INTEGER, -- 分钟数
+    transcript_hash TEXT, -- 会议原文 sha256，同一用户的同一原文只入库一次
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
 );
+-- 按用户分页查询会议 (start_time, meeting_id) 的游标索引
+CREATE INDEX IF NOT EXISTS ix_meetings_user_start ON meetings (user_id, start_time);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_meetings_user_transcript ON meetings (user_id, transcript_hash);
 
 -- ---------------------------------------------------------
 -- 3. 参会人表
@@ -65,6 +69,8 @@ CREATE TABLE IF NOT EXISTS todos
     status     TEXT DEFAULT 'pending', -- pending/in_progress/completed
     FOREIGN KEY (meeting_id) REFERENCES meetings (meeting_id) ON DELETE CASCADE
 );
+-- 按用户分页查询待办 (deadline, todo_id) 的游标索引
+CREATE INDEX IF NOT EXISTS ix_todos_user_deadline ON todos (user_id, deadline);
 
 -- ---------------------------------------------------------
 -- 6. 待跟进事项表
@@ -106,6 +112,50 @@ CREATE TABLE IF NOT EXISTS preference
     UNIQUE (user_id, category)
 );
 
+-- ---------------------------------------------------------
+-- 9. 提取结果缓存表
+-- ---------------------------------------------------------
+CREATE TABLE IF NOT EXISTS extraction_cache
+(
+    cache_key   VARCHAR(64) PRIMARY KEY, -- sha256(工具名, 提示词版本, 输入文本)
+    tool_name   VARCHAR(100) NOT NULL,
+    payload     TEXT         NOT NULL,   -- JSON 序列化的工具输出
+    created_at  TIMESTAMP    NOT NULL,
+    accessed_at TIMESTAMP    NOT NULL,
+    expires_at  TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS ix_extraction_cache_accessed_at ON extraction_cache (accessed_at);
+
+CREATE TABLE IF NOT EXISTS transcripts
+(
+    content_hash VARCHAR(64) PRIMARY KEY, -- sha256(UTF-8 原文)，即上传接口返回的 meeting_id
+    data         BLOB        NOT NULL,    -- zlib 压缩后的原文
+    size         INTEGER     NOT NULL,    -- 原文字节数
+    created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 原文的上传者：只有上传过同一内容的用户可按 meeting_id / 原文引用读取
+CREATE TABLE IF NOT EXISTS transcript_owners
+(
+    user_id      INTEGER     NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, content_hash),
+    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE,
+    FOREIGN KEY (content_hash) REFERENCES transcripts (content_hash) ON DELETE CASCADE
+);
+
+-- 语义检索的文本块，向量保存在 VECTOR_INDEX_PATH 下的内存映射文件中，行号与 chunk_id 对应关系见 db/vectors.py
+CREATE TABLE IF NOT EXISTS embedding_chunks
+(
+    chunk_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    meeting_id INTEGER     NOT NULL,
+    user_id    INTEGER     NOT NULL,
+    kind       VARCHAR(20) NOT NULL, -- agenda / transcript
+    content    TEXT        NOT NULL,
+    FOREIGN KEY (meeting_id) REFERENCES meetings (meeting_id) ON DELETE CASCADE
+);
+
 -- =========================================================
 -- 测试数据插入 (Mock Data)
 -- =========================================================
@@ -1,16 +1,209 @@
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker
+import base64
+import json
+import re
+import threading
+import time
+import zlib
+
+from sqlalchemy import create_engine, event, insert, inspect, select, update, bindparam, and_, or_, type_coerce, \
+    String, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker, selectinload
+from sqlalchemy.pool import StaticPool
 from typing import List, Dict, Optional
 from datetime import datetime
 
-from db.models import Base, User, Meeting, Attendee, Todo, Preference
+import config
+from tracing import traced_methods
+from db import search
+from db.models import Base, User, Meeting, Attendee, Todo, Preference, Transcript, TranscriptOwner, EmbeddingChunk
+
+OPEN_TODO_STATUSES = ("pending", "in_progress")
+TODO_UPDATABLE_FIELDS = ("user_id", "owner", "task", "deadline", "status")
+# 原文只能按完整 sha256 或原文引用中的 12 位短哈希读取，不接受任意长度的前缀
+TRANSCRIPT_KEY = re.compile(r"[0-9a-f]{64}|[0-9a-f]{12}")
+
+
+def encode_cursor(*values) -> str:
+    """将排序键编码为不透明的分页游标"""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _meeting_dict(m: Meeting) -> Dict:
+    return {"meeting_id": m.meeting_id, "subject": m.subject, "start_time": m.start_time.isoformat()}
+
 
+def _todo_dict(t: Todo) -> Dict:
+    return {"todo_id": t.todo_id, "task": t.task,
+            "deadline": t.deadline.isoformat() if t.deadline else None, "status": t.status}
 
+
+def sqlite_pragmas() -> Dict[str, str]:
+    """按配置生成 SQLite 连接级 PRAGMA：WAL 允许读写并发，busy_timeout 让写锁冲突时等待而不是立即报错"""
+    pragmas = {
+        "foreign_keys": "ON",
+        "busy_timeout": str(config.SQLITE_BUSY_TIMEOUT_MS),
+        "synchronous": config.SQLITE_SYNCHRONOUS,
+    }
+    if config.SQLITE_WAL:
+        pragmas["journal_mode"] = "WAL"
+    return pragmas
+
+
+@traced_methods("db")
 class MeetingDB:
-    def __init__(self, db_url: str = "sqlite:///db/db.sqlite"):
-        self.engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    def __init__(self, db_url: str = None, pragmas: Optional[Dict[str, str]] = None):
+        """
+        db_url 为任意 SQLAlchemy URL，默认读取 config.DATABASE_URL。
+        SQLite 在每个新连接上应用 pragmas（默认 sqlite_pragmas()），其他数据库使用连接池配置。
+        表结构不在此创建，由启动流程调用一次 init_schema()。
+        """
+        db_url = db_url or config.DATABASE_URL
+        # 全文检索依赖 SQLite FTS5，其他数据库上 search() 不可用
+        self.search_enabled = db_url.startswith("sqlite")
+        if db_url.startswith("sqlite"):
+            url = make_url(db_url)
+            if url.database in (None, "", ":memory:") or url.query.get("mode") == "memory":
+                # 内存库只存在于单个连接上，所有线程共享同一连接
+                pool_args = {"poolclass": StaticPool}
+            else:
+                pool_args = {"pool_size": config.DB_POOL_SIZE, "max_overflow": config.DB_MAX_OVERFLOW,
+                             "pool_timeout": config.DB_POOL_TIMEOUT}
+            self.engine = create_engine(
+                db_url,
+                connect_args={"check_same_thread": False, "timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000},
+                **pool_args,
+            )
+            pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+            @event.listens_for(self.engine, "connect")
+            def apply_pragmas(dbapi_conn, _):
+                cursor = dbapi_conn.cursor()
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+                cursor.close()
+                # 全文索引触发器生成 2 字检索侧表时调用
+                dbapi_conn.create_function(search.BIGRAM_FUNCTION, 1, search.bigrams, deterministic=True)
+        else:
+            self.engine = create_engine(
+                db_url,
+                pool_size=config.DB_POOL_SIZE,
+                max_overflow=config.DB_MAX_OVERFLOW,
+                pool_timeout=config.DB_POOL_TIMEOUT,
+                pool_pre_ping=True,
+            )
         self.SessionLocal = sessionmaker(bind=self.engine)
+        # 用户画像快照缓存：user_id -> (过期时间, 画像)，写操作时按用户失效
+        self._profiles: Dict[int, tuple] = {}
+        self._profile_ids: Dict[str, int] = {}
+        # user_id -> 失效代数，每次失效加一
+        self._profile_gens: Dict[int, int] = {}
+        self._profile_lock = threading.Lock()
+
+    def init_schema(self) -> None:
+        """建表并补建索引，仅在进程启动时调用一次"""
         Base.metadata.create_all(self.engine)
+        # create_all 不修改已存在的表，后加的列需单独补上
+        if "transcript_hash" not in {c["name"] for c in inspect(self.engine).get_columns("meetings")}:
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql("ALTER TABLE meetings ADD COLUMN transcript_hash VARCHAR(64)")
+        # create_all 只为新建的表建索引，已存在的表需单独补建
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+        if self.search_enabled:
+            with self.engine.begin() as conn:
+                existing = set(conn.exec_driver_sql(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' "
+                    "AND name IN ('search_index', 'search_bigram')").scalars())
+                conn.exec_driver_sql(search.FTS_TABLE)
+                conn.exec_driver_sql(search.BIGRAM_TABLE)
+                for statement in search.trigger_statements():
+                    conn.exec_driver_sql(statement)
+                if "search_index" not in existing:
+                    for statement in search.backfill_statements():
+                        conn.exec_driver_sql(statement)
+                if "search_bigram" not in existing:
+                    conn.exec_driver_sql(search.BIGRAM_BACKFILL)
+
+    # --- 用户画像快照 ---
+    def get_user_profile(self, username: str) -> Optional[Dict]:
+        """
+        在一个会话内加载用户的偏好、最近 N 场会议与未完成待办，结果按用户缓存，直到相关写操作使其失效。
+        会议与待办均为有界窗口，画像大小不随用户历史增长；完整历史通过分页接口获取。
+        """
+        now = time.monotonic()
+        with self._profile_lock:
+            user_id = self._profile_ids.get(username)
+            cached = self._profiles.get(user_id)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        with self.SessionLocal() as session:
+            if user_id is None:
+                user_id = session.execute(select(User.user_id).where(User.username == username)).scalar()
+                if user_id is None:
+                    return None
+            # 先记下代数再读数据：加载期间发生的失效会使代数变化，此时不缓存可能已过期的结果
+            with self._profile_lock:
+                generation = self._profile_gens.get(user_id, 0)
+
+            stmt = select(User).where(User.user_id == user_id).options(selectinload(User.preferences))
+            user = session.execute(stmt).scalar_one_or_none()
+            if not user:
+                return None
+
+            meetings = session.execute(
+                select(Meeting).where(Meeting.user_id == user.user_id)
+                .order_by(Meeting.start_time.desc(), Meeting.meeting_id.desc())
+                .limit(config.PROFILE_RECENT_MEETINGS)
+            ).scalars().all()
+            todos = session.execute(
+                select(Todo).where(Todo.user_id == user.user_id, Todo.status.in_(OPEN_TODO_STATUSES))
+                # 截止时间最近的待办最紧急，优先进入窗口；无截止时间的排在最后
+                .order_by(Todo.deadline.asc().nulls_last(), Todo.todo_id.asc())
+                .limit(config.PROFILE_OPEN_TODOS)
+            ).scalars().all()
+
+            profile = {
+                "user_id": user.user_id,
+                "preferences": {p.category: p.preference for p in user.preferences},
+                "meetings": [_meeting_dict(m) for m in meetings],
+                "todos": [_todo_dict(t) for t in todos],
+            }
+
+        with self._profile_lock:
+            self._profile_ids[username] = user_id
+            if self._profile_gens.get(user_id, 0) == generation:
+                self._profiles[user_id] = (now + config.PROFILE_CACHE_TTL, profile)
+        return profile
+
+    def _sort_key(self, column):
+        """
+        游标比较使用的排序列。SQLite 中日期以原始字符串存储并按字符串排序，
+        新旧写入格式（如 '... 14:30:00' 与 '... 14:30:00.000000'）可能混存，游标也须按原始字符串比较。
+        """
+        return type_coerce(column, String) if self.engine.dialect.name == "sqlite" else column
+
+    def _cursor_value(self, value):
+        if value is None or self.engine.dialect.name == "sqlite":
+            return value
+        return datetime.fromisoformat(value)
+
+    def invalidate_profile(self, *user_ids: int) -> None:
+        with self._profile_lock:
+            for user_id in user_ids:
+                self._profiles.pop(user_id, None)
+                self._profile_gens[user_id] = self._profile_gens.get(user_id, 0) + 1
 
     # --- 用户操作 ---
     def add_user(self, username: str, password: str) -> int:
@@ -47,6 +240,7 @@ class MeetingDB:
 
             session.add(meeting)
             session.commit()
+            self.invalidate_profile(user_id)
             return meeting.meeting_id
 
     def get_user_meetings(self, user_id: int) -> List[Dict]:
@@ -58,6 +252,33 @@ class MeetingDB:
                 for m in results
             ]
 
+    def get_user_meetings_page(self, user_id: int, limit: int = 20, cursor: Optional[str] = None) -> Dict:
+        """按 (start_time, meeting_id) 倒序的游标分页，命中 ix_meetings_user_start 索引"""
+        start_key = self._sort_key(Meeting.start_time)
+        stmt = select(Meeting, start_key.label("sort_key")).where(Meeting.user_id == user_id)
+        if cursor:
+            start_time, meeting_id = decode_cursor(cursor)
+            start_time = self._cursor_value(start_time)
+            # 冗余的 <= 条件让查询能在索引上直接定位起点，而不是从头扫描再过滤
+            stmt = stmt.where(start_key <= start_time, or_(
+                start_key < start_time,
+                and_(start_key == start_time, Meeting.meeting_id < meeting_id),
+            ))
+        stmt = stmt.order_by(Meeting.start_time.desc(), Meeting.meeting_id.desc()).limit(limit + 1)
+
+        with self.SessionLocal() as session:
+            rows = session.execute(stmt).all()
+            items = [_meeting_dict(m) for m, _ in rows[:limit]]
+            next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0].meeting_id) \
+                if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def find_meeting_by_transcript(self, user_id: int, transcript_hash: str) -> Optional[int]:
+        """该用户由同一原文生成的已入库会议，走 uq_meetings_user_transcript 索引"""
+        stmt = select(Meeting.meeting_id).where(Meeting.user_id == user_id, Meeting.transcript_hash == transcript_hash)
+        with self.SessionLocal() as session:
+            return session.execute(stmt).scalar()
+
     def get_meeting(self, meeting_id: int, user_id: int) -> Optional[Dict]:
         with self.SessionLocal() as session:
             stmt = select(Meeting).where(Meeting.meeting_id == meeting_id, Meeting.user_id == user_id)
@@ -72,6 +293,24 @@ class MeetingDB:
                 "todos": [{"task": t.task, "owner": t.owner} for t in meeting.todos]
             }
 
+    def get_meeting_record(self, meeting_id: int, user_id: int) -> Optional[Dict]:
+        """按 MeetingRecord 的结构返回已入库会议的基本信息、议程结论、待办与待跟进事项"""
+        stmt = select(Meeting).where(Meeting.meeting_id == meeting_id, Meeting.user_id == user_id).options(
+            selectinload(Meeting.attendees), selectinload(Meeting.agendas), selectinload(Meeting.todos),
+            selectinload(Meeting.follow_ups))
+        with self.SessionLocal() as session:
+            meeting = session.execute(stmt).scalar_one_or_none()
+            if not meeting:
+                return None
+            return {
+                "basic_info": {"subject": meeting.subject, "time": meeting.start_time.isoformat(),
+                               "attendees": [a.name for a in meeting.attendees]},
+                "agendas": [{"agenda": a.agenda, "conclusion": a.conclusion} for a in meeting.agendas],
+                "todos": [{"owner": t.owner, "task": t.task,
+                           "deadline": t.deadline.date().isoformat() if t.deadline else None} for t in meeting.todos],
+                "follow_ups": [{"topic": f.topic, "reason": f.reason} for f in meeting.follow_ups],
+            }
+
     # --- 待办事项批量操作 ---
     def add_todos(self, user_id: int, meeting_id: int, todos_data: List[Dict]) -> None:
         with self.SessionLocal() as session:
@@ -87,29 +326,76 @@ class MeetingDB:
             ]
             session.add_all(new_todos)
             session.commit()
+        self.invalidate_profile(user_id)
 
-    def update_todos(self, todos_data: List[Dict]) -> None:
-        with self.SessionLocal() as session:
-            for t_data in todos_data:
-                stmt = select(Todo).where(Todo.todo_id == t_data["todo_id"])
-                todo = session.execute(stmt).scalar_one_or_none()
-                if todo:
-                    todo.user_id = t_data.get("user_id", todo.user_id)
-                    todo.owner = t_data.get("owner", todo.owner)
-                    todo.task = t_data.get("task", todo.task)
-                    todo.deadline = t_data.get("deadline", todo.deadline)
-                    todo.status = t_data.get("status", todo.status)
+    def update_todos(self, todos_data: List[Dict], user_id: Optional[int] = None) -> int:
+        """
+        批量更新待办：按更新字段组合分组，每组一条 executemany 形式的 UPDATE，全部在同一事务内完成。
+        传入 user_id 时只更新属于该用户的待办。返回实际更新的行数。
+        """
+        groups: Dict[tuple, List[Dict]] = {}
+        for t_data in todos_data:
+            fields = tuple(sorted(k for k in TODO_UPDATABLE_FIELDS if k in t_data))
+            if fields:
+                groups.setdefault(fields, []).append(
+                    {"b_todo_id": t_data["todo_id"], **{f"b_{k}": t_data[k] for k in fields}}
+                )
+        if not groups:
+            return 0
 
-            session.commit()
+        todo_ids = [t_data["todo_id"] for t_data in todos_data]
+        updated = 0
+        with self.engine.begin() as conn:
+            # 记录受影响的用户，用于使画像快照失效
+            affected_users = set(conn.execute(
+                select(Todo.user_id).where(Todo.todo_id.in_(todo_ids)).distinct()
+            ).scalars())
+            for fields, params in groups.items():
+                stmt = update(Todo.__table__).where(Todo.todo_id == bindparam("b_todo_id"))
+                if user_id is not None:
+                    stmt = stmt.where(Todo.user_id == user_id)
+                stmt = stmt.values({k: bindparam(f"b_{k}") for k in fields})
+                updated += conn.execute(stmt, params).rowcount
+                if "user_id" in fields:
+                    affected_users.update(p["b_user_id"] for p in params)
+
+        self.invalidate_profile(*affected_users)
+        return updated
 
     def get_user_todos(self, user_id: int) -> List[Dict]:
         with self.SessionLocal() as session:
             stmt = select(Todo).where(Todo.user_id == user_id).order_by(Todo.deadline.desc())
             results = session.execute(stmt).scalars().all()
-            return [
-                {"todo_id": t.todo_id, "task": t.task, "deadline": t.deadline.isoformat(), "status": t.status}
-                for t in results
-            ]
+            return [_todo_dict(t) for t in results]
+
+    def get_user_todos_page(self, user_id: int, limit: int = 20, cursor: Optional[str] = None,
+                            statuses: Optional[List[str]] = None) -> Dict:
+        """按 (deadline, todo_id) 倒序的游标分页，无截止时间的待办排在最后，命中 ix_todos_user_deadline 索引"""
+        deadline_key = self._sort_key(Todo.deadline)
+        stmt = select(Todo, deadline_key.label("sort_key")).where(Todo.user_id == user_id)
+        if statuses:
+            stmt = stmt.where(Todo.status.in_(statuses))
+        if cursor:
+            deadline, todo_id = decode_cursor(cursor)
+            if deadline is None:
+                stmt = stmt.where(Todo.deadline.is_(None), Todo.todo_id < todo_id)
+            else:
+                deadline = self._cursor_value(deadline)
+                stmt = stmt.where(or_(
+                    and_(deadline_key <= deadline, or_(
+                        deadline_key < deadline,
+                        and_(deadline_key == deadline, Todo.todo_id < todo_id),
+                    )),
+                    Todo.deadline.is_(None),
+                ))
+        stmt = stmt.order_by(Todo.deadline.desc().nulls_last(), Todo.todo_id.desc()).limit(limit + 1)
+
+        with self.SessionLocal() as session:
+            rows = session.execute(stmt).all()
+            items = [_todo_dict(t) for t, _ in rows[:limit]]
+            next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0].todo_id) \
+                if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
 
     # --- 用户偏好操作 (使用 Upsert 逻辑) ---
     def add_user_preference(self, user_id: int, category: str, preference_val: str):
@@ -125,13 +411,238 @@ class MeetingDB:
                 session.add(pref)
 
             session.commit()
+            self.invalidate_profile(user_id)
             return pref.preference_id
 
+    def upsert_preferences(self, user_id: int, items: List[Dict]) -> Dict[str, list]:
+        """
+        批量写入偏好 {category, preference}：一个事务内先读出同类别的现有值，
+        再以一条 INSERT ... ON CONFLICT(user_id, category) DO UPDATE（uq_user_category）写入新增与变更的条目，
+        值未变的条目不写。返回各条目的处理结果，覆盖了已有值或被拒绝的条目不会被静默丢弃：
+        inserted / unchanged 为类别列表，updated 为 {category, previous, preference}，
+        rejected 为 {category, preference, reason}（字段缺失、类别过长、同批重复时以最后一条为准）。
+        """
+        report = {"inserted": [], "updated": [], "unchanged": [], "rejected": []}
+        max_len = Preference.__table__.c.category.type.length
+        values: Dict[str, str] = {}
+        for item in items:
+            category = str(item.get("category") or "").strip()
+            preference = str(item.get("preference") or "").strip()
+            reason = None
+            if not category or not preference:
+                reason = "类别或偏好为空"
+            elif len(category) > max_len:
+                reason = f"类别超过 {max_len} 字"
+            elif category in values:
+                report["rejected"].append({"category": category, "preference": values[category],
+                                           "reason": "同批重复，已被后一条覆盖"})
+            if reason:
+                report["rejected"].append({"category": category, "preference": preference, "reason": reason})
+            else:
+                values[category] = preference
+        if not values:
+            return report
+
+        table = Preference.__table__
+        with self.engine.begin() as conn:
+            existing = dict(conn.execute(
+                select(table.c.category, table.c.preference)
+                .where(table.c.user_id == user_id, table.c.category.in_(list(values)))
+            ).all())
+            rows = []
+            for category, preference in values.items():
+                if category not in existing:
+                    report["inserted"].append(category)
+                elif existing[category] != preference:
+                    report["updated"].append({"category": category, "previous": existing[category],
+                                              "preference": preference})
+                else:
+                    report["unchanged"].append(category)
+                    continue
+                rows.append({"user_id": user_id, "category": category, "preference": preference})
+            if rows:
+                conn.execute(self._upsert(table, ["user_id", "category"], rows, ["preference"]))
+
+        if report["inserted"] or report["updated"]:
+            self.invalidate_profile(user_id)
+        return report
+
+    def _upsert(self, table, keys: List[str], rows: List[Dict], updates: List[str]):
+        """多行 INSERT ... ON CONFLICT DO UPDATE；MySQL 使用 ON DUPLICATE KEY UPDATE"""
+        dialect = self.engine.dialect.name
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table).values(rows)
+            return stmt.on_duplicate_key_update({k: stmt.inserted[k] for k in updates})
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(rows)
+        return stmt.on_conflict_do_update(index_elements=keys, set_={k: stmt.excluded[k] for k in updates})
+
     def get_user_preference_dict(self, user_id: int) -> Dict[str, str]:
         with self.SessionLocal() as session:
             stmt = select(Preference).where(Preference.user_id == user_id)
             prefs = session.execute(stmt).scalars().all()
             return {p.category: p.preference for p in prefs}
 
+    # --- 会议原文存储（按内容哈希去重，zlib 压缩；按上传者授权读取） ---
+    def has_transcript(self, content_hash: str, user_id: int) -> bool:
+        """该用户是否上传过此内容；其他用户的上传不可见"""
+        stmt = select(TranscriptOwner.content_hash).where(TranscriptOwner.user_id == user_id,
+                                                          TranscriptOwner.content_hash == content_hash)
+        with self.SessionLocal() as session:
+            return session.execute(stmt).first() is not None
+
+    def save_transcript(self, content_hash: str, data: bytes, size: int, user_id: int) -> bool:
+        """
+        在一个事务中写入压缩后的原文（内容已存在时保留原有数据）并登记上传者；
+        返回该用户是否为首次上传此内容，不反映其他用户是否上传过。
+        """
+        owner = select(TranscriptOwner.user_id).where(TranscriptOwner.user_id == user_id,
+                                                      TranscriptOwner.content_hash == content_hash)
+        for attempt in range(2):
+            try:
+                with self.engine.begin() as conn:
+                    if conn.execute(select(Transcript.content_hash)
+                                    .where(Transcript.content_hash == content_hash)).first() is None:
+                        conn.execute(insert(Transcript).values(content_hash=content_hash, data=data, size=size))
+                    if conn.execute(owner).first() is not None:
+                        return False
+                    conn.execute(insert(TranscriptOwner).values(user_id=user_id, content_hash=content_hash))
+                    return True
+            except IntegrityError:
+                # 并发上传同一内容时另一方先提交，重试一次即可读到其写入
+                if attempt:
+                    raise
+
+    def get_transcript(self, key: str, user_id: int) -> Optional[str]:
+        """按完整哈希或原文引用中的 12 位短哈希取回该用户上传过的原文"""
+        if not TRANSCRIPT_KEY.fullmatch(key):
+            return None
+        stmt = select(Transcript.data).join(TranscriptOwner, TranscriptOwner.content_hash == Transcript.content_hash) \
+            .where(TranscriptOwner.user_id == user_id)
+        if len(key) == 64:
+            stmt = stmt.where(TranscriptOwner.content_hash == key)
+        else:
+            # 十六进制前缀的区间扫描，走 (user_id, content_hash) 主键索引
+            stmt = stmt.where(TranscriptOwner.content_hash >= key, TranscriptOwner.content_hash < key + "g").limit(1)
+        with self.SessionLocal() as session:
+            data = session.execute(stmt).scalar_one_or_none()
+        return zlib.decompress(data).decode("utf-8") if data is not None else None
+
+    # --- 全文检索 ---
+    def index_transcripts(self, session, rows: List[tuple]) -> None:
+        """在调用方的事务内为会议原文建索引，rows 为 (meeting_id, user_id, 原文)"""
+        params = [{"rowid": search.transcript_rowid(meeting_id), "body": body, "meeting_id": meeting_id,
+                   "user_id": user_id} for meeting_id, user_id, body in rows if body]
+        if not self.search_enabled or not params:
+            return
+        session.execute(
+            text("INSERT INTO search_index(rowid, body, kind, ref_id, meeting_id, user_id) "
+                 "VALUES (:rowid, :body, 'transcript', :meeting_id, :meeting_id, :user_id)"),
+            params,
+        )
+        session.execute(
+            text(f"INSERT INTO search_bigram(rowid, body) VALUES (:rowid, {search.BIGRAM_FUNCTION}(:body))"),
+            [{"rowid": p["rowid"], "body": p["body"]} for p in params],
+        )
+
+    def search(self, user_id: int, query: str, kinds: Optional[List[str]] = None, limit: int = 20,
+               cursor: Optional[str] = None) -> Dict:
+        """
+        检索该用户的会议主题、原文、议程结论、待办与跟进事项。
+        含 2 字及以上的检索词时按 bm25 相关度排序（3 字以上走 trigram 索引，2 字走二元组侧表），
+        只有单字检索词时按会议时间倒序；游标为结果偏移量。
+        """
+        if not self.search_enabled:
+            raise NotImplementedError("当前数据库不支持全文检索")
+        match, bigram_match, likes = search.parse_query(query or "")
+        if not match and not bigram_match and not likes:
+            raise ValueError("检索词不能为空")
+        unknown = set(kinds or []) - set(search.KIND_CODES)
+        if unknown:
+            raise ValueError(f"Invalid kind: {sorted(unknown)}. Allowed values are: {list(search.KIND_CODES)}")
+        offset = decode_cursor(cursor)[0] if cursor else 0
+
+        source = "search_index"
+        conditions = ["search_index.user_id = :user_id"]
+        params = {"user_id": user_id, "limit": limit + 1, "offset": offset}
+        scores = []
+        if match:
+            conditions.append("search_index MATCH :match")
+            params["match"] = match
+            scores.append("bm25(search_index)")
+        if bigram_match:
+            source += " JOIN search_bigram ON search_bigram.rowid = search_index.rowid"
+            conditions.append("search_bigram MATCH :bigram_match")
+            params["bigram_match"] = bigram_match
+            scores.append("bm25(search_bigram)")
+        if match:
+            snippet = "snippet(search_index, 0, '【', '】', '…', 24)"
+        else:
+            # 没有 trigram 检索词时截取首个词附近的文本作为摘要
+            params["term"] = query.split()[0]
+            snippet = "substr(search_index.body, max(instr(search_index.body, :term) - 30, 1), 80)"
+        if scores:
+            columns = f"{snippet} AS snippet, {' + '.join(scores)} AS score"
+            order = "score, search_index.rowid"
+        else:
+            columns = f"{snippet} AS snippet, NULL AS score"
+            order = ("(SELECT start_time FROM meetings WHERE meetings.meeting_id = search_index.meeting_id) DESC, "
+                     "search_index.rowid DESC")
+        for i, like in enumerate(likes):
+            conditions.append(f"search_index.body LIKE :like{i} ESCAPE '\\'")
+            params[f"like{i}"] = like
+        stmt = text(f"SELECT search_index.kind, search_index.ref_id, search_index.meeting_id, {columns} "
+                    f"FROM {source} WHERE {' AND '.join(conditions)}"
+                    f"{' AND search_index.kind IN :kinds' if kinds else ''} "
+                    f"ORDER BY {order} LIMIT :limit OFFSET :offset")
+        if kinds:
+            stmt = stmt.bindparams(bindparam("kinds", expanding=True))
+            params["kinds"] = list(kinds)
+
+        with self.SessionLocal() as session:
+            rows = session.execute(stmt, params).all()
+            meeting_ids = {row.meeting_id for row in rows[:limit]}
+            meetings = {m.meeting_id: m for m in session.execute(
+                select(Meeting).where(Meeting.meeting_id.in_(meeting_ids))).scalars()} if meeting_ids else {}
+            items = [{
+                "kind": row.kind,
+                "id": row.ref_id,
+                "meeting_id": row.meeting_id,
+                "subject": meetings[row.meeting_id].subject if row.meeting_id in meetings else None,
+                "start_time": meetings[row.meeting_id].start_time.isoformat() if row.meeting_id in meetings else None,
+                "snippet": row.snippet,
+                "score": round(-row.score, 4) if row.score is not None else None,
+            } for row in rows[:limit]]
+        next_cursor = encode_cursor(offset + limit) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    # --- 语义检索文本块 ---
+    def iter_chunks(self, batch_size: int = 1000):
+        """按 chunk_id 顺序分批产出 [(chunk_id, user_id, 文本)]，供重建向量索引"""
+        last_id = 0
+        while True:
+            stmt = select(EmbeddingChunk.chunk_id, EmbeddingChunk.user_id, EmbeddingChunk.content) \
+                .where(EmbeddingChunk.chunk_id > last_id).order_by(EmbeddingChunk.chunk_id).limit(batch_size)
+            with self.SessionLocal() as session:
+                rows = [tuple(row) for row in session.execute(stmt)]
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def get_chunks(self, chunk_ids: List[int]) -> Dict[int, Dict]:
+        """按 chunk_id 取文本块及所属会议；会议已删除的文本块不在结果中"""
+        if not chunk_ids:
+            return {}
+        stmt = select(EmbeddingChunk, Meeting).join(Meeting, Meeting.meeting_id == EmbeddingChunk.meeting_id) \
+            .where(EmbeddingChunk.chunk_id.in_(chunk_ids))
+        with self.SessionLocal() as session:
+            return {chunk.chunk_id: {**_meeting_dict(m), "kind": chunk.kind, "content": chunk.content}
+                    for chunk, m in session.execute(stmt)}
+
 
 db = MeetingDB()
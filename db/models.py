@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import ForeignKey, String, Integer, DateTime, Boolean, Text, UniqueConstraint, func
+from sqlalchemy import ForeignKey, String, Integer, DateTime, Boolean, Text, LargeBinary, UniqueConstraint, Index, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -20,6 +20,7 @@ class User(Base):
     # 关系映射
     meetings: Mapped[List["Meeting"]] = relationship(back_populates="user", cascade="all, delete-orphan")
     preferences: Mapped[List["Preference"]] = relationship(back_populates="user", cascade="all, delete-orphan")
+    todos: Mapped[List["Todo"]] = relationship(back_populates="user")
 
 
 class Meeting(Base):
@@ -30,12 +31,21 @@ class Meeting(Base):
     subject: Mapped[str] = mapped_column(Text, nullable=False)
     start_time: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     duration: Mapped[Optional[int]] = mapped_column(Integer)
+    # 会议原文的 sha256，同一用户的同一原文只入库一次；手动创建的会议为空
+    transcript_hash: Mapped[Optional[str]] = mapped_column(String(64))
     created_at: Mapped[datetime] = mapped_column(server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
 
     user: Mapped["User"] = relationship(back_populates="meetings")
     attendees: Mapped[List["Attendee"]] = relationship(back_populates="meeting", cascade="all, delete-orphan")
+    agendas: Mapped[List["Agenda"]] = relationship(back_populates="meeting", cascade="all, delete-orphan")
     todos: Mapped[List["Todo"]] = relationship(back_populates="meeting", cascade="all, delete-orphan")
+    follow_ups: Mapped[List["FollowUp"]] = relationship(back_populates="meeting", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_meetings_user_start", "user_id", "start_time"),
+        Index("uq_meetings_user_transcript", "user_id", "transcript_hash", unique=True),
+    )
 
 
 class Attendee(Base):
@@ -48,10 +58,21 @@ class Attendee(Base):
     meeting: Mapped["Meeting"] = relationship(back_populates="attendees")
 
 
+class Agenda(Base):
+    __tablename__ = "agenda_conclusions"
+
+    agenda_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    meeting_id: Mapped[int] = mapped_column(ForeignKey("meetings.meeting_id", ondelete="CASCADE"))
+    agenda: Mapped[str] = mapped_column(Text, nullable=False)
+    conclusion: Mapped[Optional[str]] = mapped_column(Text)
+
+    meeting: Mapped["Meeting"] = relationship(back_populates="agendas")
+
+
 class Todo(Base):
     __tablename__ = "todos"
 
-    user_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id", ondelete="CASCADE"))
     todo_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     meeting_id: Mapped[int] = mapped_column(ForeignKey("meetings.meeting_id", ondelete="CASCADE"))
     owner: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -59,8 +80,23 @@ class Todo(Base):
     deadline: Mapped[Optional[datetime]] = mapped_column(DateTime)
     status: Mapped[str] = mapped_column(String(20), default="pending")
 
+    user: Mapped["User"] = relationship(back_populates="todos")
     meeting: Mapped["Meeting"] = relationship(back_populates="todos")
 
+    __table_args__ = (Index("ix_todos_user_deadline", "user_id", "deadline"),)
+
+
+class FollowUp(Base):
+    __tablename__ = "follow_ups"
+
+    follow_up_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    meeting_id: Mapped[int] = mapped_column(ForeignKey("meetings.meeting_id", ondelete="CASCADE"))
+    topic: Mapped[str] = mapped_column(Text, nullable=False)
+    reason: Mapped[Optional[str]] = mapped_column(Text)
+    is_resolved: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    meeting: Mapped["Meeting"] = relationship(back_populates="follow_ups")
+
 
 class Preference(Base):
     __tablename__ = "preference"
@@ -72,4 +108,44 @@ class Preference(Base):
 
     user: Mapped["User"] = relationship(back_populates="preferences")
 
-    __table_args__ = (UniqueConstraint("user_id", "category", name="uq_user_category"),)
\ No newline at end of file
+    __table_args__ = (UniqueConstraint("user_id", "category", name="uq_user_category"),)
+
+
+class ExtractionCache(Base):
+    __tablename__ = "extraction_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    tool_name: Mapped[str] = mapped_column(String(100), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    accessed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+
+
+class Transcript(Base):
+    __tablename__ = "transcripts"
+
+    content_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class TranscriptOwner(Base):
+    """原文按内容去重存储，访问权限按上传者记录；主键以 user_id 开头，按用户的前缀查找可走主键索引"""
+    __tablename__ = "transcript_owners"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id", ondelete="CASCADE"), primary_key=True)
+    content_hash: Mapped[str] = mapped_column(ForeignKey("transcripts.content_hash", ondelete="CASCADE"),
+                                              primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+
+
+class EmbeddingChunk(Base):
+    __tablename__ = "embedding_chunks"
+
+    chunk_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    meeting_id: Mapped[int] = mapped_column(ForeignKey("meetings.meeting_id", ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
@@ -0,0 +1,129 @@
+"""
+SQLite FTS5 全文索引：会议主题、原文、议程结论、待办与跟进事项。
+
+使用 trigram 分词器，中文无需分词即可做任意子串匹配（检索词至少 3 个字符时走索引）。
+2 字词（预算、上线等中文常见词）由 search_bigram 侧表承担：同一行文本切成重叠的二元组后写入 content='' 的 FTS5 表，
+rowid 与 search_index 一致，二者按 rowid 联接并叠加 bm25；二元组由连接上注册的 search_bigrams() 函数生成。
+只剩单字检索词时回落为 LIKE 扫描，按会议时间倒序。
+索引行的 rowid = 源记录主键 * 8 + 类型编号，增删改按 rowid 定位，不必扫描 UNINDEXED 列。
+meetings / agenda_conclusions / todos / follow_ups 由触发器同步；会议原文没有对应的源表（meetings 只记内容哈希），
+由 MeetingService 写入会议时调用 MeetingDB.index_transcripts 写入，随会议删除触发器一并清理。
+注意 search_index 自带内容存储，原文全文以明文保存在该表中（上传接口的 transcripts 表也以可还原的压缩形式保存原文），
+数据库文件与原文同等敏感。
+"""
+import re
+from typing import List, Optional, Tuple
+
+KIND_CODES = {"meeting": 1, "transcript": 2, "agenda": 3, "todo": 4, "follow_up": 5}
+KIND_NAMES = {code: kind for kind, code in KIND_CODES.items()}
+ROWID_STRIDE = 8
+TRIGRAM = 3
+BIGRAM = 2
+BIGRAM_FUNCTION = "search_bigrams"
+
+FTS_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    body,
+    kind UNINDEXED,
+    ref_id UNINDEXED,
+    meeting_id UNINDEXED,
+    user_id UNINDEXED,
+    tokenize = 'trigram'
+)
+"""
+
+# 不存原文（content=''），删除时需按 search_index 中的原文重新生成二元组
+BIGRAM_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_bigram USING fts5(body, content = '', tokenize = 'unicode61')
+"""
+
+BIGRAM_BACKFILL = f"INSERT INTO search_bigram(rowid, body) SELECT rowid, {BIGRAM_FUNCTION}(body) FROM search_index"
+
+
+def bigrams(body: Optional[str]) -> Optional[str]:
+    """把文本中每段连续的字词字符切成重叠的二元组，以空格分隔，如 '预算审核' -> '预算 算审 审核'"""
+    if body is None:
+        return None
+    return " ".join(word[i:i + BIGRAM] for word in re.findall(r"[^\W_]+", body.lower())
+                    for i in range(len(word) - 1))
+
+
+def _row(kind: str, ref: str, body: str, meeting_id: str, user_id: str) -> str:
+    code = KIND_CODES[kind]
+    rowid = f"{ref} * {ROWID_STRIDE} + {code}"
+    return (f"INSERT INTO search_index(rowid, body, kind, ref_id, meeting_id, user_id) "
+            f"VALUES ({rowid}, {body}, '{kind}', {ref}, {meeting_id}, {user_id}); "
+            f"INSERT INTO search_bigram(rowid, body) VALUES ({rowid}, {BIGRAM_FUNCTION}({body}));")
+
+
+def _delete(kind: str, ref: str) -> str:
+    rowid = f"{ref} * {ROWID_STRIDE} + {KIND_CODES[kind]}"
+    return (f"INSERT INTO search_bigram(search_bigram, rowid, body) "
+            f"SELECT 'delete', rowid, {BIGRAM_FUNCTION}(body) FROM search_index WHERE rowid = {rowid}; "
+            f"DELETE FROM search_index WHERE rowid = {rowid};")
+
+
+MEETING_USER = "(SELECT user_id FROM meetings WHERE meeting_id = NEW.meeting_id)"
+
+# 表 -> (类型, 主键列, 索引文本表达式, 会议 id 表达式, 用户 id 表达式, 触发重建的列)
+SOURCES = {
+    "meetings": ("meeting", "meeting_id", "{t}.subject", "{t}.meeting_id", "{t}.user_id", "subject, user_id"),
+    "agenda_conclusions": ("agenda", "agenda_id", "{t}.agenda || ' ' || coalesce({t}.conclusion, '')",
+                           "{t}.meeting_id", MEETING_USER, "agenda, conclusion"),
+    "todos": ("todo", "todo_id", "{t}.owner || ' ' || {t}.task", "{t}.meeting_id", "{t}.user_id",
+              "owner, task, user_id"),
+    "follow_ups": ("follow_up", "follow_up_id", "{t}.topic || ' ' || coalesce({t}.reason, '')",
+                   "{t}.meeting_id", MEETING_USER, "topic, reason"),
+}
+
+
+def trigger_statements() -> List[str]:
+    """先删后建，升级时已有的触发器也会换成当前定义"""
+    statements = []
+    for table, (kind, pk, body, meeting_id, user_id, columns) in SOURCES.items():
+        new = dict(ref=f"NEW.{pk}", body=body.format(t="NEW"), meeting_id=meeting_id.format(t="NEW"),
+                   user_id=user_id.format(t="NEW"))
+        on_delete = _delete(kind, f"OLD.{pk}")
+        if kind == "meeting":
+            on_delete += " " + _delete("transcript", f"OLD.{pk}")
+        for suffix in ("ai", "au", "ad"):
+            statements.append(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+        statements += [
+            f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN {_row(kind, **new)} END",
+            f"CREATE TRIGGER {table}_search_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+            f"{_delete(kind, f'OLD.{pk}')} {_row(kind, **new)} END",
+            f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN {on_delete} END",
+        ]
+    return statements
+
+
+def backfill_statements() -> List[str]:
+    """为建索引之前已存在的数据补建索引行"""
+    statements = []
+    for table, (kind, pk, body, meeting_id, user_id, _) in SOURCES.items():
+        user_expr = "(SELECT user_id FROM meetings m WHERE m.meeting_id = t.meeting_id)" \
+            if user_id == MEETING_USER else user_id.format(t="t")
+        statements.append(
+            f"INSERT INTO search_index(rowid, body, kind, ref_id, meeting_id, user_id) "
+            f"SELECT t.{pk} * {ROWID_STRIDE} + {KIND_CODES[kind]}, {body.format(t='t')}, '{kind}', t.{pk}, "
+            f"{meeting_id.format(t='t')}, {user_expr} FROM {table} t"
+        )
+    return statements
+
+
+def transcript_rowid(meeting_id: int) -> int:
+    return meeting_id * ROWID_STRIDE + KIND_CODES["transcript"]
+
+
+def parse_query(query: str) -> Tuple[str, str, List[str]]:
+    """
+    拆分检索词：不少于 3 个字符的词组成 search_index 的 MATCH 表达式（各词加引号按字面匹配，词间为 AND），
+    2 个字词字符组成的词组成 search_bigram 的 MATCH 表达式，其余更短的词返回为 LIKE 模式列表。
+    """
+    terms = [t for t in re.split(r"\s+", query.strip()) if t]
+    match = " ".join('"' + t.replace('"', '""') + '"' for t in terms if len(t) >= TRIGRAM)
+    pairs = [t for t in terms if len(t) == BIGRAM and bigrams(t) == t.lower()]
+    bigram_match = " ".join(f'"{t.lower()}"' for t in pairs)
+    likes = ["%" + t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+             for t in terms if len(t) < TRIGRAM and t not in pairs]
+    return match, bigram_match, likes
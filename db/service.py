@@ -1,14 +1,44 @@
+import hashlib
+import re
 import string
+import zlib
 from datetime import datetime
-from typing import List, Optional
+from typing import BinaryIO, List, Optional
 from hashlib import md5
 
-from action.models import MeetingRecord, AgendaConclusion, FollowUp
-from db.manager import MeetingDB
-from db.models import Meeting, Attendee, Todo, User
+from sqlalchemy import select
 
+import config
+from action.models import MeetingRecord
+from action.transcript import content_hash
+from db.manager import MeetingDB, db
+from db.models import Meeting, Attendee, Agenda, Todo, FollowUp, User, EmbeddingChunk
 
-def convert_todos(todo_list: list) -> List[Todo]:
+ALLOWED_STATUSES = ["pending", "in_progress", "completed", "cancelled"]
+
+
+def parse_start_time(value: str) -> datetime:
+    """解析 ISO 格式的会议时间；LLM 未能提取（如“未知”）时以入库时间代替"""
+    try:
+        return datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        return datetime.now()
+
+
+def parse_duration(value: str) -> Optional[int]:
+    """将“75”、“45分钟”、“1小时15分钟”、“1.5小时”等描述换算为分钟数，无法识别时返回 None"""
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value.strip())
+    hours = re.search(r"(\d+(?:\.\d+)?)\s*(?:小时|h)", value)
+    minutes = re.search(r"(\d+)\s*(?:分钟|分|min)", value)
+    if not hours and not minutes:
+        return None
+    return int(float(hours.group(1)) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+
+
+def convert_todos(todo_list: list, user_id: int) -> List[Todo]:
     """内部逻辑：处理日期转换并返回待办对象列表"""
     orm_todos = []
     for t in todo_list:
@@ -22,6 +52,7 @@ def convert_todos(todo_list: list) -> List[Todo]:
                 deadline_dt = None
 
         orm_todos.append(Todo(
+            user_id=user_id,
             owner=t.owner,
             task=t.task,
             deadline=deadline_dt,
@@ -31,10 +62,8 @@ def convert_todos(todo_list: list) -> List[Todo]:
 
 
 def update_todos(todo_id: int, owner: Optional[string], task: Optional[string], deadline: Optional[datetime], status: Optional[string] ) -> None:
-    allowed_status = ["pending", "in_progress", "completed", "cancelled"]
-    if status and status not in allowed_status:
-        raise ValueError(f"Invalid status: {status}. Allowed values are: {allowed_status}")
-    db = MeetingDB()
+    if status and status not in ALLOWED_STATUSES:
+        raise ValueError(f"Invalid status: {status}. Allowed values are: {ALLOWED_STATUSES}")
     todo_dict = {"todo_id": todo_id}
     if owner is not None:
         todo_dict["owner"] = owner
@@ -48,6 +77,70 @@ def update_todos(todo_id: int, owner: Optional[string], task: Optional[string],
     db.update_todos([todo_dict])
 
 
+def bulk_update_todos(user_id: int, items: List[dict]) -> int:
+    """
+    批量更新某用户的待办。先整体校验（状态集合只校验一次、截止时间统一解析），
+    任一条目非法则整批拒绝；校验通过后在单个事务中按字段组合批量 UPDATE。返回更新行数。
+    """
+    if not isinstance(items, list):
+        raise ValueError("todos must be a list")
+
+    statuses = {t.get("status") for t in items if isinstance(t, dict) and t.get("status") is not None}
+    invalid = statuses - set(ALLOWED_STATUSES)
+    if invalid:
+        raise ValueError(f"Invalid status: {sorted(invalid)}. Allowed values are: {ALLOWED_STATUSES}")
+
+    todos_data = []
+    for t in items:
+        if not isinstance(t, dict) or not isinstance(t.get("todo_id"), int):
+            raise ValueError(f"Each todo must be an object with an integer todo_id: {t}")
+        todo_dict = {k: t[k] for k in ("todo_id", "owner", "task", "status") if t.get(k) is not None}
+        if "deadline" in t:
+            try:
+                todo_dict["deadline"] = datetime.fromisoformat(t["deadline"]) if t["deadline"] else None
+            except (ValueError, TypeError):
+                raise ValueError(f"Invalid deadline for todo {t['todo_id']}: {t['deadline']}")
+        todos_data.append(todo_dict)
+
+    return db.update_todos(todos_data, user_id=user_id)
+
+
+def upload_transcript(stream: BinaryIO, user_id: int, max_bytes: int = None, chunk_size: int = 64 * 1024) -> dict:
+    """
+    分块读取请求体中的 UTF-8 会议原文，边读边计算 sha256；该用户已上传过同一内容时跳过压缩与写入。
+    返回 meeting_id（即内容哈希）、原文字节数、压缩后字节数与是否重复上传。
+    其他用户上传过同一内容时仍照常压缩并只登记上传者，响应与首次上传一致，不透露内容是否已存在。
+    """
+    max_bytes = max_bytes or config.TRANSCRIPT_MAX_BYTES
+    digest = hashlib.sha256()
+    chunks = []
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise OverflowError(f"会议原文超过 {max_bytes} 字节上限")
+        digest.update(chunk)
+        chunks.append(chunk)
+
+    raw = b"".join(chunks)
+    if not raw.strip():
+        raise ValueError("会议原文不能为空")
+    try:
+        raw.decode("utf-8")
+    except UnicodeDecodeError:
+        raise ValueError("会议原文必须为 UTF-8 编码")
+
+    content_hash = digest.hexdigest()
+    if db.has_transcript(content_hash, user_id):
+        return {"meeting_id": content_hash, "size": size, "stored_bytes": None, "duplicate": True}
+    data = zlib.compress(raw, 6)
+    created = db.save_transcript(content_hash, data, size, user_id)
+    return {"meeting_id": content_hash, "size": size, "stored_bytes": len(data), "duplicate": not created}
+
+
 class MeetingService:
     def __init__(self, db: MeetingDB):
         self.db = db
@@ -62,58 +155,97 @@ class MeetingService:
                 raise ValueError("用户名或密码错误")
             return user["user_id"]
 
+    @staticmethod
+    def build_meeting(record: MeetingRecord) -> Meeting:
+        """将 MeetingRecord 转换为 Meeting ORM 对象及其子对象树"""
+        # 1. 解析基础数据
+        new_meeting = Meeting(
+            user_id=record.user_id,
+            subject=record.basic_info.subject,
+            start_time=parse_start_time(record.basic_info.time),
+            duration=parse_duration(record.basic_info.duration),
+            transcript_hash=content_hash(record.raw_text) if record.raw_text.strip() else None
+        )
+
+        # 2. 添加参会人
+        if record.basic_info.attendees:
+            new_meeting.attendees = [
+                Attendee(name=name) for name in record.basic_info.attendees
+            ]
+
+        # 3. 添加议程结论
+        new_meeting.agendas = [
+            Agenda(agenda=a.agenda, conclusion=a.conclusion)
+            for a in record.agendas
+        ]
+
+        # 4. 添加待办事项
+        new_meeting.todos = convert_todos(record.todos, record.user_id)
+
+        # 5. 添加待跟进事项
+        new_meeting.follow_ups = [
+            FollowUp(topic=f.topic, reason=f.reason)
+            for f in record.follow_ups
+        ]
+        return new_meeting
+
     def process_meeting_record(self, record: MeetingRecord) -> int:
         """
         处理并保存完整的会议记录
         利用 ORM 的关联关系实现原子化存储
         """
+        return self.process_meeting_records([record])[0]
+
+    def process_meeting_records(self, records: List[MeetingRecord]) -> List[int]:
+        """
+        在同一个事务中批量保存多条会议记录，任一条失败则整批回滚。
+        同一用户的同一原文只入库一次（含同批重复），重复的记录直接返回已有会议的 meeting_id。
+        返回与 records 顺序一致的 meeting_id 列表。
+        """
+        # 向量索引依赖 numpy，首次写入会议时才导入，不拖慢 API 进程启动
+        from db.vectors import build_chunks, vector_index
+
         with self.db.SessionLocal() as session:
             try:
-                # 1. 解析基础数据
-                try:
-                    start_time = datetime.fromisoformat(record.basic_info.time)
-                    duration = int(record.basic_info.duration) if record.basic_info.duration else None
-                except (ValueError, TypeError):
-                    raise ValueError("无效的时间格式或会议时长")
-
-                # 2. 构建 Meeting ORM 对象及其子对象树
-                new_meeting = Meeting(
-                    user_id=record.user_id,
-                    subject=record.basic_info.subject,
-                    start_time=start_time,
-                    duration=duration
-                )
-
-                # 3. 添加参会人
-                if record.basic_info.attendees:
-                    new_meeting.attendees = [
-                        Attendee(name=name) for name in record.basic_info.attendees
-                    ]
-
-                # 4. 添加议程结论
-                new_meeting.agendas = [
-                    AgendaConclusion(agenda=a.agenda, conclusion=a.conclusion)
-                    for a in record.agendas
-                ]
-
-                # 5. 添加待办事项
-                new_meeting.todos = convert_todos(record.todos)
-
-                # 6. 添加待跟进事项
-                new_meeting.follow_ups = [
-                    FollowUp(topic=f.topic, reason=f.reason)
-                    for f in record.follow_ups
-                ]
-
-                # 7. 一次性提交到数据库 (原子事务)
-                session.add(new_meeting)
+                candidates = [self.build_meeting(record) for record in records]
+                hashes = {m.transcript_hash for m in candidates if m.transcript_hash}
+                # (user_id, 原文哈希) -> 已入库或本批新建的会议
+                known = {(user_id, h): meeting_id for meeting_id, user_id, h in session.execute(
+                    select(Meeting.meeting_id, Meeting.user_id, Meeting.transcript_hash)
+                    .where(Meeting.transcript_hash.in_(hashes)))} if hashes else {}
+                meetings, fresh = [], []
+                for meeting, record in zip(candidates, records):
+                    key = (meeting.user_id, meeting.transcript_hash)
+                    if meeting.transcript_hash and key in known:
+                        meetings.append(known[key])
+                        continue
+                    if meeting.transcript_hash:
+                        known[key] = meeting
+                    meetings.append(meeting)
+                    fresh.append((meeting, record))
+                session.add_all([meeting for meeting, _ in fresh])
+                # flush 后即可拿到自增主键，避免提交后逐个刷新对象
+                session.flush()
+                meeting_ids = [m if isinstance(m, int) else m.meeting_id for m in meetings]
+                self.db.index_transcripts(session, [(meeting.meeting_id, record.user_id, record.raw_text)
+                                                    for meeting, record in fresh])
+                chunks = [EmbeddingChunk(meeting_id=meeting.meeting_id, user_id=record.user_id, kind=kind,
+                                         content=content)
+                          for meeting, record in fresh
+                          for kind, content in build_chunks(record)]
+                session.add_all(chunks)
+                session.flush()
+                chunk_rows = [(c.chunk_id, c.user_id, c.content) for c in chunks]
                 session.commit()
-
-                # 刷新以获取数据库生成的 meeting_id
-                session.refresh(new_meeting)
-                return new_meeting.meeting_id
-
             except Exception as e:
                 session.rollback()
                 print(f"Error saving meeting: {e}")
                 raise
+
+        self.db.invalidate_profile(*{record.user_id for record in records})
+        # 向量只是 embedding_chunks 的派生数据，追加失败不影响会议入库，可通过 vector_index.rebuild() 补齐
+        try:
+            vector_index.add(chunk_rows)
+        except Exception as e:
+            print(f"Error indexing meeting vectors: {e}")
+        return meeting_ids
@@ -0,0 +1,315 @@
+"""
+跨会议语义检索：议程结论与原文切块的本地向量索引。
+
+向量用字符 n-gram 特征哈希得到（纯 CPU、无需模型与网络），L2 归一化后点积即余弦相似度。
+全部向量按行存放在内存映射的 .npy 矩阵中，新会议入库时追加写入，容量不足时按倍数扩容；
+检索时一批问题与候选行做一次矩阵乘法取 top-k。文本块本身保存在 embedding_chunks 表，
+向量文件丢失或维度配置变化时从该表重建。
+API 服务的多个 worker 与 batch.py 可能同时写同一组文件，写入时持有跨进程文件锁，并在读写前从 .json 同步行数。
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只有进程内锁，须保证只有一个进程写入
+    fcntl = None
+
+import numpy as np
+
+import config
+from action.models import MeetingRecord
+from action.transcript import line_segments
+from db.manager import MeetingDB, db
+
+# (n, 权重)：单字区分度低，权重减半
+NGRAMS = ((1, 0.5), (2, 1.0), (3, 1.0))
+MIX = np.uint64(0x9E3779B97F4A7C15)
+FINALIZE = np.uint64(0xBF58476D1CE4E5B9)
+INITIAL_CAPACITY = 1024
+# 用户的向量行数不足总行数的 1/SCAN_RATIO 时只取出这些行计算，否则整表计算后屏蔽其他用户
+SCAN_RATIO = 8
+
+
+class HashingEmbedder:
+    """字符 n-gram 特征哈希：各 n-gram 经 64 位混合哈希映射到 dim 个桶，最高位决定符号，计数取对数平滑"""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            matrix[i] = self._embed_one(text)
+        return matrix
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        normalized = re.sub(r"[\W_]+", "", text.lower())
+        codes = np.frombuffer(normalized.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        vector = np.zeros(self.dim, dtype=np.float64)
+        for n, weight in NGRAMS:
+            count = len(codes) - n + 1
+            if count <= 0:
+                continue
+            h = np.full(count, n, dtype=np.uint64)
+            for offset in range(n):
+                h = (h * MIX) ^ codes[offset:offset + count]
+            h ^= h >> np.uint64(31)
+            h *= FINALIZE
+            h ^= h >> np.uint64(29)
+            signs = np.where(h >> np.uint64(63), -weight, weight)
+            vector += np.bincount((h % np.uint64(self.dim)).astype(np.intp), weights=signs, minlength=self.dim)
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).astype(np.float32)
+
+
+def build_chunks(record: MeetingRecord, chunk_chars: int = None) -> List[Tuple[str, str]]:
+    """会议记录 -> [(类型, 文本)]：每条议程连同结论一块，原文按行切为不超过 chunk_chars 的块"""
+    chunk_chars = chunk_chars or config.VECTOR_CHUNK_CHARS
+    chunks = [("agenda", f"{a.agenda}：{a.conclusion}" if a.conclusion else a.agenda) for a in record.agendas]
+    lines = record.raw_text.splitlines()
+    for first, last in line_segments(lines, chunk_chars):
+        content = "\n".join(lines[first - 1:last]).strip()
+        if content:
+            chunks.append(("transcript", content))
+    return chunks
+
+
+class VectorIndex:
+    """
+    <path>.vectors.npy 为 (容量, dim) 的 float32 向量矩阵，<path>.keys.npy 为对应行的 (chunk_id, user_id)，
+    <path>.json 记录已写入行数与文件代号（epoch）。先写向量再更新行数，进程中途退出时未计入行数的数据会被下次追加覆盖。
+    写入在进程内加锁并持有 <path>.lock 文件锁，追加前重新读取 .json，从其他进程写入的行之后继续写；
+    扩容与重建都写新文件后原子替换并更换 epoch，其他进程发现 epoch 变化时重新映射。
+    检索前同样按 .json 同步，只读取加锁时取得的数组快照，不阻塞写入。
+    """
+
+    def __init__(self, path: str, embedder: HashingEmbedder, db: Optional[MeetingDB] = None):
+        self.path = path
+        self.embedder = embedder
+        self.db = db
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._vectors: Optional[np.ndarray] = None
+        self._keys: Optional[np.ndarray] = None
+        self._count = 0
+        self._epoch: Optional[str] = None
+        # user_id -> 该用户的向量行号
+        self._user_rows: Dict[int, np.ndarray] = {}
+        self._chunk_ids = set()
+        self._counters = {"searches": 0, "search_seconds_total": 0.0, "added": 0}
+
+    # ---- 写入 ----
+    def add(self, rows: List[Tuple[int, int, str]]) -> int:
+        """
+        rows 为 (chunk_id, user_id, 文本)，返回追加的行数。
+        首次加载时若从表中重建，刚提交的文本块已在其中，已收录的 chunk_id 会被跳过。
+        """
+        vectors = self.embedder.embed([content for _, _, content in rows])
+        with self._lock:
+            self._ensure_loaded()
+            with self._file_lock():
+                # 持锁后再同步一次，拿到其他进程刚追加的行数与 chunk_id
+                self._sync()
+                fresh = [i for i, (chunk_id, _, _) in enumerate(rows) if chunk_id not in self._chunk_ids]
+                if fresh:
+                    keys = np.array([rows[i][:2] for i in fresh], dtype=np.int64)
+                    self._append(vectors[fresh], keys)
+                    self._counters["added"] += len(fresh)
+        return len(fresh)
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        """丢弃现有向量文件，从 embedding_chunks 表重新计算全部向量"""
+        with self._lock, self._file_lock():
+            return self._rebuild(batch_size)
+
+    # ---- 检索 ----
+    def search(self, user_id: int, query: str, k: int = None) -> List[Tuple[int, float]]:
+        return self.search_batch(user_id, [query], k)[0]
+
+    def search_batch(self, user_id: int, queries: List[str], k: int = None) -> List[List[Tuple[int, float]]]:
+        """一次矩阵乘法为多个问题检索该用户的 top-k 文本块，返回 [(chunk_id, 相似度)]，相似度降序"""
+        k = k or config.VECTOR_TOP_K
+        start = time.perf_counter()
+        query_vectors = self.embedder.embed(queries)
+        with self._lock:
+            self._ensure_loaded()
+            vectors, keys, count = self._vectors, self._keys, self._count
+            rows = self._user_rows.get(user_id)
+        if rows is None or not len(rows):
+            return [[] for _ in queries]
+
+        if len(rows) * SCAN_RATIO < count:
+            scores = query_vectors @ vectors[rows].T
+            chunk_ids = keys[rows, 0]
+        else:
+            scores = query_vectors @ vectors[:count].T
+            scores[:, keys[:count, 1] != user_id] = -np.inf
+            chunk_ids = keys[:count, 0]
+
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for i in range(len(queries)):
+            order = top[i][np.argsort(-scores[i, top[i]])]
+            results.append([(int(chunk_ids[j]), float(scores[i, j])) for j in order if scores[i, j] > 0])
+
+        with self._lock:
+            self._counters["searches"] += len(queries)
+            self._counters["search_seconds_total"] += time.perf_counter() - start
+        return results
+
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            capacity = len(self._vectors) if self._vectors is not None else 0
+            return {**self._counters, "chunks": self._count, "capacity": capacity}
+
+    # ---- 文件 ----
+    def _file(self, suffix: str) -> str:
+        return f"{self.path}.{suffix}"
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程写锁，与进程内的 self._lock 配合使用（先取 self._lock）"""
+        if fcntl is None:
+            yield
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self._file("lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            with open(self._file("json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _ensure_loaded(self) -> None:
+        """首次使用时映射向量文件，之后每次读写前与文件同步"""
+        if self._loaded:
+            self._sync()
+            return
+        self._loaded = True
+        if self._try_open(self._read_meta()):
+            return
+        with self._file_lock():
+            # 持锁后再看一次：其他进程可能刚完成重建
+            meta = self._read_meta()
+            if self._try_open(meta):
+                return
+            if meta is not None and meta.get("dim") != self.embedder.dim:
+                print(f"⚠️ 向量维度由 {meta.get('dim')} 变为 {self.embedder.dim}，重建向量索引")
+            print(f"🧭 向量索引已重建: {self._rebuild()} 个文本块")
+
+    def _try_open(self, meta: Optional[dict]) -> bool:
+        if meta is None or meta.get("dim") != self.embedder.dim:
+            return False
+        try:
+            self._open(meta)
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def _open(self, meta: dict) -> None:
+        """映射当前文件并从头建立行号索引"""
+        self._vectors = np.lib.format.open_memmap(self._file("vectors.npy"), mode="r+")
+        self._keys = np.lib.format.open_memmap(self._file("keys.npy"), mode="r+")
+        self._epoch = meta.get("epoch")
+        self._count = meta["count"]
+        self._user_rows = {}
+        self._chunk_ids = set()
+        self._index_rows(0)
+
+    def _sync(self) -> None:
+        """读取 .json：epoch 变化（其他进程扩容或重建）时重新映射，否则只为新增的行建索引"""
+        meta = self._read_meta()
+        if meta is None or meta.get("dim") != self.embedder.dim:
+            return
+        if meta.get("epoch") != self._epoch:
+            self._open(meta)
+        elif meta["count"] > self._count:
+            start, self._count = self._count, meta["count"]
+            self._index_rows(start)
+
+    def _rebuild(self, batch_size: int = 1000) -> int:
+        self._create(INITIAL_CAPACITY)
+        self._loaded = True
+        if self.db is not None:
+            for batch in self.db.iter_chunks(batch_size):
+                keys = np.array([(chunk_id, user_id) for chunk_id, user_id, _ in batch], dtype=np.int64)
+                self._append(self.embedder.embed([content for _, _, content in batch]), keys)
+        return self._count
+
+    def _create(self, capacity: int) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._count = 0
+        self._user_rows = {}
+        self._chunk_ids = set()
+        self._replace_files(capacity, ((self._file("vectors.npy"), np.float32, self.embedder.dim, None),
+                                       (self._file("keys.npy"), np.int64, 2, None)))
+
+    def _grow(self, needed: int) -> None:
+        """容量翻倍：写入新文件后原子替换，本进程检索中与其他进程仍持有的旧映射不受影响"""
+        capacity = max(len(self._vectors) * 2, needed)
+        self._replace_files(capacity, ((self._file("vectors.npy"), np.float32, self.embedder.dim, self._vectors),
+                                       (self._file("keys.npy"), np.int64, 2, self._keys)))
+
+    def _replace_files(self, capacity: int, files: tuple) -> None:
+        """写出 (路径, 类型, 列数, 需复制前 count 行的旧数组) 对应的新文件后原子替换，更换 epoch 并写入 .json"""
+        for path, dtype, columns, old in files:
+            tmp = path + ".tmp"
+            array = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(capacity, columns))
+            if old is not None:
+                array[:self._count] = old[:self._count]
+            array.flush()
+            del array
+            os.replace(tmp, path)
+        self._vectors = np.lib.format.open_memmap(self._file("vectors.npy"), mode="r+")
+        self._keys = np.lib.format.open_memmap(self._file("keys.npy"), mode="r+")
+        self._epoch = uuid.uuid4().hex
+        self._save_meta()
+
+    def _append(self, vectors: np.ndarray, keys: np.ndarray) -> None:
+        start, end = self._count, self._count + len(vectors)
+        if end > len(self._vectors):
+            self._grow(end)
+        self._vectors[start:end] = vectors
+        self._keys[start:end] = keys
+        self._vectors.flush()
+        self._keys.flush()
+        self._count = end
+        self._save_meta()
+        self._index_rows(start)
+
+    def _index_rows(self, start: int) -> None:
+        self._chunk_ids.update(self._keys[start:self._count, 0].tolist())
+        users = self._keys[start:self._count, 1]
+        for user_id in np.unique(users):
+            rows = np.flatnonzero(users == user_id) + start
+            existing = self._user_rows.get(int(user_id))
+            self._user_rows[int(user_id)] = rows if existing is None else np.concatenate([existing, rows])
+
+    def _save_meta(self) -> None:
+        tmp = self._file("json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"count": self._count, "dim": self.embedder.dim, "epoch": self._epoch}, f)
+        os.replace(tmp, self._file("json"))
+
+
+vector_index = VectorIndex(config.VECTOR_INDEX_PATH, HashingEmbedder(config.VECTOR_DIM), db)
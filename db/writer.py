@@ -0,0 +1,115 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Dict, List
+
+import config
+from action.models import MeetingRecord
+from db.manager import db
+from db.service import MeetingService
+
+
+class WriteBehindQueue:
+    """
+    会议记录的后台批量写入队列。
+    请求线程只负责入队，后台线程攒批后在一个事务中写入；队列满时丢弃并计数，绝不阻塞调用方。
+    """
+
+    def __init__(self, service: MeetingService, batch_size: int = None, flush_interval: float = None,
+                 max_queue: int = None):
+        self.service = service
+        self.batch_size = batch_size or config.WRITE_BEHIND_BATCH_SIZE
+        self.flush_interval = flush_interval or config.WRITE_BEHIND_FLUSH_SECONDS
+        self._queue = queue.Queue(maxsize=max_queue or config.WRITE_BEHIND_MAX_QUEUE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "flush_seconds_total": 0.0,
+            "last_flush_seconds": 0.0,
+        }
+
+    def enqueue(self, record: MeetingRecord) -> bool:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._incr("dropped")
+            return False
+        self._incr("enqueued")
+        return True
+
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            result = dict(self._metrics)
+        result["queue_depth"] = self._queue.qsize()
+        result["avg_flush_seconds"] = result["flush_seconds_total"] / result["flushes"] if result["flushes"] else 0.0
+        return result
+
+    def close(self, timeout: float = 10) -> None:
+        """停止后台线程并写完队列中剩余的记录"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="meeting-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+
+    def _take_batch(self) -> List[MeetingRecord]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                remaining = 0
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[MeetingRecord]) -> None:
+        start = time.perf_counter()
+        try:
+            self.service.process_meeting_records(batch)
+            self._incr("written", len(batch))
+        except Exception:
+            # 整批失败时逐条重试，避免一条坏记录拖累同批的其他记录
+            for record in batch:
+                try:
+                    self.service.process_meeting_record(record)
+                    self._incr("written")
+                except Exception:
+                    self._incr("failed")
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._metrics["flushes"] += 1
+            self._metrics["flush_seconds_total"] += elapsed
+            self._metrics["last_flush_seconds"] = elapsed
+
+    def _incr(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._metrics[key] += amount
+
+
+meeting_writer = WriteBehindQueue(MeetingService(db))
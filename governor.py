@@ -0,0 +1,342 @@
+"""
+进程级 LLM 并发调度：限制同时在途的上游调用数，超出时按用户公平排队，队列满时拒绝新请求。
+
+每次上游调用（流式或非流式）占用一个名额，结束后释放。排队按用户分组，空出名额时从下一个用户的队首放行，
+某个用户的突发请求不会让其他用户一直等待。运行时循环上的协程与线程池中的工具调用共用同一组名额。
+限流、超时与连接类错误在释放名额后按带抖动的指数退避重试，重试需重新排队，不会绕过并发上限；
+因此模型本身的 max_retries 应设为 0，避免 SDK 内部再叠加一层重试。
+
+app 在启动时就导入本模块做准入检查，openai 与 langchain_deepseek 推迟到首次使用时才导入。
+"""
+import asyncio
+import contextvars
+import math
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable, Deque, Dict, Iterator, Optional
+
+import config
+from tracing import metrics
+
+# 当前请求的用户名，由 answer_stream 设置；作为公平排队的分组键，检索类工具也据此限定数据范围
+current_username = contextvars.ContextVar("current_username", default="")
+# 当前请求的 (事件循环, 排队通知队列)，由 with_queue_status 设置；调用方需要排队时写入 status 事件
+queue_notices: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("queue_notices", default=None)
+
+_retryable: Optional[tuple] = None
+
+
+def retryable_errors() -> tuple:
+    """可重试的上游错误类型；except 子句只在有异常时才求值，正常调用路径不会导入 openai"""
+    global _retryable
+    if _retryable is None:
+        import openai
+
+        _retryable = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+                      openai.InternalServerError)
+    return _retryable
+
+
+class Overloaded(Exception):
+    """排队人数已达上限，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM 调用排队已满，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+        self.event = threading.Event() if loop is None else None
+        self.granted = False
+        self.abandoned = False
+
+    def grant(self) -> bool:
+        """在调度锁内调用；已放弃的等待者返回 False，由调度器继续放行下一个"""
+        if self.abandoned:
+            return False
+        self.granted = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+        else:
+            self.event.set()
+        return True
+
+
+class LLMGovernor:
+    def __init__(self, max_inflight: int = None, max_queue: int = None, max_retries: int = None,
+                 retry_base: float = None, retry_max: float = None):
+        self.max_inflight = max_inflight or config.LLM_MAX_CONCURRENCY
+        self.max_queue = config.LLM_MAX_QUEUE if max_queue is None else max_queue
+        self.max_retries = config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_base = retry_base or config.LLM_RETRY_BASE_SECONDS
+        self.retry_max = retry_max or config.LLM_RETRY_MAX_SECONDS
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._queued = 0
+        # 用户 -> 该用户的等待者；放行一个后该用户移到末尾，实现轮转
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        # 名额平均占用时长的指数滑动平均，用于估算 Retry-After
+        self._hold_seconds = 5.0
+        self._counters = {"admitted": 0, "queued": 0, "rejected": 0, "retries": 0, "wait_seconds_total": 0.0}
+
+    # ---- 准入 ----
+    def retry_after(self) -> int:
+        with self._lock:
+            return self._retry_after()
+
+    def _retry_after(self) -> int:
+        return max(1, math.ceil(self._hold_seconds * (self._queued + 1) / self.max_inflight))
+
+    def check_admission(self) -> Optional[int]:
+        """请求开始流式响应前调用：排队已满时返回建议的 Retry-After 秒数，否则返回 None"""
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._counters["rejected"] += 1
+                return self._retry_after()
+        return None
+
+    def _enqueue(self, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        """有空闲名额且无人排队时直接占用并返回 None，否则返回排队中的等待者"""
+        with self._lock:
+            if self._inflight < self.max_inflight and not self._queued:
+                self._inflight += 1
+                self._counters["admitted"] += 1
+                return None
+            if self._queued >= self.max_queue:
+                self._counters["rejected"] += 1
+                raise Overloaded(self._retry_after())
+            waiter = _Waiter(loop)
+            self._queues.setdefault(current_username.get(), deque()).append(waiter)
+            self._queued += 1
+            self._counters["queued"] += 1
+            position = self._queued
+        self._notify(f"LLM 调用排队中，前方 {position - 1} 个请求...")
+        return waiter
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """等待被取消：尚未放行则移出队列，已放行则归还名额"""
+        with self._lock:
+            if not waiter.granted:
+                waiter.abandoned = True
+                for user, waiters in self._queues.items():
+                    if waiter in waiters:
+                        waiters.remove(waiter)
+                        self._queued -= 1
+                        if not waiters:
+                            del self._queues[user]
+                        break
+                return
+        self.release(0.0)
+
+    def release(self, held: float) -> None:
+        with self._lock:
+            if held:
+                self._hold_seconds = self._hold_seconds * 0.9 + held * 0.1
+            while self._queues:
+                user, waiters = next(iter(self._queues.items()))
+                waiter = waiters.popleft()
+                self._queued -= 1
+                if waiters:
+                    self._queues.move_to_end(user)
+                else:
+                    del self._queues[user]
+                # 名额直接转交给被放行的等待者
+                if waiter.grant():
+                    self._counters["admitted"] += 1
+                    return
+            self._inflight -= 1
+
+    def _waited(self, start: float) -> None:
+        waited = time.monotonic() - start
+        with self._lock:
+            self._counters["wait_seconds_total"] += waited
+        metrics.observe("llm_queue_wait_seconds", waited, "LLM 调用排队等待时长",
+                        buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60))
+        self._notify(f"排队 {waited:.1f} 秒后开始调用 LLM")
+
+    def acquire(self) -> None:
+        waiter = self._enqueue(None)
+        if waiter is not None:
+            start = time.monotonic()
+            waiter.event.wait()
+            self._waited(start)
+
+    async def acquire_async(self) -> None:
+        waiter = self._enqueue(asyncio.get_running_loop())
+        if waiter is not None:
+            start = time.monotonic()
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+            self._waited(start)
+
+    # ---- 调用与重试 ----
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        with self._lock:
+            self._counters["retries"] += 1
+        delay = min(self.retry_base * 2 ** attempt, self.retry_max) * random.uniform(0.5, 1.5)
+        self._notify(f"LLM 调用失败（{type(error).__name__}），{delay:.1f} 秒后重试...")
+        return delay
+
+    def call(self, fn: Callable):
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            start = time.monotonic()
+            try:
+                return fn()
+            except retryable_errors() as e:
+                if attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                self.release(time.monotonic() - start)
+            time.sleep(self._backoff(attempt, error))
+
+    async def acall(self, fn: Callable):
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async()
+            start = time.monotonic()
+            try:
+                return await fn()
+            except retryable_errors() as e:
+                if attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                self.release(time.monotonic() - start)
+            await asyncio.sleep(self._backoff(attempt, error))
+
+    def stream(self, fn: Callable[[], Iterator]) -> Iterator:
+        """流式调用：整个流期间占用名额；已产出内容后出错不再重试，避免下游收到重复内容"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            start = time.monotonic()
+            started = False
+            try:
+                for chunk in fn():
+                    started = True
+                    yield chunk
+                return
+            except retryable_errors() as e:
+                if started or attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                self.release(time.monotonic() - start)
+            time.sleep(self._backoff(attempt, error))
+
+    async def astream(self, fn: Callable[[], AsyncIterator]) -> AsyncIterator:
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async()
+            start = time.monotonic()
+            started = False
+            try:
+                async for chunk in fn():
+                    started = True
+                    yield chunk
+                return
+            except retryable_errors() as e:
+                if started or attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                self.release(time.monotonic() - start)
+            await asyncio.sleep(self._backoff(attempt, error))
+
+    # ---- 通知与指标 ----
+    @staticmethod
+    def _notify(content: str) -> None:
+        target = queue_notices.get()
+        if target is None:
+            return
+        loop, notices = target
+        event = {"type": "status", "content": content}
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            notices.put_nowait(event)
+        else:
+            # 线程池中的工具调用，交回运行时循环写入
+            loop.call_soon_threadsafe(notices.put_nowait, event)
+
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._counters, "inflight": self._inflight, "queue_depth": self._queued,
+                    "max_inflight": self.max_inflight}
+
+
+llm_governor = LLMGovernor()
+
+
+async def with_queue_status(events: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """把本次请求中 LLM 排队、重试产生的 status 事件并入事件流"""
+    notices = asyncio.Queue()
+    queue_notices.set((asyncio.get_running_loop(), notices))
+    iterator = events.__aiter__()
+    pending = getter = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            if getter is None:
+                getter = asyncio.ensure_future(notices.get())
+            done, _ = await asyncio.wait({pending, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+                getter = None
+                continue
+            finished, pending = pending, None
+            try:
+                event = finished.result()
+            except StopAsyncIteration:
+                break
+            yield event
+    finally:
+        for task in (pending, getter):
+            if task is not None:
+                task.cancel()
+
+
+def _governed_class() -> type:
+    from langchain_deepseek import ChatDeepSeek
+
+    class GovernedChatDeepSeek(ChatDeepSeek):
+        """经 llm_governor 调度的 ChatDeepSeek，构造参数与 ChatDeepSeek 相同"""
+
+        def _generate(self, *args, **kwargs):
+            parent = super()._generate
+            return llm_governor.call(lambda: parent(*args, **kwargs))
+
+        async def _agenerate(self, *args, **kwargs):
+            parent = super()._agenerate
+            return await llm_governor.acall(lambda: parent(*args, **kwargs))
+
+        def _stream(self, *args, **kwargs):
+            parent = super()._stream
+            yield from llm_governor.stream(lambda: parent(*args, **kwargs))
+
+        async def _astream(self, *args, **kwargs):
+            parent = super()._astream
+            async for chunk in llm_governor.astream(lambda: parent(*args, **kwargs)):
+                yield chunk
+
+    return GovernedChatDeepSeek
+
+
+def __getattr__(name: str):
+    # GovernedChatDeepSeek 在首次 from governor import GovernedChatDeepSeek 时才创建，
+    # 届时取到的 ChatDeepSeek 也包括 bench.fake_llm / bench.replay 替换后的版本
+    global GovernedChatDeepSeek
+    if name == "GovernedChatDeepSeek":
+        GovernedChatDeepSeek = _governed_class()
+        return GovernedChatDeepSeek
+    raise AttributeError(f"module 'governor' has no attribute '{name}'")
@@ -0,0 +1,211 @@
+"""
+实时会议：会议进行中分段追加原文，增量提取并合并为持续更新的 MeetingRecord。
+
+每次更新只把新追加的内容加上前文末尾的一小段上下文（LIVE_CONTEXT_CHARS）交给提取工具，
+结果与已有状态按 action/chunking 的去重规则合并，因此单次更新的开销只取决于新增内容的长度。
+短时间内连续追加的片段会合并为一次更新。会话状态只在共享运行时循环上读写，无需加锁。
+"""
+import asyncio
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+import config
+from action.chunking import merge_agendas, merge_todos, merge_follow_ups
+from action.models import MeetingRecord, BasicInfo, AgendaConclusion, TodoItem, FollowUp
+from action.tools import extract_meeting_basic_info, parse_meeting_agenda_conclusion, generate_meeting_todo, \
+    mark_meeting_follow_up
+from db.writer import meeting_writer
+from governor import current_username
+from runtime import runtime
+
+# 状态字段 -> (提取工具, 条目模型, 合并函数)
+DELTA_EXTRACTORS = {
+    "agendas": (parse_meeting_agenda_conclusion, AgendaConclusion, merge_agendas),
+    "todos": (generate_meeting_todo, TodoItem, merge_todos),
+    "follow_ups": (mark_meeting_follow_up, FollowUp, merge_follow_ups),
+}
+
+
+class LiveSession:
+    def __init__(self, username: str, user_id: int):
+        self.session_id = uuid.uuid4().hex
+        self.username = username
+        self.user_id = user_id
+        self.segments: List[str] = []
+        self.processed_segments = 0
+        self.total_chars = 0
+        self.processed_chars = 0
+        # 已处理原文的末尾，作为下一次增量提取的上下文
+        self.context = ""
+        self.basic_info: Optional[BasicInfo] = None
+        self.state: Dict[str, list] = {field: [] for field in DELTA_EXTRACTORS}
+        self.updates = 0
+        self.closed = False
+        self.touched = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._subscribers: List[asyncio.Queue] = []
+
+    # ---- 以下方法均在运行时循环上执行 ----
+    async def append(self, text: str) -> dict:
+        if self.closed:
+            raise ValueError("会话已结束")
+        self.segments.append(text)
+        self.total_chars += len(text)
+        self.touched = time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._process())
+        return self.progress()
+
+    async def close(self) -> MeetingRecord:
+        """等待未处理的片段提取完成后结束会话，交给后台写入队列持久化并通知订阅者"""
+        self.closed = True
+        if self._task is not None:
+            await self._task
+        record = self.record()
+        if self.basic_info is not None:
+            meeting_writer.enqueue(record)
+        self._publish({"type": "done", "content": ""})
+        return record
+
+    async def subscribe(self) -> AsyncIterator[dict]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        try:
+            yield {"type": "snapshot", "content": self.snapshot()}
+            if self.closed and (self._task is None or self._task.done()):
+                yield {"type": "done", "content": ""}
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event["type"] == "done":
+                    return
+        finally:
+            self._subscribers.remove(queue)
+
+    def progress(self) -> dict:
+        return {"session_id": self.session_id, "total_chars": self.total_chars,
+                "pending_chars": self.total_chars - self.processed_chars, "updates": self.updates,
+                "closed": self.closed}
+
+    def snapshot(self) -> dict:
+        return {**self.progress(),
+                "basic_info": self.basic_info.model_dump() if self.basic_info else None,
+                **{field: [item.model_dump() for item in items] for field, items in self.state.items()}}
+
+    def record(self) -> MeetingRecord:
+        return MeetingRecord(
+            basic_info=self.basic_info or BasicInfo(attendees=[], time="未知", subject="未知", duration="未知"),
+            raw_text="".join(self.segments),
+            user_id=self.user_id,
+            **self.state,
+        )
+
+    def _publish(self, event: dict) -> None:
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    async def _process(self) -> None:
+        current_username.set(self.username)
+        while self.processed_segments < len(self.segments):
+            # 稍等片刻，把连续到达的片段合并为一次提取
+            await asyncio.sleep(config.LIVE_DEBOUNCE_SECONDS)
+            end = len(self.segments)
+            delta = "".join(self.segments[self.processed_segments:end])
+            window = self.context + delta
+            self._publish({"type": "status", "content": f"正在提取新增的 {len(delta)} 字..."})
+
+            try:
+                await self._extract(window)
+            except Exception as e:
+                self._publish({"type": "status", "content": f"增量提取失败: {e}"})
+
+            self.processed_segments = end
+            self.processed_chars += len(delta)
+            self.context = window[-config.LIVE_CONTEXT_CHARS:] if config.LIVE_CONTEXT_CHARS else ""
+            self.updates += 1
+            self._publish({"type": "progress", "content": self.progress()})
+
+    async def _extract(self, window: str) -> None:
+        tools = [extractor for extractor, _, _ in DELTA_EXTRACTORS.values()]
+        # 基本信息只依赖会议开头，提取到有效主题后不再重复调用
+        need_basic_info = self.basic_info is None or self.basic_info.subject == "未知"
+        if need_basic_info:
+            tools.append(extract_meeting_basic_info)
+        outputs = await asyncio.gather(*[tool.ainvoke({"text": window}) for tool in tools], return_exceptions=True)
+
+        for field, output in zip(DELTA_EXTRACTORS, outputs):
+            extractor, model, merge = DELTA_EXTRACTORS[field]
+            if isinstance(output, Exception):
+                self._publish({"type": "status", "content": f"工具 {extractor.name} 调用失败: {output}"})
+                continue
+            previous = {tuple(item.model_dump().items()) for item in self.state[field]}
+            self.state[field] = merge([self.state[field], [model(**item) for item in output]])
+            changed = [item.model_dump() for item in self.state[field]
+                       if tuple(item.model_dump().items()) not in previous]
+            if changed:
+                self._publish({"type": field, "content": changed})
+
+        if need_basic_info and not isinstance(outputs[-1], Exception):
+            self.basic_info = BasicInfo(**outputs[-1])
+            self._publish({"type": "basic_info", "content": self.basic_info.model_dump()})
+
+
+class LiveSessionManager:
+    """
+    进程内的实时会话表，超过 LIVE_SESSION_TTL 秒未追加内容的会话视为已过期，取用时不再返回，创建新会话时清理。
+    同一会话的所有请求须落在同一进程：部署了 asgi.py 时 /api/live 整组接口都应转发给它。
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, LiveSession] = {}
+        self._lock = threading.Lock()
+
+    def create(self, username: str, user_id: int) -> LiveSession:
+        session = LiveSession(username, user_id)
+        now = time.monotonic()
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if now - s.touched > config.LIVE_SESSION_TTL]
+            for sid in expired:
+                del self._sessions[sid]
+            self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id: str, username: str) -> Optional[LiveSession]:
+        """只返回属于该用户且未过期的会话"""
+        session = self._sessions.get(session_id)
+        if session is None or session.username != username:
+            return None
+        if time.monotonic() - session.touched > config.LIVE_SESSION_TTL:
+            with self._lock:
+                self._sessions.pop(session_id, None)
+            return None
+        return session
+
+    def append(self, session: LiveSession, text: str) -> dict:
+        return runtime.run(session.append(text))
+
+    def close(self, session: LiveSession) -> MeetingRecord:
+        try:
+            return runtime.run(session.close())
+        finally:
+            self._discard(session)
+
+    # ---- 供 asgi.py 使用的异步版本 ----
+    async def aappend(self, session: LiveSession, text: str) -> dict:
+        return await runtime.arun(session.append(text))
+
+    async def aclose(self, session: LiveSession) -> MeetingRecord:
+        try:
+            return await runtime.arun(session.close())
+        finally:
+            self._discard(session)
+
+    def _discard(self, session: LiveSession) -> None:
+        with self._lock:
+            self._sessions.pop(session.session_id, None)
+
+
+live_sessions = LiveSessionManager()
@@ -0,0 +1,126 @@
+"""
+思维导图的确定性生成：由结构化会议数据直接拼出 Mermaid mindmap，不调用 LLM。
+
+数据来源有两种：已入库会议的 MeetingRecord 结构，或会议总结 HTML（渲染链输出的表格）。
+两者都无法得到结构时返回 None，由调用方回落到 create_mindmap_chain。
+"""
+from html.parser import HTMLParser
+from typing import List, Optional
+
+MAX_NODE_CHARS = 40
+# Mermaid 中括号类字符会被解析为节点形状，统一替换为全角
+NODE_ESCAPES = str.maketrans({"(": "（", ")": "）", "[": "【", "]": "】", "{": "｛", "}": "｝", "\n": " "})
+
+# 表头关键词 -> 分支名称，识别总结表格的类别
+TABLE_KINDS = [
+    (("议程", "议题"), "议程与结论"),
+    (("待办", "任务", "负责人"), "待办事项"),
+    (("跟进",), "待跟进"),
+    (("参会", "参与"), "参会人员"),
+]
+SUBJECT_LABELS = ("会议主题", "主题")
+
+
+def node(text: str) -> str:
+    text = " ".join(str(text).translate(NODE_ESCAPES).split())
+    return text if len(text) <= MAX_NODE_CHARS else text[:MAX_NODE_CHARS - 1] + "…"
+
+
+def render(root: str, branches: List[tuple]) -> str:
+    """branches 为 [(分支名, [(节点, [子节点, ...]), ...])]，空分支不输出"""
+    lines = ["mindmap", f"  root(({node(root) or '会议'}))"]
+    for title, items in branches:
+        if not items:
+            continue
+        lines.append(f"    {node(title)}")
+        for text, children in items:
+            lines.append(f"      {node(text)}")
+            lines += [f"        {node(child)}" for child in children if child]
+    return "\n".join(lines)
+
+
+def from_record(record: dict) -> str:
+    """MeetingRecord.model_dump() 或同结构的 dict -> mindmap"""
+    info = record.get("basic_info") or {}
+    return render(info.get("subject") or "会议", [
+        ("议程与结论", [(a["agenda"], [a.get("conclusion")]) for a in record.get("agendas", [])]),
+        ("待办事项", [(f"{t['owner']}：{t['task']}", [t.get("deadline")] if t.get("deadline") not in (None, "待确认")
+                      else []) for t in record.get("todos", [])]),
+        ("待跟进", [(f["topic"], [f.get("reason")]) for f in record.get("follow_ups", [])]),
+        ("参会人员", [(name, []) for name in info.get("attendees", [])]),
+    ])
+
+
+class _TableCollector(HTMLParser):
+    """收集 HTML 中的表格（行 -> 单元格文本）及每个表格之前最近的标题"""
+
+    def __init__(self):
+        super().__init__()
+        self.tables: List[dict] = []
+        self.heading = ""
+        self._text: Optional[List[str]] = None
+        self._in_heading = False
+        self._row: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("h1", "h2", "h3", "h4"):
+            self._in_heading, self._text = True, []
+        elif tag == "table":
+            self.tables.append({"heading": self.heading, "rows": []})
+        elif tag == "tr" and self.tables:
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if tag in ("h1", "h2", "h3", "h4") and self._in_heading:
+            self.heading = "".join(self._text).strip()
+            self._in_heading, self._text = False, None
+        elif tag in ("td", "th") and self._row is not None and self._text is not None:
+            self._row.append(" ".join("".join(self._text).split()))
+            self._text = None
+        elif tag == "tr" and self._row is not None:
+            if any(self._row):
+                self.tables[-1]["rows"].append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+
+def from_summary_html(html: str) -> Optional[str]:
+    """会议总结 HTML -> mindmap；没有可识别的表格时返回 None"""
+    if "<table" not in html.lower():
+        return None
+    collector = _TableCollector()
+    collector.feed(html)
+    collector.close()
+
+    subject, branches = "", []
+    for table in collector.tables:
+        rows = table["rows"]
+        if not rows:
+            continue
+        header, body = (rows[0], rows[1:]) if len(rows) > 1 else ([], rows)
+        # 基本信息表：纵向“会议主题 | xxx”键值行，或表头含“会议主题”的横向表，只取主题
+        vertical = next((r[1] for r in rows if len(r) > 1 and r[0] in SUBJECT_LABELS), None)
+        column = next((header.index(k) for k in SUBJECT_LABELS if k in header), None)
+        if vertical is not None or column is not None:
+            if not subject:
+                subject = vertical if vertical is not None else (body[0][column] if body and len(body[0]) > column
+                                                                else "")
+            continue
+        label = "".join(header) + table["heading"]
+        title = next((name for keys, name in TABLE_KINDS if any(k in label for k in keys)),
+                     table["heading"] or "要点")
+        # 首列为节点，其余列作为子节点；序号列跳过
+        items = []
+        for row in body:
+            cells = row[1:] if len(row) > 1 and row[0].isdigit() else row
+            items.append((cells[0], cells[1:]))
+        branches.append((title, items))
+
+    if not branches:
+        return None
+    return render(subject or collector.heading or "会议", branches)
@@ -0,0 +1,143 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Iterator, TypeVar
+
+import config
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class AsyncRuntime:
+    """
+    进程级共享的异步运行时：一个常驻后台线程的事件循环，外加复用连接池的 HTTP 客户端。
+    所有 Agent 流都在这个循环上以协程方式运行，不再为每个请求新建事件循环。
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._http_clients = None
+
+    def _clients(self) -> tuple:
+        # 创建客户端需要初始化 SSL 上下文，推迟到首次构建模型时，不计入进程启动耗时
+        if self._http_clients is None:
+            with self._lock:
+                if self._http_clients is None:
+                    import httpx
+
+                    limits = httpx.Limits(max_connections=config.HTTP_MAX_CONNECTIONS,
+                                          max_keepalive_connections=config.HTTP_MAX_KEEPALIVE)
+                    self._http_clients = (httpx.Client(limits=limits, timeout=config.HTTP_TIMEOUT),
+                                          httpx.AsyncClient(limits=limits, timeout=config.HTTP_TIMEOUT))
+        return self._http_clients
+
+    @property
+    def http_client(self):
+        """同步客户端，供线程池中的工具调用使用"""
+        return self._clients()[0]
+
+    @property
+    def http_async_client(self):
+        """异步客户端，只在运行时循环上使用"""
+        return self._clients()[1]
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(target=loop.run_forever, name="async-runtime", daemon=True)
+                    self._thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """在运行时循环上执行协程并阻塞等待结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def arun(self, coro: Awaitable[T]) -> T:
+        """供 ASGI 等异步调用方使用：在运行时循环上执行协程并 await 结果，不阻塞调用方的循环"""
+        if asyncio.get_running_loop() is self._loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def submit(self, fn: Callable[..., T], *args) -> "concurrent.futures.Future[T]":
+        """在运行时的线程池中提前执行同步函数（如数据库查询），调用方稍后在运行时循环上 await 结果"""
+        return asyncio.run_coroutine_threadsafe(asyncio.to_thread(fn, *args), self.loop)
+
+    def _pump(self, agen: AsyncIterator[T], deliver: Callable[[object], None]) -> tuple:
+        """
+        在运行时循环上驱动 agen，逐项交给 deliver。每项占用一个缓冲额度，消费方取走后调用返回的 release 归还；
+        额度用完时上游在 acquire 处挂起，直到客户端读走为止。返回 (future, release)。
+        """
+        credits = asyncio.Semaphore(max(config.SSE_BUFFER_FRAMES, 1))
+
+        # 整个生成器在同一个 Task 中运行，上下文变量在各次迭代之间保持有效
+        async def pump():
+            try:
+                async for item in agen:
+                    await credits.acquire()
+                    deliver(item)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                deliver(_Failure(e))
+                return
+            deliver(_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        return future, lambda: self.loop.call_soon_threadsafe(credits.release)
+
+    def iterate(self, agen: AsyncIterator[T]) -> Iterator[T]:
+        """供 WSGI 同步视图使用：逐项取出运行时循环上异步生成器的产出"""
+        # 容量为缓冲额度再加一格结束标记，put_nowait 不会因队满失败
+        items = queue.Queue(maxsize=max(config.SSE_BUFFER_FRAMES, 1) + 1)
+        future, release = self._pump(agen, items.put_nowait)
+        try:
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                release()
+                yield item
+        finally:
+            # 客户端断开时取消上游流，释放 LLM 连接
+            future.cancel()
+
+    async def aiterate(self, agen: AsyncIterator[T]) -> AsyncIterator[T]:
+        """供 ASGI 等异步调用方使用：跨事件循环转发产出，不占用额外线程"""
+        caller_loop = asyncio.get_running_loop()
+        if caller_loop is self._loop:
+            async for item in agen:
+                yield item
+            return
+
+        items = asyncio.Queue(maxsize=max(config.SSE_BUFFER_FRAMES, 1) + 1)
+        future, release = self._pump(agen, lambda item: caller_loop.call_soon_threadsafe(items.put_nowait, item))
+        try:
+            while True:
+                item = await items.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.error
+                release()
+                yield item
+        finally:
+            future.cancel()
+
+
+runtime = AsyncRuntime()
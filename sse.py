@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+import zlib
+from typing import AsyncIterator, Dict, Optional
+
+import config
+
+# compact 编码下的短类型名
+COMPACT_TYPES = {"stream": "s", "status": "t", "observation": "o", "done": "d"}
+
+
+class StreamOptions:
+    """
+    单个 SSE 响应的编码选项。
+    - coalesce_ms / coalesce_bytes：stream 内容在时间或大小窗口内合并为一帧，0 表示不合并
+    - compact：使用短字段名且不转义中文的紧凑 JSON，如 {"t":"s","c":"内容"}
+    - gzip：以 gzip 压缩整个事件流，每帧后同步刷新，不影响实时性
+    """
+
+    def __init__(self, coalesce_ms: int = None, coalesce_bytes: int = None, compact: bool = False,
+                 gzip: bool = False):
+        self.coalesce_ms = config.SSE_COALESCE_MS if coalesce_ms is None else coalesce_ms
+        self.coalesce_bytes = config.SSE_COALESCE_BYTES if coalesce_bytes is None else coalesce_bytes
+        self.compact = compact
+        self.gzip = gzip
+
+    @classmethod
+    def from_request(cls, headers) -> "StreamOptions":
+        """按请求头 X-SSE-Options: compact,gzip 开启可选编码；gzip 还要求客户端声明 Accept-Encoding"""
+        flags = {f.strip().lower() for f in (headers.get("X-SSE-Options") or "").split(",")}
+        return cls(compact="compact" in flags,
+                   gzip="gzip" in flags and "gzip" in (headers.get("Accept-Encoding") or ""))
+
+    @property
+    def response_headers(self) -> Dict[str, str]:
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        if self.gzip:
+            headers["Content-Encoding"] = "gzip"
+        return headers
+
+
+def encode_event(event: dict, compact: bool = False) -> str:
+    if compact:
+        payload = {"t": COMPACT_TYPES.get(event["type"], event["type"]), "c": event["content"]}
+        return f"data: {json.dumps(payload, ensure_ascii=False, separators=(',', ':'))}\n\n"
+    return f"data: {json.dumps(event)}\n\n"
+
+
+async def coalesce(events: AsyncIterator[dict], max_ms: int, max_bytes: int) -> AsyncIterator[dict]:
+    """
+    合并相邻的 stream 事件：缓冲内容达到 max_bytes 或距首次缓冲超过 max_ms 时输出一帧。
+    第一个 stream 事件立即输出以保证首字延迟；其他类型事件会先冲刷缓冲区再立即输出。
+    """
+    if max_ms <= 0 and max_bytes <= 0:
+        async for event in events:
+            yield event
+        return
+
+    iterator = events.__aiter__()
+    buffer = []
+    buffered_bytes = 0
+    deadline: Optional[float] = None
+    first_token_sent = False
+    pending = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                # 时间窗口到期，上游仍未产出，先把缓冲内容发出去
+                yield {"type": "stream", "content": "".join(buffer)}
+                buffer, buffered_bytes, deadline = [], 0, None
+                continue
+
+            finished, pending = pending, None
+            try:
+                event = finished.result()
+            except StopAsyncIteration:
+                break
+
+            if event["type"] != "stream":
+                if buffer:
+                    yield {"type": "stream", "content": "".join(buffer)}
+                    buffer, buffered_bytes, deadline = [], 0, None
+                yield event
+                continue
+
+            if not first_token_sent:
+                first_token_sent = True
+                yield event
+                continue
+
+            buffer.append(event["content"])
+            buffered_bytes += len(event["content"].encode("utf-8"))
+            if deadline is None and max_ms > 0:
+                deadline = time.monotonic() + max_ms / 1000
+            if max_bytes and buffered_bytes >= max_bytes:
+                yield {"type": "stream", "content": "".join(buffer)}
+                buffer, buffered_bytes, deadline = [], 0, None
+
+        if buffer:
+            yield {"type": "stream", "content": "".join(buffer)}
+    finally:
+        # 下游提前关闭时不再等待上游
+        if pending is not None:
+            pending.cancel()
+
+
+async def encode_stream(events: AsyncIterator[dict], options: StreamOptions) -> AsyncIterator:
+    """事件流 -> SSE 帧；开启 gzip 时产出 bytes，否则产出 str"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if options.gzip else None
+    async for event in coalesce(events, options.coalesce_ms, options.coalesce_bytes):
+        frame = encode_event(event, options.compact)
+        if compressor is None:
+            yield frame
+        else:
+            yield compressor.compress(frame.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+import uuid
+
+# 数据库引擎在导入 db.manager 时创建，须先指向临时目录，避免读写 db/ 下的真实数据
+_tmp = tempfile.mkdtemp(prefix="meeting-assistant-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.sqlite')}"
+os.environ["VECTOR_INDEX_PATH"] = os.path.join(_tmp, "vector_index")
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+os.environ.setdefault("AGENT_WARMUP", "lazy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def database():
+    from db.manager import db
+
+    db.init_schema()
+    return db
+
+
+@pytest.fixture
+def make_user(database):
+    """创建一个新用户，返回 (user_id, username)"""
+
+    def make():
+        username = f"user-{uuid.uuid4().hex[:8]}"
+        return database.add_user(username, "password"), username
+
+    return make
@@ -0,0 +1,91 @@
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from action.models import BasicInfo, MeetingRecord, TodoItem
+from db.models import Todo
+from db.service import MeetingService, bulk_update_todos
+
+
+def create_todos(database, user_id: int, count: int = 2) -> list:
+    """为用户写入一场带 count 条待办的会议，返回待办 id"""
+    record = MeetingRecord(
+        basic_info=BasicInfo(attendees=["张三"], time="2026-03-01 10:00", subject="例会", duration="1小时"),
+        agendas=[],
+        todos=[TodoItem(owner="张三", task=f"任务{i}", deadline=f"2026-03-0{i + 2} 18:00") for i in range(count)],
+        follow_ups=[],
+        raw_text=f"会议原文 {uuid.uuid4()}",
+        user_id=user_id,
+    )
+    meeting_id = MeetingService(database).process_meeting_record(record)
+    with database.SessionLocal() as session:
+        return list(session.execute(select(Todo.todo_id).where(Todo.meeting_id == meeting_id)
+                                    .order_by(Todo.todo_id)).scalars())
+
+
+def todo_rows(database, todo_ids: list) -> dict:
+    with database.SessionLocal() as session:
+        todos = session.execute(select(Todo).where(Todo.todo_id.in_(todo_ids))).scalars()
+        return {t.todo_id: (t.user_id, t.owner, t.task, t.status, t.deadline) for t in todos}
+
+
+def test_updates_own_todos_in_one_call(database, make_user):
+    user_id, _ = make_user()
+    first, second = create_todos(database, user_id)
+
+    updated = bulk_update_todos(user_id, [{"todo_id": first, "status": "completed"},
+                                          {"todo_id": second, "task": "改写任务", "deadline": None}])
+
+    rows = todo_rows(database, [first, second])
+    assert updated == 2
+    assert rows[first][3] == "completed"
+    assert rows[second][2] == "改写任务" and rows[second][4] is None
+
+
+def test_cannot_update_other_users_todos(database, make_user):
+    owner_id, _ = make_user()
+    other_id, _ = make_user()
+    (todo_id,) = create_todos(database, owner_id, count=1)
+    before = todo_rows(database, [todo_id])
+
+    updated = bulk_update_todos(other_id, [{"todo_id": todo_id, "status": "cancelled", "task": "篡改"}])
+
+    assert updated == 0
+    assert todo_rows(database, [todo_id]) == before
+
+
+def test_user_id_in_payload_cannot_reassign_todo(database, make_user):
+    owner_id, _ = make_user()
+    other_id, _ = make_user()
+    (todo_id,) = create_todos(database, owner_id, count=1)
+
+    bulk_update_todos(owner_id, [{"todo_id": todo_id, "user_id": other_id, "status": "in_progress"}])
+
+    assert todo_rows(database, [todo_id])[todo_id][:1] == (owner_id,)
+    assert todo_rows(database, [todo_id])[todo_id][3] == "in_progress"
+
+
+@pytest.mark.parametrize("bad_item", [
+    {"status": "done"},
+    {"deadline": "下周五"},
+    {"todo_id": "1"},
+    "not an object",
+])
+def test_invalid_item_rejects_whole_batch(database, make_user, bad_item):
+    user_id, _ = make_user()
+    first, second = create_todos(database, user_id)
+    before = todo_rows(database, [first, second])
+    if isinstance(bad_item, dict):
+        bad_item = {"todo_id": second, **bad_item}
+
+    with pytest.raises(ValueError):
+        bulk_update_todos(user_id, [{"todo_id": first, "status": "completed"}, bad_item])
+
+    assert todo_rows(database, [first, second]) == before
+
+
+def test_payload_must_be_a_list(database, make_user):
+    user_id, _ = make_user()
+    with pytest.raises(ValueError):
+        bulk_update_todos(user_id, {"todo_id": 1, "status": "completed"})
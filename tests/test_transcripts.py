@@ -0,0 +1,130 @@
+import contextvars
+import hashlib
+import io
+import uuid
+
+import pytest
+from sqlalchemy import func, select
+
+from action.transcript import SHORT_ID, TranscriptRegistry, current_username
+from db.models import Transcript, TranscriptOwner
+from db.service import upload_transcript
+
+
+def transcript_text() -> str:
+    return f"主持人：今天讨论预算。\n李四：我负责整理报告。\n编号 {uuid.uuid4()}"
+
+
+def upload(user_id: int, text: str) -> dict:
+    return upload_transcript(io.BytesIO(text.encode("utf-8")), user_id)
+
+
+def test_uploader_reads_by_full_hash_and_short_ref(database, make_user):
+    user_id, _ = make_user()
+    text = transcript_text()
+    result = upload(user_id, text)
+
+    assert result["meeting_id"] == hashlib.sha256(text.encode("utf-8")).hexdigest()
+    assert database.get_transcript(result["meeting_id"], user_id) == text
+    assert database.get_transcript(result["meeting_id"][:SHORT_ID], user_id) == text
+
+
+@pytest.mark.parametrize("length", [1, 6, 12, 20, 63, 64])
+def test_other_users_cannot_read_by_any_key(database, make_user, length):
+    owner_id, _ = make_user()
+    other_id, _ = make_user()
+    meeting_id = upload(owner_id, transcript_text())["meeting_id"]
+
+    assert database.get_transcript(meeting_id[:length], other_id) is None
+    assert not database.has_transcript(meeting_id, other_id)
+
+
+@pytest.mark.parametrize("length", [1, 6, 20, 63])
+def test_only_full_or_short_ref_keys_are_accepted(database, make_user, length):
+    user_id, _ = make_user()
+    meeting_id = upload(user_id, transcript_text())["meeting_id"]
+
+    assert database.get_transcript(meeting_id[:length], user_id) is None
+
+
+def test_second_uploader_gets_a_first_upload_response(database, make_user):
+    owner_id, _ = make_user()
+    other_id, _ = make_user()
+    text = transcript_text()
+    first = upload(owner_id, text)
+
+    second = upload(other_id, text)
+    repeat = upload(other_id, text)
+
+    # 其他用户上传过同一内容时，响应与首次上传一致
+    assert second == first
+    assert repeat["duplicate"] is True and repeat["stored_bytes"] is None
+    assert database.get_transcript(first["meeting_id"], other_id) == text
+    with database.SessionLocal() as session:
+        assert session.execute(select(func.count()).select_from(Transcript)
+                               .where(Transcript.content_hash == first["meeting_id"])).scalar() == 1
+        assert session.execute(select(func.count()).select_from(TranscriptOwner)
+                               .where(TranscriptOwner.content_hash == first["meeting_id"])).scalar() == 2
+
+
+def test_registry_refs_resolve_only_for_registering_users(database, make_user):
+    registry = TranscriptRegistry(8)
+    _, owner = make_user()
+    _, other = make_user()
+    text = transcript_text()
+    ref = registry.register(text, owner)
+
+    assert registry.resolve(ref, owner) == text
+    assert registry.resolve(f"{ref}:2-2", owner) == "李四：我负责整理报告。"
+    with pytest.raises(ValueError):
+        registry.resolve(ref, other)
+    assert registry.get(ref[2:], other) is None
+
+
+def test_registry_defaults_to_current_request_user(database, make_user):
+    registry = TranscriptRegistry(8)
+    _, owner = make_user()
+    _, other = make_user()
+    ref = registry.register(transcript_text(), owner)
+
+    def resolve_as(username):
+        current_username.set(username)
+        return registry.resolve(ref)
+
+    assert contextvars.copy_context().run(resolve_as, owner)
+    with pytest.raises(ValueError):
+        contextvars.copy_context().run(resolve_as, other)
+
+
+def test_registry_falls_back_to_the_users_own_uploads(database, make_user):
+    owner_id, owner = make_user()
+    _, other = make_user()
+    text = transcript_text()
+    meeting_id = upload(owner_id, text)["meeting_id"]
+    registry = TranscriptRegistry(8)
+
+    assert registry.resolve(f"T-{meeting_id[:SHORT_ID]}", owner) == text
+    assert registry.get(meeting_id, other) is None
+    with pytest.raises(ValueError):
+        registry.resolve(f"T-{meeting_id[:SHORT_ID]}", other)
+
+
+def test_upload_hash_header_only_answers_for_own_uploads(database, make_user):
+    from flask_jwt_extended import create_access_token
+
+    from app import app
+
+    owner_id, owner = make_user()
+    _, other = make_user()
+    text = transcript_text()
+    meeting_id = upload(owner_id, text)["meeting_id"]
+    client = app.test_client()
+    with app.app_context():
+        headers = {name: {"Authorization": f"Bearer {create_access_token(identity=name)}",
+                          "X-Content-SHA256": meeting_id} for name in (owner, other)}
+
+    assert client.post("/api/meetings/upload", headers=headers[owner]).get_json()["duplicate"] is True
+    # 不是本人上传的内容时不走捷径，空请求体按普通上传校验
+    assert client.post("/api/meetings/upload", headers=headers[other]).status_code == 400
+    response = client.post("/api/chat", json={"meeting_id": meeting_id}, headers=headers[other])
+    assert response.status_code == 404
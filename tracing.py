@@ -0,0 +1,408 @@
+"""
+请求级性能追踪与 Prometheus 指标。
+
+- 每个流式请求创建一个 RequestTrace，通过 LangChain 的 configure hook 自动挂到本次运行内的全部回调上，
+  因此 ReAct 循环、pipeline 并行提取以及工具内部的结构化提取调用都会记录为 llm / tool span；
+- 首字节与 SSE 写出耗时由真正写出帧的一方记录（WSGI 为 write_frames，ASGI 为 asgi.send_stream），
+  写完最后一帧后才结束追踪；
+- MeetingDB 的公开方法由 traced_methods 包装为 db span，挂在发起调用的工具 span 之下；
+- 请求结束时各 span 汇总进直方图，由 /api/metrics 以 Prometheus 文本格式导出；
+- 超过 SLOW_REQUEST_MS 的请求打印完整 span 树。
+
+本模块被 db.manager 等轻量模块导入，LangChain 只在首次 start_trace 时才导入，不拖慢进程启动。
+"""
+import bisect
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+import config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        # 标签元组 -> [各桶计数..., 总和, 总数]
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+
+    def observe(self, value: float, labels: Tuple[Tuple[str, str], ...], lock: threading.Lock) -> None:
+        with lock:
+            series = self._series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(labels, le=_number(bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(labels, le='+Inf')} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(labels)} {series[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """进程内指标注册表：直方图与计数器在此累计，collector 在导出时即时采集外部状态（缓存、写入队列等）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, Tuple[str, Dict[Tuple[Tuple[str, str], ...], float]]] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def histogram(self, metric: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._histograms.setdefault(metric, Histogram(metric, help_text, buckets))
+
+    def observe(self, metric: str, value: float, help_text: str = "", buckets=LATENCY_BUCKETS, **labels) -> None:
+        self.histogram(metric, help_text, buckets).observe(value, tuple(sorted(labels.items())), self._lock)
+
+    def inc(self, metric: str, amount: float = 1, help_text: str = "", **labels) -> None:
+        with self._lock:
+            _, series = self._counters.setdefault(metric, (help_text, {}))
+            key = tuple(sorted(labels.items()))
+            series[key] = series.get(key, 0) + amount
+
+    def register_collector(self, collector: Callable[[], List[str]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (help_text, series) in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(labels)} {_number(value)}" for labels, value in sorted(series.items())]
+            for histogram in self._histograms.values():
+                lines += histogram.render()
+        for collector in self._collectors:
+            try:
+                lines += collector()
+            except Exception as e:
+                print(f"⚠️ 指标采集失败: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def sample_lines(name: str, help_text: str, values: Dict[Tuple[Tuple[str, str], ...], float],
+                 kind: str = "gauge") -> List[str]:
+    """collector 的辅助函数：把一组 标签元组 -> 取值 渲染为 gauge / counter"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    return lines + [f"{name}{_labels(labels)} {_number(value)}" for labels, value in sorted(values.items())]
+
+
+metrics = MetricsRegistry()
+
+
+class Span:
+    __slots__ = ("span_id", "name", "kind", "start", "end", "attrs", "children")
+
+    def __init__(self, span_id, name: str, kind: str, start: float = None):
+        self.span_id = span_id
+        self.name = name
+        self.kind = kind
+        self.start = time.perf_counter() if start is None else start
+        self.end: Optional[float] = None
+        self.attrs: Dict[str, Any] = {}
+        self.children: List["Span"] = []
+
+    @property
+    def seconds(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def render(self, origin: float, depth: int = 0) -> List[str]:
+        attrs = " ".join(f"{k}={v}" for k, v in self.attrs.items())
+        line = f"{'  ' * depth}{self.kind}:{self.name} +{(self.start - origin) * 1000:.1f}ms " \
+               f"{self.seconds * 1000:.1f}ms {attrs}".rstrip()
+        lines = [line]
+        for child in sorted(self.children, key=lambda s: s.start):
+            lines += child.render(origin, depth + 1)
+        return lines
+
+
+class RequestTrace:
+    """
+    单个请求的追踪器，同时作为 LangChain 回调处理器接收本次运行内全部 LLM / 工具 / 链事件。
+    链只记录父子关系不生成 span，使 span 树中的 llm / tool 直接挂在最近的已记录祖先下。
+    实际实例由 start_trace 创建，其类型同时继承 BaseCallbackHandler，未实现的回调为空操作；
+    在运行时上驱动本次运行的 Task 内调用 activate 后，回调与 db span 才会记录到该实例。
+    """
+
+    run_inline = True
+    raise_error = False
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.root = Span("root", endpoint, "request")
+        self._spans: Dict[Any, Span] = {}
+        self._parents: Dict[UUID, Optional[UUID]] = {}
+        self._lock = threading.Lock()
+        self.first_byte: Optional[float] = None
+        self.iterations = 0
+        self.sse_frames = 0
+        self.sse_bytes = 0
+        self.sse_write_seconds = 0.0
+
+    def _parent_span(self, parent_run_id: Optional[UUID]) -> Span:
+        while parent_run_id is not None:
+            span = self._spans.get(parent_run_id)
+            if span is not None:
+                return span
+            parent_run_id = self._parents.get(parent_run_id)
+        return self.root
+
+    def open(self, span_id, name: str, kind: str, parent_run_id: Optional[UUID] = None) -> Span:
+        span = Span(span_id, name, kind)
+        with self._lock:
+            self._parents[span_id] = parent_run_id
+            self._spans[span_id] = span
+            self._parent_span(parent_run_id).children.append(span)
+        return span
+
+    def close(self, span_id, **attrs) -> Optional[Span]:
+        span = self._spans.get(span_id)
+        if span is not None:
+            span.end = time.perf_counter()
+            span.attrs.update(attrs)
+        return span
+
+    # ---- LangChain 回调 ----
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        span = self.open(run_id, (serialized or {}).get("name") or kwargs.get("name") or "chat_model", "llm",
+                         parent_run_id)
+        span.attrs["tokens"] = 0
+        span.attrs["prompt_chars"] = sum(len(m.content) if isinstance(m.content, str) else len(str(m.content))
+                                         for batch in messages for m in batch)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        span = self._spans.get(run_id)
+        if span is not None:
+            if span.attrs["tokens"] == 0:
+                span.attrs["ttft_ms"] = round((time.perf_counter() - span.start) * 1000, 1)
+            span.attrs["tokens"] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        span = self.close(run_id)
+        if span is None:
+            return
+        # 流式调用的用量在最后一个块的 usage_metadata 中，非流式调用在 llm_output.token_usage 中
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens"), usage.get("completion_tokens")
+        message = getattr(response.generations[0][0], "message", None) if response.generations else None
+        metadata = getattr(message, "usage_metadata", None)
+        if metadata:
+            prompt_tokens, completion_tokens = metadata.get("input_tokens"), metadata.get("output_tokens")
+        if prompt_tokens is not None:
+            span.attrs["prompt_tokens"] = prompt_tokens
+        if completion_tokens is not None:
+            span.attrs["completion_tokens"] = completion_tokens
+            if not span.attrs["tokens"]:
+                span.attrs["tokens"] = completion_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.close(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self.open(run_id, (serialized or {}).get("name") or kwargs.get("name") or "tool", "tool", parent_run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.close(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.close(run_id, error=type(error).__name__)
+
+    def on_agent_action(self, action, *, run_id, **kwargs):
+        self.iterations += 1
+
+    def on_agent_finish(self, finish, *, run_id, **kwargs):
+        self.iterations += 1
+
+    # ---- 请求生命周期 ----
+    def activate(self) -> None:
+        _current_trace.set(self)
+
+    def mark_frame(self, size: int, write_seconds: float) -> None:
+        """一帧写给客户端后调用，write_seconds 为写出该帧的耗时"""
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+        self.sse_frames += 1
+        self.sse_bytes += size
+        self.sse_write_seconds += write_seconds
+
+    def write_frames(self, frames: Iterator) -> Iterator:
+        """
+        WSGI 写出：服务器取走一帧、写给客户端后才取下一帧，因此 yield 挂起的时长即该帧的写出耗时。
+        帧全部写完（或客户端断开）后结束追踪。
+        """
+        error = None
+        try:
+            for frame in frames:
+                start = time.perf_counter()
+                yield frame
+                self.mark_frame(len(frame), time.perf_counter() - start)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            # 客户端断开时服务器只关闭外层生成器，需一并关闭上游以取消运行
+            close = getattr(frames, "close", None)
+            if close is not None:
+                close()
+            self.finish(error)
+
+    def usage(self) -> Dict[str, int]:
+        """本次运行全部 LLM 调用的用量汇总；接口未返回用量时 prompt_chars 可作为对比依据"""
+        llm_spans = [span for span in list(self._spans.values()) if span.kind == "llm"]
+        return {
+            "llm_calls": len(llm_spans),
+            "prompt_tokens": sum(span.attrs.get("prompt_tokens", 0) for span in llm_spans),
+            "completion_tokens": sum(span.attrs.get("completion_tokens", span.attrs.get("tokens", 0))
+                                     for span in llm_spans),
+            "prompt_chars": sum(span.attrs.get("prompt_chars", 0) for span in llm_spans),
+        }
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        root = self.root
+        root.end = time.perf_counter()
+        root.attrs.update(iterations=self.iterations, frames=self.sse_frames, bytes=self.sse_bytes,
+                          sse_write_ms=round(self.sse_write_seconds * 1000, 1))
+        if error is not None:
+            root.attrs["error"] = type(error).__name__
+        usage = self.usage()
+        root.attrs.update(usage)
+        self._export(usage)
+        if config.TOKEN_REPORT and usage["llm_calls"]:
+            print(f"🧾 {self.endpoint} 用量: LLM 调用 {usage['llm_calls']} 次, prompt {usage['prompt_tokens']} tokens "
+                  f"({usage['prompt_chars']} 字符), completion {usage['completion_tokens']} tokens, "
+                  f"迭代 {self.iterations} 轮")
+        if config.SLOW_REQUEST_MS and root.seconds * 1000 >= config.SLOW_REQUEST_MS:
+            print(f"🐢 慢请求 {self.endpoint} 耗时 {root.seconds * 1000:.0f}ms\n" + "\n".join(root.render(root.start)))
+
+    def _export(self, usage: Dict[str, int]) -> None:
+        endpoint = self.endpoint
+        metrics.observe("run_prompt_tokens", usage["prompt_tokens"], "单次运行的 prompt token 总数", TOKEN_BUCKETS,
+                        endpoint=endpoint)
+        metrics.observe("run_completion_tokens", usage["completion_tokens"], "单次运行的 completion token 总数",
+                        TOKEN_BUCKETS, endpoint=endpoint)
+        metrics.observe("request_seconds", self.root.seconds, "流式请求总耗时", endpoint=endpoint)
+        if self.first_byte is not None:
+            metrics.observe("request_ttfb_seconds", self.first_byte - self.root.start, "首字节时间",
+                            endpoint=endpoint)
+        metrics.observe("sse_write_seconds", self.sse_write_seconds, "SSE 帧写出累计耗时", endpoint=endpoint)
+        metrics.observe("sse_frames", self.sse_frames, "单次请求输出的 SSE 帧数", COUNT_BUCKETS, endpoint=endpoint)
+        if self.iterations:
+            metrics.observe("agent_iterations", self.iterations, "单次 Agent 运行的迭代次数", COUNT_BUCKETS,
+                            endpoint=endpoint)
+        metrics.inc("requests_total", 1, "流式请求数", endpoint=endpoint,
+                    outcome="error" if "error" in self.root.attrs else "ok")
+
+        for span in list(self._spans.values()):
+            if span.end is None:
+                continue
+            if span.kind == "llm":
+                metrics.observe("llm_call_seconds", span.seconds, "单次 LLM 调用耗时", endpoint=endpoint)
+                metrics.inc("llm_tokens_total", span.attrs.get("tokens", 0), "LLM 输出 token 数",
+                            endpoint=endpoint)
+                metrics.inc("llm_prompt_tokens_total", span.attrs.get("prompt_tokens", 0), "LLM 输入 token 数",
+                            endpoint=endpoint)
+                if "ttft_ms" in span.attrs:
+                    metrics.observe("llm_ttft_seconds", span.attrs["ttft_ms"] / 1000, "LLM 首 token 时间",
+                                    endpoint=endpoint)
+            else:
+                metrics.observe(f"{span.kind}_seconds", span.seconds, f"{span.kind} span 耗时", name=span.name)
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+_handler_class: Optional[type] = None
+_handler_lock = threading.Lock()
+
+
+def _langchain_handler_class() -> type:
+    global _handler_class
+    if _handler_class is None:
+        with _handler_lock:
+            if _handler_class is None:
+                from langchain_core.callbacks import BaseCallbackHandler
+                from langchain_core.tracers.context import register_configure_hook
+
+                # 设置后，本上下文内 LangChain 配置的所有回调管理器都会自动带上该处理器（含工具内部以及复制了上下文的线程）
+                register_configure_hook(_current_trace, inheritable=True)
+                _handler_class = type("RequestTrace", (RequestTrace, BaseCallbackHandler), {})
+    return _handler_class
+
+
+def start_trace(endpoint: str) -> RequestTrace:
+    return _langchain_handler_class()(endpoint)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def _current_run_id() -> Optional[UUID]:
+    """当前所处 LangChain 运行（如正在执行的工具）的 run_id，用于把 db span 挂到对应的工具之下"""
+    from langchain_core.runnables.config import var_child_runnable_config
+
+    child_config = var_child_runnable_config.get()
+    manager = child_config.get("callbacks") if child_config else None
+    return getattr(manager, "parent_run_id", None)
+
+
+def traced_methods(kind: str):
+    """类装饰器：公开的普通方法在有活动追踪时记录为 span，无追踪时几乎零开销"""
+
+    def wrap(method):
+        name = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None:
+                return method(*args, **kwargs)
+            span_id = object()
+            trace.open(span_id, name, kind, _current_run_id())
+            try:
+                return method(*args, **kwargs)
+            finally:
+                trace.close(span_id)
+
+        return wrapper
+
+    def decorate(cls):
+        # 生成器方法被调用时只创建生成器，查询在迭代时才执行，包装后的 span 恒为 0，因此跳过
+        for attr, value in list(vars(cls).items()):
+            if not attr.startswith("_") and inspect.isfunction(value) and not inspect.isgeneratorfunction(value):
+                setattr(cls, attr, wrap(value))
+        return cls
+
+    return decorate